@@ -0,0 +1,53 @@
+"""Tokenizer throughput benchmark.
+
+Tokenizes every formula found in a project file (resources/test.json by default) and reports
+tokens per second. Run from the repository root:
+
+    python -m benchmarks.tokenizer_benchmark [project.json] [--repeat N]
+"""
+import argparse
+import json
+import time
+from typing import Any, List
+
+from resources.parser import Tokenizer
+
+
+def collect_formulas(data: Any) -> List[str]:
+    """Return the expressions (without the leading '=') of every formula in the project data."""
+    formulas = []
+    if isinstance(data, dict):
+        formula = data.get('formula')
+        if isinstance(formula, str) and formula.startswith('='):
+            formulas.append(formula[1:])
+        for value in data.values():
+            formulas.extend(collect_formulas(value))
+    elif isinstance(data, list):
+        for value in data:
+            formulas.extend(collect_formulas(value))
+    return formulas
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('project', nargs='?', default='resources/test.json')
+    arg_parser.add_argument('--repeat', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    with open(args.project, 'r', encoding='utf-8') as file:
+        formulas = collect_formulas(json.load(file))
+
+    token_count = sum(len(Tokenizer.tokenize(formula)) for formula in formulas)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for formula in formulas:
+            Tokenizer.tokenize(formula)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(formulas)} formulas, {token_count} tokens, {args.repeat} repeats")
+    print(f"{elapsed:.3f} s, {token_count * args.repeat / elapsed:,.0f} tokens/s")
+
+
+if __name__ == '__main__':
+    main()
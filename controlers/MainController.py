@@ -1,11 +1,12 @@
 import json
+import os
 from typing import Optional
 
 import pandas as pd
 from PyQt6 import QtPrintSupport, QtGui, QtWidgets
 
-from PyQt6.QtWidgets import QFileDialog, QMessageBox
-from PyQt6.QtCore import QObject, pyqtSlot, QSizeF
+from PyQt6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
+from PyQt6.QtCore import QObject, pyqtSlot, QSizeF, Qt
 
 from model.CheckBoxItem import CheckBoxItem
 from model.DoubleSpinBoxItem import DoubleSpinBoxItem
@@ -15,11 +16,20 @@ from model.ItemWithFormula import ItemWithFormula
 from model.LineEditItem import LineEditItem
 from model.Model import Model
 from model.Spreadsheet import Spreadsheet
+from model.Workbook import Workbook, LoadCancelled, PROGRESS_STEP
 from resources.TabWidget import GroupBox, MyTab
+from resources.parser import Compiler
 
-from resources.utils import parse_cell_reference
 from views.MainView.MainView import MainView
 
+LOAD_STAGES = {
+    'read': "Wczytywanie pliku...",
+    'records': "Tworzenie komórek...",
+    'formulas': "Wiązanie formuł...",
+    'calculate': "Obliczanie...",
+    'widgets': "Tworzenie widoku...",
+}
+
 
 class MainController(QObject):
     def __init__(self):
@@ -29,6 +39,10 @@ class MainController(QObject):
         self.current_file_path: Optional[str] = None
         self.is_edited: bool = False
 
+        Model.set_lazy_evaluation(True)
+        Model.set_background_recalculation(True)
+        Model.set_parallel_recalculation(os.cpu_count() or 1)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(lambda: Model.set_parallel_recalculation(0))
         self.setup_connections()
         self.default_data()
         self.properties = pd.DataFrame(columns=["WidgetName", "Value"])  # Initialize the DataFrame
@@ -61,6 +75,9 @@ class MainController(QObject):
         # Import actions
         self.view.actionImportJson.triggered.connect(self.handle_import_json_action)
 
+        # Tools
+        self.view.actionGoalSeek.triggered.connect(self.handle_goal_seek_action)
+
     def new_GroupBox_setup_connections(self, group_box: GroupBox):
         if isinstance(group_box.item, (DoubleSpinBoxItem, CheckBoxItem)):
             group_box.item.activeItemChangedSignal.connect(self.activeItemChanged)
@@ -82,6 +99,7 @@ class MainController(QObject):
     def handle_export_xlsx_action(self):
         def gather_data():
             """Gather properties and spreadsheets from the group boxes."""
+            Model.calculate_stale_items()
             properties = {}
             sheets = {}
             for tab in Model.get_list_of_tabs():
@@ -164,8 +182,30 @@ class MainController(QObject):
         except Exception as e:
             print(f"An error occurred during export: {e}")
 
+    def handle_goal_seek_action(self):
+        from views.Dialogs.GoalSeekDialog import GoalSeekDialog
+        active_item = Model.get_active_item()
+        self.goal_seek_dialog = GoalSeekDialog(active_item.name if active_item is not None else '')
+        self.goal_seek_dialog.goal_seek_requested.connect(self.goal_seek)
+
+    def goal_seek(self, target_address: str, goal: float, input_address: str):
+        try:
+            result = Model.goal_seek(Model.find_input(input_address), Model.find_input(target_address), goal)
+        except ValueError as e:
+            QMessageBox.warning(self.view, "Szukaj wyniku", str(e))
+            return
+        if result.converged:
+            self.is_edited = True
+            QMessageBox.information(self.view, "Szukaj wyniku",
+                                    f"Znaleziono rozwiązanie: {input_address} = {result.value:g}")
+        else:
+            QMessageBox.warning(self.view, "Szukaj wyniku",
+                                f"Nie znaleziono rozwiązania, najbliższy wynik {result.result} "
+                                f"dla {input_address} = {result.value:g}.")
+
     def handle_export_pdf_action(self):
         def generate_pdf_html_content():
+            Model.calculate_stale_items()
             html = """
             <html>
             <head>
@@ -206,7 +246,7 @@ class MainController(QObject):
                         for row in table.worksheet:
                             html += "<tr>"
                             for cell in row:
-                                cell_content = cell.text() or ""
+                                cell_content = cell.display_text or ""
                                 html += f"<td>{cell_content}</td>"
                             html += "</tr>"
 
@@ -260,32 +300,9 @@ class MainController(QObject):
             file_dialog = QFileDialog()
             file_path, _ = file_dialog.getOpenFileName(self.view, "Open project", "", "JSON Files (*.json)")
 
-        self.reset_project()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                import_data = json.load(file)
-
-            for tab_data in import_data:
-                tab_name = tab_data['tab_name']
-                tab = self.view.tabWidget.add_new_tab(tab_name)
-
-                for group_box_data in tab_data['group_boxes']:
-                    item_type = group_box_data['item_type']
-                    item_name = group_box_data['item_name']
-                    group_box_label = group_box_data['group_box_label']
-                    group_box = tab.add_property(group_box_label, item_name, ItemModel.get_item_class(item_type))
-
-                    if isinstance(group_box.item, Spreadsheet):
-                        for i in range(group_box_data['row_count']):
-                            group_box.item.add_row()
-                        for cell_data in group_box_data['cells']:
-                            sh_name, row, col = parse_cell_reference(cell_data['item_name'])
-                            formula = cell_data.get('formula', '')
-                            group_box.item.get_cell(row, col).set_item(formula)
-                    else:
-                        group_box.item.set_item(group_box_data.get('formula', ''))
-
-            Model.recalculate()
+            if not self.load_project(file_path):
+                return
             QMessageBox.information(self.view, "Open Successful", f"Data successfully opened from {file_path}")
         except Exception as e:
             QMessageBox.critical(self.view, "Open Failed", f"Failed to open data: {str(e)}")
@@ -293,6 +310,68 @@ class MainController(QObject):
         self.current_file_path = file_path
         self.is_edited = False
 
+    def load_project(self, file_path) -> bool:
+        """Replace the project by the one of a file, returns False if the user cancelled.
+
+        The file is first loaded into a headless ``Workbook``, which binds every formula once and
+        calculates all values in one pass; cancelling there leaves the current project as it was.
+        The tabs, group boxes and rows are then created once, with the window not repainting,
+        and take the formulas and calculated values of the workbook without any recalculation.
+        """
+        progress_dialog = QProgressDialog("", "Anuluj", 0, 1, self.view)
+        progress_dialog.setWindowTitle("Otwieranie")
+        progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def progress(stage: str, done: int, total: int) -> bool:
+            # A modal progress dialog processes events in setValue, so the cancel button works
+            progress_dialog.setLabelText(LOAD_STAGES[stage])
+            progress_dialog.setMaximum(max(total, 1))
+            progress_dialog.setValue(done)
+            return not progress_dialog.wasCanceled()
+
+        try:
+            try:
+                workbook = Workbook.load(file_path, progress)
+            except LoadCancelled:
+                return False
+
+            progress_dialog.setCancelButton(None)
+            self.reset_project()
+            self.view.setUpdatesEnabled(False)
+            try:
+                self.build_project(workbook, progress)
+            finally:
+                self.view.setUpdatesEnabled(True)
+            return True
+        finally:
+            progress_dialog.close()
+
+    def build_project(self, workbook: Workbook, progress) -> None:
+        """Create the tabs and items of a loaded workbook, then give them their formulas and values.
+
+        All items exist before the first formula is bound, so every reference resolves at once.
+        """
+        loaded = []
+        with Model.bulk_load():
+            for tab_name, records in workbook.tabs.items():
+                tab = self.view.tabWidget.add_new_tab(tab_name)
+                for record in records:
+                    if record.name in workbook.sheets:
+                        group_box = tab.add_property(record.label, record.name, Spreadsheet)
+                        group_box.item.add_rows(len(record))
+                        loaded.extend((group_box.item.get_cell(cell.row, cell.column), cell)
+                                      for cell in record.cells())
+                    else:
+                        group_box = tab.add_property(record.label, record.name,
+                                                     ItemModel.get_item_class(record.item_type))
+                        loaded.append((group_box.item, record))
+
+            for done, (item, record) in enumerate(loaded, 1):
+                Model.load_item(item, record.formula, record.value, record.python_formula)
+                if done % PROGRESS_STEP == 0 or done == len(loaded):
+                    progress('widgets', done, len(loaded))
+
     def convert_to_json(self, data):
         try:
             return json.dumps(data, indent=4, ensure_ascii=False)
@@ -328,7 +407,9 @@ class MainController(QObject):
         return QMessageBox.StandardButton.Cancel
 
     def reset_project(self):
-        self.view.tabWidget.clean_up()
+        with Model.batch():
+            self.view.tabWidget.clean_up()
+        Compiler.clear_cache()
         self.properties = pd.DataFrame(columns=["WidgetName", "Value"])
 
         self.view.Formula_bar.clear()
@@ -386,32 +467,9 @@ class MainController(QObject):
             file_dialog = QFileDialog()
             file_path, _ = file_dialog.getOpenFileName(self.view, "Import from JSON", "", "JSON Files (*.json)")
 
-        self.reset_project()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                import_data = json.load(file)
-
-            for tab_data in import_data:
-                tab_name = tab_data['tab_name']
-                tab = self.view.tabWidget.add_new_tab(tab_name)
-
-                for group_box_data in tab_data['group_boxes']:
-                    item_type = group_box_data['item_type']
-                    item_name = group_box_data['item_name']
-                    group_box_label = group_box_data['group_box_label']
-                    group_box = tab.add_property(group_box_label, item_name, ItemModel.get_item_class(item_type))
-
-                    if isinstance(group_box.item, Spreadsheet):
-                        for i in range(group_box_data['row_count']):
-                            group_box.item.add_row()
-                        for cell_data in group_box_data['cells']:
-                            sh_name, row, col = parse_cell_reference(cell_data['item_name'])
-                            formula = cell_data.get('formula', '')
-                            group_box.item.get_cell(row, col).set_item(formula)
-                    else:
-                        group_box.item.set_item(group_box_data.get('formula', ''))
-
-            Model.recalculate()
+            if not self.load_project(file_path):
+                return
             QMessageBox.information(self.view, "Import Successful", f"Data successfully imported from {file_path}")
         except Exception as e:
             QMessageBox.critical(self.view, "Import Failed", f"Failed to import data: {str(e)}")
@@ -427,7 +485,9 @@ class MainController(QObject):
 
     def itemWithFormulaDoubleClicked(self, item):
         if item is not None:
-            item.setText(item.formula)
+            # Spreadsheet cells are edited through the view, which opens the editor on the formula
+            if isinstance(item, LineEditItem):
+                item.setText(item.formula)
             self.view.update_formula_bar(item.formula)
 
     def activeItemWithFormulaChanged(self, item):
@@ -457,7 +517,7 @@ class MainController(QObject):
     def formula_bar_edited(self, text):
         if Model.get_active_item():
             if isinstance(Model.get_active_item(), ItemWithFormula):
-                Model.get_active_item().value = text
+                Model.get_active_item().preview(text)
 
     @pyqtSlot()
     def formula_bar_editing_finished(self):
@@ -469,6 +529,7 @@ class MainController(QObject):
     @pyqtSlot(int)
     def on_tab_changed(self, index: int):
         tab = self.view.tabWidget.widget(index)
+        Model.set_visible_tab(tab)
         if tab is not None:
             print(tab.objectName())
             for gb in tab.group_boxes:
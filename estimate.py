@@ -0,0 +1,185 @@
+"""Batch estimator: recalculate project files without the application window.
+
+Loads each project JSON into a ``Workbook`` (no Qt is imported), applies the property overrides,
+recalculates and writes the results next to the project or into ``--output``. Run from the
+repository root:
+
+    python estimate.py project.json [more.json ...] [--set foundationArea=120] [--format json xlsx csv]
+                       [--output DIR] [--jobs N]
+
+Outputs are ``<project>.results.json`` (property and cell values), ``<project>.xlsx`` (laid out
+like the export of the application) and ``<project>.<sheet>.csv`` with ``<project>.properties.csv``.
+The exit status is 1 if any project failed, the others are still written.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from model.Workbook import Workbook, Property, CHECKBOX_TYPE, NUMBER_TYPE
+from resources.utils import state_value, to_value
+
+FORMATS = ('json', 'xlsx', 'csv')
+PROPERTIES_SHEET = 'Właściwości'
+TRUE_TEXTS = {'1', 'true', 'tak', 'yes'}
+FALSE_TEXTS = {'0', 'false', 'nie', 'no', ''}
+
+
+def parse_override(text: str) -> Tuple[str, str]:
+    """Split a 'name=value' override; the name is a property name or a cell address."""
+    name, separator, value = text.partition('=')
+    if not separator or not name.strip():
+        raise argparse.ArgumentTypeError(f"Expected name=value, got {text!r}")
+    return name.strip(), value.strip()
+
+
+def override_formula(record: Any, text: str) -> Any:
+    """Formula of an override as the application would store it for the type of the item."""
+    if isinstance(record, Property):
+        if record.item_type == CHECKBOX_TYPE:
+            if text.lower() in TRUE_TEXTS:
+                return True
+            if text.lower() in FALSE_TEXTS:
+                return False
+            raise ValueError(f"{record.name} is a check box, expected true or false, got {text!r}")
+        if record.item_type == NUMBER_TYPE:
+            value = to_value(text)
+            if type(value) is not float:
+                raise ValueError(f"{record.name} is a number field, got {text!r}")
+            return value
+    return text
+
+
+def apply_overrides(workbook: Workbook, overrides: Sequence[Tuple[str, str]]) -> None:
+    with workbook.batch():
+        for name, text in overrides:
+            record = workbook.record(name)
+            if record is None:
+                raise ValueError(f"No property or cell {name}")
+            workbook.set_formula(record, override_formula(record, text))
+
+
+def property_frame(workbook: Workbook) -> pd.DataFrame:
+    """Labels and values of the properties, check boxes as TAK/NIE like the export of the application."""
+    rows = []
+    for record in workbook.properties.values():
+        if record.item_type == CHECKBOX_TYPE:
+            value = 'TAK' if record.value is True else 'NIE'
+        else:
+            value = state_value(record.value)
+        rows.append([record.label or record.name, value])
+    return pd.DataFrame(rows, columns=["WidgetName", "Value"])
+
+
+def results(workbook: Workbook) -> Dict[str, Any]:
+    """Values of the properties by name and the rows of every sheet, as written to the results JSON."""
+    return {
+        'properties': {name: state_value(record.value) for name, record in workbook.properties.items()},
+        'sheets': {name: sheet.to_dataframe().to_dict('records') for name, sheet in workbook.sheets.items()},
+    }
+
+
+def write_json(workbook: Workbook, base: str) -> List[str]:
+    path = base + '.results.json'
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results(workbook), file, indent=4, ensure_ascii=False)
+    return [path]
+
+
+def write_xlsx(workbook: Workbook, base: str) -> List[str]:
+    path = base + '.xlsx'
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        properties = property_frame(workbook)
+        properties.to_excel(writer, index=False, header=False, sheet_name=PROPERTIES_SHEET)
+        worksheet = writer.sheets[PROPERTIES_SHEET]
+        right_format = writer.book.add_format({
+            'align': 'right', 'valign': 'vcenter', 'bold': True, 'border': 1, 'num_format': '#,##0.00'
+        })
+        yellow_format = writer.book.add_format({
+            'bg_color': 'yellow', 'align': 'right', 'valign': 'vcenter', 'bold': True, 'border': 1
+        })
+        for row, (label, value) in enumerate(properties.itertuples(index=False)):
+            worksheet.write(row, 0, label, yellow_format)
+            worksheet.write(row, 1, value, right_format)
+        worksheet.set_column('A:A', 17)
+        worksheet.set_column('B:B', 10)
+
+        for sheet in workbook.sheets.values():
+            sheet_name = sheet.label or sheet.name
+            df = sheet.to_dataframe()
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            for col_num, col_data in enumerate(df.columns):
+                max_length = max(df[col_data].astype(str).map(len).max(), len(col_data)) if len(df) else len(col_data)
+                writer.sheets[sheet_name].set_column(col_num, col_num, max_length + 2)
+    return [path]
+
+
+def write_csv(workbook: Workbook, base: str) -> List[str]:
+    paths = [base + '.properties.csv']
+    property_frame(workbook).to_csv(paths[0], index=False)
+    for name, sheet in workbook.sheets.items():
+        paths.append(f'{base}.{name}.csv')
+        sheet.to_dataframe().to_csv(paths[-1], index=False)
+    return paths
+
+
+WRITERS = {'json': write_json, 'xlsx': write_xlsx, 'csv': write_csv}
+
+
+def estimate(project: str, overrides: Sequence[Tuple[str, str]] = (), formats: Sequence[str] = ('json',),
+             output: str = None) -> List[str]:
+    """Recalculate one project file with the overrides and write its results, returns the paths written."""
+    workbook = Workbook.load(project)
+    apply_overrides(workbook, overrides)
+    directory = output if output is not None else os.path.dirname(os.path.abspath(project))
+    base = os.path.join(directory, os.path.splitext(os.path.basename(project))[0])
+    paths = []
+    for output_format in formats:
+        paths.extend(WRITERS[output_format](workbook, base))
+    return paths
+
+
+def main(argv: Sequence[str] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('projects', nargs='+', help="project JSON files")
+    arg_parser.add_argument('--set', dest='overrides', type=parse_override, action='append', default=[],
+                            metavar='NAME=VALUE', help="override a property or cell, may be repeated")
+    arg_parser.add_argument('--format', dest='formats', nargs='+', choices=FORMATS, default=['json'])
+    arg_parser.add_argument('--output', help="directory of the results (default: next to each project)")
+    arg_parser.add_argument('--jobs', type=int, default=1, help="projects estimated in parallel processes")
+    args = arg_parser.parse_args(argv)
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+    jobs = min(args.jobs, len(args.projects))
+    failed = 0
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs, mp_context=get_context('spawn')) as executor:
+            futures = [executor.submit(estimate, project, args.overrides, args.formats, args.output)
+                       for project in args.projects]
+            outcomes = [(project, future.exception() or future.result())
+                        for project, future in zip(args.projects, futures)]
+    else:
+        outcomes = []
+        for project in args.projects:
+            try:
+                outcomes.append((project, estimate(project, args.overrides, args.formats, args.output)))
+            except Exception as e:
+                outcomes.append((project, e))
+
+    for project, outcome in outcomes:
+        if isinstance(outcome, Exception):
+            failed += 1
+            print(f"{project}: {outcome}", file=sys.stderr)
+        else:
+            print(f"{project}: {', '.join(outcome)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
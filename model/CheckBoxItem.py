@@ -13,16 +13,11 @@ class CheckBoxItem(Item, QCheckBox):
     def name(self):
         return self.objectName()
 
-    @property
-    def value(self):
-        if self._value is None:
-            return False
-        return self._value
-
-    @value.setter
+    @Item.value.setter
     def value(self, value):
-        self._value = value
-        self.setChecked(value)
+        """Store the typed value and show it checked if it is true."""
+        Item.value.fset(self, value)
+        self.setChecked(self._value is True or (type(self._value) is float and self._value != 0))
 
     ###############################################
 
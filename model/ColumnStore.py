@@ -0,0 +1,161 @@
+from typing import Any, List, Tuple, Union
+
+import numpy as np
+
+from model.Enums import FormulaError
+from resources.utils import EMPTY, Empty
+
+Numbers = Tuple[np.ndarray, np.ndarray]  # values (0 where not a number) and the mask of the numbers
+
+
+class ValueKind:
+    EMPTY = 0
+    NUMBER = 1
+    TEXT = 2
+    BOOLEAN = 3
+    ERROR = 4
+
+
+class Column:
+    """Values of one column of a sheet.
+
+    Every value is kept in ``objects`` (empty cells as '', as exported) with its kind in ``kinds``.
+    Numeric columns also keep their numbers in the float array ``numbers``, with ``valid`` marking
+    the rows holding one, so ranges over them are read as array views. The arrays grow by doubling,
+    only ``[:length]`` is used.
+    """
+    __slots__ = ('numeric', 'length', 'kinds', 'objects', 'numbers', 'valid', 'errors')
+
+    def __init__(self, numeric: bool, capacity: int = 16):
+        self.numeric = numeric
+        self.length = 0
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.objects = np.full(capacity, '', dtype=object)
+        self.numbers = np.zeros(capacity) if numeric else None
+        self.valid = np.zeros(capacity, dtype=bool) if numeric else None
+        self.errors = 0  # rows holding an error value, so ranges without any skip looking for one
+
+    def arrays(self) -> List[np.ndarray]:
+        return [array for array in (self.kinds, self.objects, self.numbers, self.valid) if array is not None]
+
+    def insert(self, index: int, count: int) -> None:
+        """Insert empty rows before ``index``."""
+        if self.length + count > len(self.kinds):
+            self.grow(self.length + count)
+        for array in self.arrays():
+            array[index + count:self.length + count] = array[index:self.length]
+        self.clear(index, index + count)
+        self.length += count
+
+    def remove(self, index: int, count: int) -> None:
+        """Remove the rows from ``index`` to ``index + count``."""
+        self.errors -= int(np.count_nonzero(self.kinds[index:index + count] == ValueKind.ERROR))
+        for array in self.arrays():
+            array[index:self.length - count] = array[index + count:self.length]
+        self.clear(self.length - count, self.length)
+        self.length -= count
+
+    def clear(self, start: int, end: int) -> None:
+        self.kinds[start:end] = ValueKind.EMPTY
+        self.objects[start:end] = ''
+        if self.numeric:
+            self.numbers[start:end] = 0.0
+            self.valid[start:end] = False
+
+    def grow(self, length: int) -> None:
+        capacity = max(length, 2 * len(self.kinds))
+        for name in ('kinds', 'objects', 'numbers', 'valid'):
+            array = getattr(self, name)
+            if array is not None:
+                grown = np.full(capacity, '', dtype=object) if array.dtype == object \
+                    else np.zeros(capacity, dtype=array.dtype)
+                grown[:self.length] = array[:self.length]
+                setattr(self, name, grown)
+
+    def set(self, row: int, value: Any) -> None:
+        value_type = type(value)
+        if value_type is float or value_type is int:
+            kind = ValueKind.NUMBER
+        elif value_type is Empty:
+            kind = ValueKind.EMPTY
+        elif value_type is bool:
+            kind = ValueKind.BOOLEAN
+        elif value_type is FormulaError:
+            kind = ValueKind.ERROR
+        else:
+            kind = ValueKind.TEXT
+        self.errors += int(kind == ValueKind.ERROR) - int(self.kinds[row] == ValueKind.ERROR)
+        self.kinds[row] = kind
+        self.objects[row] = value if kind != ValueKind.EMPTY else ''
+        if self.numeric:
+            is_number = kind == ValueKind.NUMBER
+            self.numbers[row] = value if is_number else 0.0
+            self.valid[row] = is_number
+
+    def first_error(self, start: int, end: int) -> Union[Tuple[int, FormulaError], Tuple[None, None]]:
+        if self.errors:
+            rows = np.flatnonzero(self.kinds[start:end] == ValueKind.ERROR)
+            if len(rows):
+                return start + int(rows[0]), self.objects[start + rows[0]]
+        return None, None
+
+
+class ColumnStore:
+    """Columnar values of a spreadsheet, the source the aggregates and exports read.
+
+    Cells write their value through to the store when it changes; rows are inserted and removed
+    together with the cells. ``numbers`` returns array views of a range, without copying.
+    """
+
+    def __init__(self, numeric_columns: List[bool]):
+        self.columns = [Column(numeric) for numeric in numeric_columns]
+
+    def __len__(self) -> int:
+        return self.columns[0].length if self.columns else 0
+
+    def insert_rows(self, index: int, count: int = 1) -> None:
+        for column in self.columns:
+            column.insert(index, count)
+
+    def remove_rows(self, index: int, count: int = 1) -> None:
+        for column in self.columns:
+            column.remove(index, count)
+
+    def set(self, row: int, col: int, value: Any) -> None:
+        self.columns[col].set(row, value)
+
+    def get(self, row: int, col: int) -> Any:
+        column = self.columns[col]
+        if column.kinds[row] == ValueKind.EMPTY:
+            return EMPTY
+        return column.objects[row]
+
+    def column_values(self, col: int) -> np.ndarray:
+        """Values of a column for a data frame: the float array itself if it only holds numbers."""
+        column = self.columns[col]
+        if column.numeric and column.valid[:column.length].all():
+            return column.numbers[:column.length]
+        return column.objects[:column.length]
+
+    def numbers(self, start_row: int, start_col: int, end_row: int, end_col: int) -> Union[List[Numbers], FormulaError]:
+        """Numbers of a range, one (values, mask) view per column, or its first error row by row.
+
+        Rows past the end of the sheet are left out, as empty cells would be.
+        """
+        end = min(end_row + 1, len(self))
+        start = min(max(start_row, 0), end)
+        columns = [self.columns[col] for col in range(max(start_col, 0), min(end_col + 1, len(self.columns)))]
+
+        errors = [(row, col, error) for col, column in enumerate(columns)
+                  for row, error in [column.first_error(start, end)] if row is not None]
+        if errors:
+            return min(errors, key=lambda error: error[:2])[2]
+
+        parts = []
+        for column in columns:
+            if column.numeric:
+                parts.append((column.numbers[start:end], column.valid[start:end]))
+            else:
+                numeric = column.kinds[start:end] == ValueKind.NUMBER
+                parts.append((np.where(numeric, column.objects[start:end], 0.0).astype(float), numeric))
+        return parts
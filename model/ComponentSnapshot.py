@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from model import Functions  # noqa: F401 registers the spreadsheet functions in worker processes
+from model.Enums import ErrorType, FormulaError
+from model.RangeIndex import CellRange
+from resources.parser import Compiler
+from resources.utils import state_value, to_value
+
+State = Tuple[Any, Optional[ErrorType]]
+Result = Tuple[List[State], Dict[int, Any]]
+
+
+class SnapshotValue:
+    """Value of an item outside the snapshot, read by the formulas inside it."""
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class SnapshotItem:
+    """Qt-free copy of an item with an expression, evaluated like ``ItemWithFormula.evaluate_formula``."""
+    __slots__ = ('function', 'references', 'value', 'error', 'result')
+
+    def __init__(self, function: Callable[[List[Any]], Any], state: State):
+        self.function = function
+        self.references: List[Any] = []
+        value, self.error = state
+        self.value = to_value(value)
+        self.result = None
+
+    def evaluate_formula(self):
+        self.result = Compiler.evaluate(self.function, self.references)
+        self.value = to_value(self.result)
+        self.error = self.result.error_type if isinstance(self.result, FormulaError) else None
+
+    def get_state(self) -> State:
+        return state_value(self.value), self.error
+
+
+class ComponentSnapshot:
+    """Picklable copy of an independent component of a recalculation, evaluated in a worker process.
+
+    Formulas are shipped as template keys, each template once with one formula compiling to it.
+    References point to the items of the component by index or to the values of items outside
+    of it, which are clean or already evaluated.
+    """
+    __slots__ = ('templates', 'items', 'references', 'inputs', 'roots', 'previous_states')
+
+    def __init__(self):
+        self.templates: Dict[str, Tuple[str, Optional[Tuple[int, int]]]] = {}
+        self.items: List[Tuple[str, State]] = []
+        self.references: List[List[Any]] = []
+        self.inputs: List[Any] = []
+        self.roots: Set[int] = set()
+        self.previous_states: List[State] = []
+
+    @staticmethod
+    def from_items(items: List[Any], roots: Set[Any], previous_states: Dict[Any, State]) -> 'ComponentSnapshot':
+        """Snapshot of the given items with expressions, in topological order."""
+        snapshot = ComponentSnapshot()
+        index = {item: position for position, item in enumerate(items)}
+        inputs: Dict[Any, int] = {}
+        ranges: Dict[CellRange, Any] = {}
+
+        def encode(reference):
+            if reference is None:
+                return None
+            if isinstance(reference, CellRange):
+                if reference not in ranges:
+                    ranges[reference] = 'r', [encode(cell) for cell in reference]
+                return ranges[reference]
+            if isinstance(reference, list):
+                return 'r', [encode(cell) for cell in reference]
+            if reference in index:
+                return 'c', index[reference]
+            if reference not in inputs:
+                inputs[reference] = len(snapshot.inputs)
+                snapshot.inputs.append(reference.value)
+            return 'x', inputs[reference]
+
+        for position, item in enumerate(items):
+            key = item.python_formula.template.key
+            if key not in snapshot.templates:
+                snapshot.templates[key] = (item.formula, item.formula_anchor())
+            snapshot.items.append((key, item.get_state()))
+            snapshot.references.append([encode(reference) for reference in item.bound_references])
+            snapshot.previous_states.append(previous_states[item])
+            if item in roots:
+                snapshot.roots.add(position)
+        return snapshot
+
+
+def evaluate_snapshot(snapshot: ComponentSnapshot) -> Result:
+    """Evaluate a component with early cutoff, in a worker process.
+
+    Returns the new state of every item and the results of the evaluated ones by position, set as
+    the value of the items like a result evaluated in the main process.
+    """
+    functions = {}
+    for key, (formula, anchor) in snapshot.templates.items():
+        template = Compiler.templates.get(key)
+        functions[key] = template.function if template is not None else Compiler.compile(formula, anchor).template.function
+
+    items = [SnapshotItem(functions[key], state) for key, state in snapshot.items]
+    inputs = [SnapshotValue(value) for value in snapshot.inputs]
+
+    dependents: List[List[int]] = [[] for _ in items]
+
+    def decode(reference, position):
+        if reference is None:
+            return None
+        kind, target = reference
+        if kind == 'r':
+            return [decode(cell, position) for cell in target]
+        if kind == 'c':
+            dependents[target].append(position)
+            return items[target]
+        return inputs[target]
+
+    for position, (item, references) in enumerate(zip(items, snapshot.references)):
+        item.references = [decode(reference, position) for reference in references]
+
+    changed: Set[int] = set()
+    results: Dict[int, Any] = {}
+    for position, item in enumerate(items):
+        if position in snapshot.roots or position in changed:
+            item.evaluate_formula()
+            results[position] = item.result
+            if item.get_state() != snapshot.previous_states[position]:
+                changed.update(dependents[position])
+        else:
+            item.error = snapshot.previous_states[position][1]
+    return [item.get_state() for item in items], results
@@ -0,0 +1,382 @@
+from collections import deque
+from typing import Dict, Set, Iterable, Hashable, List, Tuple, Callable, Optional
+
+from model.RangeIndex import RangeIndex, CellRange, Position
+
+Node = Hashable
+
+
+class DependencyGraph:
+    """Directed graph of dependencies between items.
+
+    An edge ``precedent -> dependent`` means the formula of ``dependent`` reads ``precedent``.
+    Both directions are kept as sets, so adding, removing and testing an edge are O(1).
+    Nodes without edges are not stored.
+
+    The graph also maintains a topological order of its nodes incrementally (Pearce-Kelly):
+    adding an edge that contradicts the order only re-orders the nodes between its two ends,
+    and removing an edge never invalidates it. An edge closing a cycle is kept but left out of
+    the order until the cycle is broken.
+
+    A formula reading a range depends on a single ``CellRange`` node. The edges from the cells
+    to the ranges containing them are implicit: ``position_of`` gives the position of a cell and
+    the range index finds the ranges containing it. ``dependents`` and ``precedents`` see
+    through range nodes and only return the items on the other side.
+    """
+
+    def __init__(self, position_of: Optional[Callable[[Node], Optional[Position]]] = None):
+        self.ranges = RangeIndex()
+        self._position_of = position_of if position_of is not None else lambda node: None
+        self._dependents: Dict[Node, Set[Node]] = {}
+        self._precedents: Dict[Node, Set[Node]] = {}
+        self._order: Dict[Node, int] = {}
+        self._lowest = 0
+        self._highest = 0
+        self._back_edges: Set[Tuple[Node, Node]] = set()  # edges closing a cycle, ignored by the order
+
+    def __len__(self) -> int:
+        """Number of edges."""
+        return sum(len(dependents) for dependents in self._dependents.values())
+
+    def add_edge(self, precedent: Node, dependent: Node) -> None:
+        if self.has_edge(precedent, dependent):
+            return
+        self._add_to_order(dependent, precedent)
+        self._dependents.setdefault(precedent, set()).add(dependent)
+        self._precedents.setdefault(dependent, set()).add(precedent)
+        self._order_edge(precedent, dependent)
+
+    def remove_edge(self, precedent: Node, dependent: Node) -> None:
+        DependencyGraph._discard(self._dependents, precedent, dependent)
+        DependencyGraph._discard(self._precedents, dependent, precedent)
+        self._forget_if_isolated(precedent)
+        self._forget_if_isolated(dependent)
+        self._edges_removed({(precedent, dependent)})
+
+    def has_edge(self, precedent: Node, dependent: Node) -> bool:
+        return dependent in self._dependents.get(precedent, ())
+
+    def dependents(self, node: Node) -> Set[Node]:
+        """Nodes reading ``node`` directly or through a range. The returned set must not be modified."""
+        dependents = self._dependents.get(node, _EMPTY)
+        ranges = self._ranges_containing(node)
+        if not ranges:
+            return dependents
+        dependents = set(dependents)
+        for cell_range in ranges:
+            dependents.update(self._dependents.get(cell_range, _EMPTY))
+        return dependents
+
+    def precedents(self, node: Node) -> Set[Node]:
+        """Nodes ``node`` reads directly or through a range. The returned set must not be modified."""
+        precedents = self._precedents.get(node, _EMPTY)
+        if not any(isinstance(precedent, CellRange) for precedent in precedents):
+            return precedents
+        cells = set()
+        for precedent in precedents:
+            if isinstance(precedent, CellRange):
+                cells.update(cell for cell in precedent if cell is not None)
+            else:
+                cells.add(precedent)
+        return cells
+
+    def depends_on(self, node: Node, precedent: Node) -> bool:
+        """Whether ``node`` reads ``precedent`` directly or through a range, without expanding ranges."""
+        if self.has_edge(precedent, node):
+            return True
+        position = self._position_of(precedent)
+        if position is None:
+            return False
+        sheet_name, row, col = position
+        return any(isinstance(cell_range, CellRange) and cell_range.sheet_name == sheet_name
+                   and cell_range.contains(row, col) for cell_range in self._precedents.get(node, _EMPTY))
+
+    def cell_range(self, sheet_name: str, start_row: int, start_col: int, end_row: int, end_col: int,
+                   sheet=None) -> CellRange:
+        """The shared range node for the given rectangle of ``sheet``."""
+        cell_range = self.ranges.intern(sheet_name, start_row, start_col, end_row, end_col)
+        cell_range.sheet = sheet
+        if cell_range not in self.ranges:
+            cell_range.invalidate()
+        return cell_range
+
+    def invalidate_ranges(self, sheet_name: str) -> None:
+        """Forget the cells cached by the ranges over a sheet whose rows have been added or removed."""
+        for cell_range in self.ranges.ranges(sheet_name):
+            cell_range.invalidate()
+
+    def refresh_ranges(self, sheet_name: str) -> None:
+        """Order again the cells of the ranges over a sheet whose rows have been added or removed."""
+        for cell_range in self.ranges.ranges(sheet_name):
+            cell_range.invalidate()
+            for cell in cell_range:
+                if cell is not None:
+                    self._order_edge(cell, cell_range)
+
+    def set_precedents(self, node: Node, precedents: Iterable[Node]) -> None:
+        """Replace the incoming edges of ``node``, touching only the edges that change."""
+        new = set(precedents)
+        old = self._precedents.get(node, _EMPTY)
+        for precedent in old - new:
+            self.remove_edge(precedent, node)
+        for precedent in new - old:
+            self.add_edge(precedent, node)
+
+    def remove_node(self, node: Node) -> None:
+        """Remove every edge from and to ``node``."""
+        removed = set()
+        for dependent in self._dependents.pop(node, _EMPTY):
+            DependencyGraph._discard(self._precedents, dependent, node)
+            self._forget_if_isolated(dependent)
+            removed.add((node, dependent))
+        for precedent in self._precedents.pop(node, _EMPTY):
+            DependencyGraph._discard(self._dependents, precedent, node)
+            self._forget_if_isolated(precedent)
+            removed.add((precedent, node))
+        self._order.pop(node, None)
+        self._edges_removed(removed)
+
+    def dirty_closure(self, nodes: Iterable[Node]) -> Set[Node]:
+        """The given nodes and everything depending on them, directly or transitively."""
+        closure = set(nodes)
+        to_process = deque(closure)
+        while to_process:
+            for dependent in self.dependents(to_process.popleft()):
+                if dependent not in closure:
+                    closure.add(dependent)
+                    to_process.append(dependent)
+        return closure
+
+    def precedent_closure(self, nodes: Iterable[Node], within: Set[Node]) -> Set[Node]:
+        """The given nodes and the nodes of ``within`` they read, directly or transitively."""
+        closure = set(nodes)
+        to_process = list(closure)
+        while to_process:
+            for precedent in self._precedents.get(to_process.pop(), _EMPTY):
+                for node in precedent if isinstance(precedent, CellRange) else (precedent,):
+                    if node in within and node not in closure:
+                        closure.add(node)
+                        to_process.append(node)
+        return closure
+
+    def components(self, nodes: Iterable[Node]) -> List[List[Node]]:
+        """Weakly connected components of the subgraph induced by ``nodes``.
+
+        Nodes in different components neither read each other nor share a dirty precedent among
+        ``nodes``, so the components can be evaluated independently. Each component keeps the
+        order of ``nodes``.
+        """
+        nodes = list(nodes)
+        within = set(nodes)
+        component_of: Dict[Node, int] = {}
+        count = 0
+        for root in nodes:
+            if root in component_of:
+                continue
+            component_of[root] = count
+            to_process = [root]
+            while to_process:
+                node = to_process.pop()
+                for neighbour in (*self.dependents(node), *self.precedents(node)):
+                    if neighbour in within and neighbour not in component_of:
+                        component_of[neighbour] = count
+                        to_process.append(neighbour)
+            count += 1
+
+        components: List[List[Node]] = [[] for _ in range(count)]
+        for node in nodes:
+            components[component_of[node]].append(node)
+        return components
+
+    def topological_sort(self, nodes: Iterable[Node]) -> List[Node]:
+        """The given nodes ordered so that every node comes after the nodes it depends on.
+
+        Nodes on a cycle keep an arbitrary order among themselves.
+        """
+        return sorted(nodes, key=self._sort_rank)
+
+    def cycles(self, nodes: Iterable[Node]) -> List[Set[Node]]:
+        """Strongly connected components of the subgraph induced by ``nodes`` that contain a cycle.
+
+        A single pass of Tarjan's algorithm, written iteratively so long chains of references
+        do not hit the recursion limit.
+        """
+        nodes = set(nodes)
+        index: Dict[Node, int] = {}
+        low_link: Dict[Node, int] = {}
+        stack: List[Node] = []
+        on_stack: Set[Node] = set()
+        components: List[Set[Node]] = []
+
+        for root in nodes:
+            if root in index:
+                continue
+            work = [(root, iter(self.dependents(root)))]
+            index[root] = low_link[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, dependents = work[-1]
+                for dependent in dependents:
+                    if dependent not in nodes:
+                        continue
+                    if dependent not in index:
+                        index[dependent] = low_link[dependent] = len(index)
+                        stack.append(dependent)
+                        on_stack.add(dependent)
+                        work.append((dependent, iter(self.dependents(dependent))))
+                        break
+                    if dependent in on_stack:
+                        low_link[node] = min(low_link[node], index[dependent])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low_link[parent] = min(low_link[parent], low_link[node])
+                    if low_link[node] == index[node]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.add(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self.dependents(node):
+                            components.append(component)
+        return components
+
+    def clear(self) -> None:
+        self._dependents.clear()
+        self._precedents.clear()
+        self._order.clear()
+        self._back_edges.clear()
+        self.ranges.clear()
+
+    def _add_to_order(self, dependent: Node, precedent: Node) -> None:
+        """Give new nodes a position: precedents before and dependents after all known nodes."""
+        if precedent not in self._order:
+            if isinstance(precedent, CellRange):
+                self._add_range(precedent)
+            else:
+                self._rank(precedent)
+        if dependent not in self._order:
+            self._highest += 1
+            self._order[dependent] = self._highest
+            for cell_range in self._ranges_containing(dependent):
+                self._order_edge(dependent, cell_range)
+
+    def _add_range(self, cell_range: CellRange) -> None:
+        """Index a range read for the first time and rank it after all of its cells."""
+        for cell in cell_range:
+            if cell is not None:
+                self._rank(cell)
+        self._highest += 1
+        self._order[cell_range] = self._highest
+        self.ranges.add(cell_range)
+
+    def _rank(self, node: Node) -> int:
+        """Rank of the node, placing nodes seen for the first time before all known nodes."""
+        rank = self._order.get(node)
+        if rank is None:
+            self._lowest -= 1
+            rank = self._order[node] = self._lowest
+        return rank
+
+    def _sort_rank(self, node: Node) -> int:
+        rank = self._order.get(node)
+        if rank is not None:
+            return rank
+        # A node without edges only needs a rank if it is read through a range
+        return self._rank(node) if self._ranges_containing(node) else 0
+
+    def _ranges_containing(self, node: Node) -> List[CellRange]:
+        position = self._position_of(node)
+        if position is None:
+            return []
+        return self.ranges.containing(*position)
+
+    def _forget_if_isolated(self, node: Node) -> None:
+        if node in self._dependents or node in self._precedents:
+            return
+        if isinstance(node, CellRange):
+            self._order.pop(node, None)
+            self.ranges.remove(node)
+            for cell in node:
+                if cell is not None:
+                    self._forget_if_isolated(cell)
+        elif not self._ranges_containing(node):
+            self._order.pop(node, None)
+
+    def _order_edge(self, precedent: Node, dependent: Node) -> bool:
+        """Restore the order after adding ``precedent -> dependent``; flag the edge if it closes a cycle."""
+        lower, upper = self._rank(dependent), self._rank(precedent)
+        if lower > upper:
+            return True
+
+        forward = self._reachable(dependent, self._successors, lambda rank: rank <= upper)
+        if precedent in forward:
+            self._back_edges.add((precedent, dependent))
+            return False
+        backward = self._reachable(precedent, self._predecessors, lambda rank: rank >= lower)
+
+        order = self._order
+        affected = sorted(backward, key=order.get) + sorted(forward, key=order.get)
+        ranks = sorted(order[node] for node in affected)
+        for node, rank in zip(affected, ranks):
+            order[node] = rank
+        return True
+
+    def _reachable(self, start: Node, neighbours, in_bounds) -> Set[Node]:
+        reached = {start}
+        stack = [start]
+        while stack:
+            for node in neighbours(stack.pop()):
+                if node not in reached and in_bounds(self._rank(node)):
+                    reached.add(node)
+                    stack.append(node)
+        return reached
+
+    def _successors(self, node: Node) -> Iterable[Node]:
+        """Direct successors in the order, including the ranges containing a cell."""
+        successors = self._dependents.get(node, _EMPTY)
+        ranges = self._ranges_containing(node)
+        if ranges:
+            successors = list(successors) + ranges
+        if not self._back_edges:
+            return successors
+        return [successor for successor in successors if (node, successor) not in self._back_edges]
+
+    def _predecessors(self, node: Node) -> Iterable[Node]:
+        """Direct predecessors in the order, including the cells of a range."""
+        predecessors = self._precedents.get(node, _EMPTY)
+        if isinstance(node, CellRange):
+            predecessors = [cell for cell in node if cell is not None]
+        if not self._back_edges:
+            return predecessors
+        return [predecessor for predecessor in predecessors if (predecessor, node) not in self._back_edges]
+
+    def _is_edge(self, precedent: Node, dependent: Node) -> bool:
+        if isinstance(dependent, CellRange):
+            return dependent in self.ranges and dependent in self._ranges_containing(precedent)
+        return self.has_edge(precedent, dependent)
+
+    def _edges_removed(self, edges: Set[Tuple[Node, Node]]) -> None:
+        """Try to order the edges flagged as closing a cycle again, some cycles may be broken now."""
+        if not self._back_edges:
+            return
+        self._back_edges -= edges
+        for edge in list(self._back_edges):
+            self._back_edges.discard(edge)
+            if self._is_edge(*edge):
+                self._order_edge(*edge)
+
+    @staticmethod
+    def _discard(adjacency: Dict[Node, Set[Node]], key: Node, node: Node) -> None:
+        nodes = adjacency.get(key)
+        if nodes is not None:
+            nodes.discard(node)
+            if not nodes:
+                del adjacency[key]
+
+
+_EMPTY = frozenset()
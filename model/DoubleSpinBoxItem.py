@@ -9,16 +9,11 @@ class DoubleSpinBoxItem(Item, QDoubleSpinBox):
         self.set_item(0.0)
         self.editingFinished.connect(self.editing_finished)
 
-    @property
-    def value(self):
-        if self._value is None:
-            return 0.0
-        return self._value
-
-    @value.setter
+    @Item.value.setter
     def value(self, value):
-        self._value = value
-        self.setValue(float(self.value))
+        """Store the typed value, text holding a number becomes a float, and show it if it is a number."""
+        Item.value.fset(self, value)
+        self.setValue(self._value if type(self._value) is float else 0.0)
 
     @property
     def name(self):
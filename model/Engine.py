@@ -0,0 +1,244 @@
+from collections import deque, defaultdict, Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from model.DependencyGraph import DependencyGraph
+from model.Enums import ErrorType
+from model.Recalculation import Recalculation
+from resources.parser import Compiler, ReferenceKind
+from resources.utils import parse_cell_range, parse_cell_reference
+
+PROPERTIES_PREFIX = 'PROPERTIES!'
+
+State = Tuple[Any, Optional[ErrorType]]
+
+
+class Engine:
+    """Dependency graph, dirty tracking and recalculation shared by ``Model`` and ``Workbook``.
+
+    Nodes are the items of the application or the records of a workbook. The engine only uses
+    their ``formula``, ``python_formula``, ``bound_references``, ``value`` and ``error``, and
+    ``formula_anchor``, ``get_state``, ``set_error`` and ``evaluate_formula``. The owner looks up
+    sheets, cells and properties by name for ``resolve_reference``, and ``calculate`` is called
+    when edits outside a batch or the end of the outermost batch leave dirty nodes.
+    """
+
+    def __init__(self, find_sheet: Callable[[str], Any], find_cell: Callable[[str, int, int], Any],
+                 find_property: Callable[[str], Any], position: Callable[[Any], Any],
+                 calculate: Optional[Callable[[], Any]] = None):
+        self.find_sheet = find_sheet
+        self.find_cell = find_cell
+        self.find_property = find_property
+        self.calculate = calculate if calculate is not None else self.recalculate
+        self.graph = DependencyGraph(position)
+        self.dirty: Set[Any] = set()
+        self.dirty_roots: Set[Any] = set()  # nodes changed directly, always evaluated
+        self.previous_states: Dict[Any, State] = {}  # state of the dirty nodes before the change
+        self.evaluation_counter: Counter = Counter()  # 'evaluated' and 'skipped' dirty nodes, for measurements
+        self.referencing: Dict[str, Set[Any]] = defaultdict(set)  # nodes by sheet and property names they read
+        self.referenced_names: Dict[Any, Set[str]] = {}
+        self.batch_depth = 0
+        self._pending_rebinds: Set[Any] = set()
+        self._pending_ranges: Set[str] = set()
+
+    ###############################################
+    # Edits
+
+    @contextmanager
+    def batch(self, discard: bool = False) -> Iterator[None]:
+        """Group edits so that references are resolved again and dirty nodes calculated only once.
+
+        With ``discard`` the pending rebinds and dirty marks are dropped on exit instead, for nodes
+        given their calculated values while loading. Blocks can be nested.
+        """
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                nodes, self._pending_rebinds = self._pending_rebinds, set()
+                names, self._pending_ranges = self._pending_ranges, set()
+                if discard:
+                    self.dirty.clear()
+                    self.dirty_roots.clear()
+                    self.previous_states.clear()
+                else:
+                    self.rebind_nodes(nodes, names)
+                    self.calculate()
+
+    def mark_dirty(self, node: Any) -> None:
+        """Mark a node and everything depending on it dirty, recording their state before the change.
+
+        The node itself is always evaluated by the next recalculation, its dependents only if one
+        of their precedents changes value.
+        """
+        self.dirty_roots.add(node)
+        if node in self.dirty:
+            return
+        self.dirty.add(node)
+        self.previous_states[node] = node.get_state()
+        to_process = deque([node])
+
+        # Everything depending on a dirty node is dirty already, so the walk stops at dirty nodes
+        while to_process:
+            for dependent in self.graph.dependents(to_process.popleft()):
+                if dependent not in self.dirty:
+                    self.previous_states[dependent] = dependent.get_state()
+                    self.dirty.add(dependent)
+                    to_process.append(dependent)
+
+    def bind(self, node: Any) -> None:
+        """Compile the formula of the node if needed and resolve its references.
+
+        Evaluation only reads ``bound_references``; they are resolved again here when the formula
+        changes and by ``rebind`` on structural changes.
+        """
+        formula = node.formula
+        if isinstance(formula, str) and formula.startswith('='):
+            if node.python_formula is None or node.python_formula.formula != formula:
+                node.python_formula = Compiler.compile(formula, node.formula_anchor())
+            node.bound_references = [self.resolve_reference(kind, address)
+                                     for kind, address in node.python_formula.references]
+            names = node.python_formula.referenced_names()
+        else:
+            node.python_formula = None
+            node.bound_references = []
+            names = set()
+        self.graph.set_precedents(node, {reference for reference in node.bound_references if reference})
+        self.register_references(node, names)
+
+    def resolve_reference(self, kind: str, address: str) -> Any:
+        """Node (or shared range) a reference of a compiled formula points to, None if there is none."""
+        if kind == ReferenceKind.CELL:
+            sheet_name, row, column = parse_cell_reference(address)
+            return self.find_cell(sheet_name, row, column) if sheet_name is not None else None
+        if kind == ReferenceKind.RANGE:
+            sheet_name, start_row, start_col, end_row, end_col = parse_cell_range(address)
+            if sheet_name is None:
+                return None
+            return self.graph.cell_range(sheet_name, start_row, start_col, end_row, end_col,
+                                         self.find_sheet(sheet_name))
+        if kind == ReferenceKind.PROPERTY:
+            name = address[len(PROPERTIES_PREFIX):]
+            return self.find_property(name) if name else None
+        return None
+
+    def register_references(self, node: Any, names: Set[str]) -> None:
+        """Index the node under every sheet and property name its formula refers to."""
+        old = self.referenced_names.pop(node, set())
+        for name in old - names:
+            self.referencing[name].discard(node)
+            if not self.referencing[name]:
+                del self.referencing[name]
+        for name in names - old:
+            self.referencing[name].add(node)
+        if names:
+            self.referenced_names[node] = names
+
+    def rebind(self, *names: str) -> None:
+        """Resolve again the references of the formulas reading one of the names.
+
+        Called on structural changes only: rows added to or removed from a sheet and items added,
+        renamed or deleted. In a batch the formulas reading the names now are rebound when it
+        exits, formulas bound later in the batch already see the change.
+        """
+        nodes = set()
+        for name in names:
+            nodes.update(self.referencing.get(name, ()))
+        if self.batch_depth:
+            self._pending_rebinds.update(nodes)
+            self._pending_ranges.update(names)
+            return
+        self.rebind_nodes(nodes, names)
+        self.calculate()
+
+    def rebind_nodes(self, nodes: Set[Any], names: Set[str]) -> None:
+        for node in nodes:
+            if node in self.referenced_names:  # not removed since
+                self.mark_dirty(node)
+                node.error = None
+                self.bind(node)
+        for name in names:
+            self.graph.refresh_ranges(name)
+
+    def replace_reference(self, node: Any, removed: Any) -> None:
+        """Replace the references of the node to a removed cell or item by the '#REF!' error literal."""
+        if self.graph.depends_on(node, removed):
+            node.formula = node.formula.replace(removed.name, ErrorType.REF.value[0])
+            self.mark_dirty(node)
+            # The reference may go through a range, binding again drops its edge as well
+            self.bind(node)
+
+    def insert_rows(self, sheet_name: str, insert: Callable[[], None]) -> None:
+        """Insert rows into a sheet with ``insert``, then resolve again the formulas reading the sheet."""
+        with self.batch():
+            insert()
+            self.graph.invalidate_ranges(sheet_name)
+            self.rebind(sheet_name)
+
+    def remove_rows(self, sheet_name: str, cells: Iterable[Any], remove: Callable[[], None]) -> None:
+        """Remove rows from a sheet with ``remove``, the formulas reading their ``cells`` get '#REF!' instead."""
+        with self.batch():
+            for cell in cells:
+                if cell is not None:
+                    for dependent in list(self.graph.dependents(cell)):
+                        self.replace_reference(dependent, cell)
+                    self.forget(cell)
+            remove()
+            self.graph.invalidate_ranges(sheet_name)
+            self.rebind(sheet_name)
+
+    def forget(self, node: Any) -> None:
+        """Drop a removed node from the graph, the name index and the dirty nodes."""
+        self.graph.remove_node(node)
+        self.register_references(node, set())
+        self.dirty.discard(node)
+        self.dirty_roots.discard(node)
+        self.previous_states.pop(node, None)
+
+    ###############################################
+    # Recalculation
+
+    def prepare(self, needed: Set[Any]) -> Recalculation:
+        """Recalculation of the needed dirty nodes, giving the nodes in a cycle the circular error."""
+        cyclic = set()
+        for component in self.graph.cycles(needed):
+            for node in component:
+                node.set_error(ErrorType.CIRCULAR)
+            cyclic.update(component)
+
+        recalculation = Recalculation(self, needed, self.graph.topological_sort(
+            node for node in needed if node not in cyclic))
+        # Dependents of a cycle read its error value when evaluated
+        for node in cyclic:
+            recalculation.changed_precedents.update(self.graph.dependents(node))
+        return recalculation
+
+    def finish(self, recalculation: Recalculation) -> None:
+        """Record the outcome of a recalculation, once it has completed or been cancelled."""
+        self.evaluation_counter['evaluated'] += recalculation.evaluated
+        self.evaluation_counter['skipped'] += recalculation.skipped
+
+        # Nodes left out and the nodes a cancelled pass did not reach keep their previous state, they
+        # are evaluated when needed if a precedent changed
+        left = (self.dirty - recalculation.needed) | self.dirty.intersection(recalculation.order)
+        for node in left:
+            if node in recalculation.changed_precedents:
+                self.dirty_roots.add(node)
+
+        assert all(node.error is ErrorType.CIRCULAR or node in left for node in self.dirty), \
+            "Some cells are still marked as dirty after calculation."
+        self.dirty.intersection_update(left)
+        self.dirty_roots.intersection_update(left)
+        for node in recalculation.needed - left:
+            self.previous_states.pop(node, None)
+
+    def recalculate(self) -> int:
+        """Evaluate every dirty node at once, returns the number evaluated."""
+        if not self.dirty or self.batch_depth:
+            return 0
+        recalculation = self.prepare(set(self.dirty))
+        recalculation.run()
+        self.finish(recalculation)
+        return recalculation.evaluated
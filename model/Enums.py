@@ -14,6 +14,43 @@ class ErrorType(Enum):
     CIRCULAR = ('#CIRCULAR!', 'Circular reference detected.')
 
 
+class FormulaError(str):
+    """Error value of a formula, such as ``#DIV/0!``.
+
+    Errors flow through compiled formulas like ordinary values: any arithmetic or ordering
+    comparison with an error returns the error, so a formula reading an error evaluates to it
+    without raising. There is one instance per ``ErrorType``, get it with ``FormulaError.of``.
+    As a ``str`` it displays and exports as its error text.
+    """
+
+    def __new__(cls, error_type: ErrorType):
+        error = super().__new__(cls, error_type.value[0])
+        error.error_type = error_type
+        return error
+
+    @staticmethod
+    def of(error_type: ErrorType) -> 'FormulaError':
+        return ERROR_VALUES[error_type]
+
+    def __reduce__(self):
+        return FormulaError.of, (self.error_type,)
+
+    def __repr__(self):
+        return f"FormulaError({self.error_type.name})"
+
+    def _propagate(self, *args):
+        return self
+
+    __add__ = __radd__ = __sub__ = __rsub__ = _propagate
+    __mul__ = __rmul__ = __truediv__ = __rtruediv__ = _propagate
+    __neg__ = __pos__ = _propagate
+    __lt__ = __le__ = __gt__ = __ge__ = _propagate
+
+
+ERROR_VALUES = {error_type: FormulaError(error_type) for error_type in ErrorType}
+ERROR_TYPES_BY_TEXT = {error_type.value[0]: error_type for error_type in ErrorType}
+
+
 class FormulaType(Enum):
     NUMBER = 'NUMBER'
     STRING = 'STRING'
@@ -0,0 +1,140 @@
+from typing import List, Any, Tuple, Union
+
+import numpy as np
+
+from model.ColumnStore import Numbers
+from model.Enums import ErrorType, FormulaError
+from model.RangeIndex import CellRange
+from resources.parser import Compiler
+from resources.utils import Empty
+
+
+def range_numbers(cells: Union[CellRange, List[Any]]) -> Union[List[Numbers], FormulaError]:
+    """Values of a range of cells as arrays with the mask of the numeric ones, or its first error.
+
+    Ranges of a sheet with a column store are views of its arrays. Text, booleans, empty and
+    missing cells are masked out.
+    """
+    if isinstance(cells, CellRange):
+        store = getattr(cells.sheet, 'store', None)
+        if store is not None:
+            return store.numbers(cells.start_row, cells.start_col, cells.end_row, cells.end_col)
+    values = ['' if cell is None else cell.value for cell in cells]
+    numeric = [type(value) is float or type(value) is int for value in values]
+    if all(numeric):
+        return [(np.array(values, dtype=float), np.ones(len(values), dtype=bool))]
+    for value, is_number in zip(values, numeric):
+        if not is_number and isinstance(value, FormulaError):
+            return value
+    return [(np.array([value if is_number else 0.0 for value, is_number in zip(values, numeric)], dtype=float),
+             np.array(numeric, dtype=bool))]
+
+
+def numbers(arguments: Tuple[Any, ...]) -> Union[List[Numbers], FormulaError]:
+    """Numbers of the arguments of an aggregate function, one array per range and one for the
+    other arguments, or the first error among them."""
+    parts = []
+    scalars = []
+    for argument in arguments:
+        if isinstance(argument, FormulaError):
+            return argument
+        if type(argument) is float or type(argument) is int:
+            scalars.append(argument)
+        elif isinstance(argument, (CellRange, list)):
+            numbers_of_range = range_numbers(argument)
+            if isinstance(numbers_of_range, FormulaError):
+                return numbers_of_range
+            parts.extend(numbers_of_range)
+    if scalars:
+        parts.append((np.array(scalars, dtype=float), np.ones(len(scalars), dtype=bool)))
+    return parts
+
+
+def sum_function(*arguments: Any) -> Union[float, FormulaError]:
+    """Sum the numbers of the arguments, or return the first error among them."""
+    parts = numbers(arguments)
+    if isinstance(parts, FormulaError):
+        return parts
+    return float(sum(values.sum() for values, _ in parts))
+
+
+def average_function(*arguments: Any) -> Union[float, FormulaError]:
+    parts = numbers(arguments)
+    if isinstance(parts, FormulaError):
+        return parts
+    count = sum(int(np.count_nonzero(mask)) for _, mask in parts)
+    if count == 0:
+        return FormulaError.of(ErrorType.DIV)
+    return float(sum(values.sum() for values, _ in parts)) / count
+
+
+def max_function(*arguments: Any) -> Union[float, FormulaError]:
+    parts = numbers(arguments)
+    if isinstance(parts, FormulaError):
+        return parts
+    result = max((np.max(values, where=mask, initial=-np.inf) for values, mask in parts), default=-np.inf)
+    return float(result) if result != -np.inf else 0.0
+
+
+def min_function(*arguments: Any) -> Union[float, FormulaError]:
+    parts = numbers(arguments)
+    if isinstance(parts, FormulaError):
+        return parts
+    result = min((np.min(values, where=mask, initial=np.inf) for values, mask in parts), default=np.inf)
+    return float(result) if result != np.inf else 0.0
+
+
+def logical_values(arguments: Tuple[Any, ...]) -> Union[List[bool], FormulaError]:
+    """Truth values of the numbers and booleans of the arguments, or the first error among them."""
+    values = []
+    for argument in arguments:
+        if isinstance(argument, FormulaError):
+            return argument
+        if not isinstance(argument, (CellRange, list)):
+            if isinstance(argument, (bool, int, float)) and type(argument) is not Empty:
+                values.append(bool(argument))
+            continue
+        for cell in argument:
+            value = cell.value if cell is not None else None
+            if isinstance(value, FormulaError):
+                return value
+            if isinstance(value, (bool, int, float)) and type(value) is not Empty:
+                values.append(bool(value))
+    return values
+
+
+def and_function(*arguments: Any) -> Union[bool, FormulaError]:
+    values = logical_values(arguments)
+    if isinstance(values, FormulaError):
+        return values
+    if not values:
+        return FormulaError.of(ErrorType.VALUE)
+    return all(values)
+
+
+def or_function(*arguments: Any) -> Union[bool, FormulaError]:
+    values = logical_values(arguments)
+    if isinstance(values, FormulaError):
+        return values
+    if not values:
+        return FormulaError.of(ErrorType.VALUE)
+    return any(values)
+
+
+def if_function(logical_test, value_if_true, value_if_false):
+    if isinstance(logical_test, FormulaError):
+        return logical_test
+    if logical_test:
+        return value_if_true
+    else:
+        return value_if_false
+
+
+# Registered on import, so worker processes evaluating formulas without the Qt model have them too
+Compiler.register_function('SUM', sum_function)
+Compiler.register_function('AVERAGE', average_function)
+Compiler.register_function('MAX', max_function)
+Compiler.register_function('MIN', min_function)
+Compiler.register_function('AND', and_function)
+Compiler.register_function('OR', or_function)
+Compiler.register_function('IF', if_function)
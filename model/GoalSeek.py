@@ -0,0 +1,176 @@
+import math
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from model.DependencyGraph import DependencyGraph
+from model.Enums import ErrorType
+from resources.utils import EMPTY
+
+
+class GoalSeekResult:
+    """Outcome of a goal seek: the input value found, the target value it gives and whether it hit the goal."""
+    __slots__ = ('value', 'result', 'iterations', 'converged')
+
+    def __init__(self, value: float, result: Any, iterations: int, converged: bool):
+        self.value = value
+        self.result = result
+        self.iterations = iterations
+        self.converged = converged
+
+    def __repr__(self) -> str:
+        return f"GoalSeekResult(value={self.value}, result={self.result}, iterations={self.iterations}, " \
+               f"converged={self.converged})"
+
+
+class Cone:
+    """Items between an input and a target: the target and the items it reads among the dependents
+    of the input, in evaluation order.
+
+    Changing the input can only change the target through these items, so evaluating them is
+    enough to know the new value of the target; the rest of the workbook is not touched.
+    """
+    __slots__ = ('source', 'order', 'dependents')
+
+    def __init__(self, graph: DependencyGraph, source: Any, target: Any):
+        reachable = set()
+        to_process = deque([source])
+        while to_process:
+            for dependent in graph.dependents(to_process.popleft()):
+                if dependent not in reachable:
+                    reachable.add(dependent)
+                    to_process.append(dependent)
+        if target not in reachable:
+            raise ValueError("The target does not depend on the input")
+        nodes = graph.precedent_closure([target], reachable)
+        if graph.cycles(nodes):
+            raise ValueError("The target is part of a circular reference")
+        self.source = source
+        self.order: List[Any] = graph.topological_sort(nodes)
+        self.dependents: Dict[Any, List[Any]] = {
+            node: [dependent for dependent in graph.dependents(node) if dependent in nodes]
+            for node in [source, *self.order]
+        }
+
+    def propagate(self, evaluate: Callable[[Any], None]) -> List[Any]:
+        """Evaluate the items after the input changed, with early cutoff; returns the evaluated items."""
+        changed = set(self.dependents[self.source])
+        evaluated = []
+        for node in self.order:
+            if node in changed:
+                state = node.get_state()
+                evaluate(node)
+                evaluated.append(node)
+                if node.get_state() != state:
+                    changed.update(self.dependents[node])
+        return evaluated
+
+
+def solve(function: Callable[[float], Any], goal: float, guess: float, low: Optional[float] = None,
+          high: Optional[float] = None, tolerance: float = 1e-9, max_iterations: int = 100) -> GoalSeekResult:
+    """Find x with ``function(x) == goal``.
+
+    Secant steps from ``guess`` (and from ``low`` and ``high`` when given) until two points bracket
+    the goal, then false position with the Illinois modification, which keeps the bracket and
+    converges superlinearly. Flat steps widen the search; a result that is not a number (an error)
+    stops it at the best point found. The goal is hit when the result is within ``tolerance`` of
+    it, relative to its size.
+    """
+    epsilon = tolerance * max(1.0, abs(goal))
+    iterations = 0
+
+    def residual(x: float) -> Optional[float]:
+        nonlocal iterations
+        iterations += 1
+        result = function(x)
+        if type(result) is bool or not isinstance(result, (int, float)) or not math.isfinite(result):
+            return None
+        return result - goal
+
+    points = []  # (x, residual) evaluated with a numeric result, most recent last
+    for x in (guess, low, high):
+        if x is not None:
+            y = residual(float(x))
+            if y is not None:
+                if abs(y) <= epsilon:
+                    return GoalSeekResult(float(x), y + goal, iterations, True)
+                points.append((float(x), y))
+    if len(points) == 1:
+        x = points[0][0]
+        step = abs(x) * 0.01 or 0.01
+        y = residual(x + step)
+        if y is not None:
+            points.append((x + step, y))
+
+    bracket = None  # (a, ya, b, yb) with ya and yb of opposite signs
+    for (xa, ya), (xb, yb) in zip(points, points[1:] + points[:1]):
+        if ya * yb < 0:
+            bracket = (xa, ya, xb, yb)
+    step = 0.01
+    side = 0  # endpoint kept by the last false position step, -1 for a and 1 for b
+
+    while iterations < max_iterations and points:
+        if bracket is not None:
+            a, ya, b, yb = bracket
+            x = (a * yb - b * ya) / (yb - ya)
+            if abs(b - a) <= epsilon * max(1.0, abs(x)):
+                break
+        else:
+            (x0, y0), (x1, y1) = points[-2:] if len(points) > 1 else (points[0], points[0])
+            if y1 != y0:
+                x = x1 - y1 * (x1 - x0) / (y1 - y0)
+            else:
+                step *= 2
+                x = x1 + (x1 - x0 or 1.0) * step * 100
+        y = residual(x)
+        if y is None:
+            break
+        if abs(y) <= epsilon:
+            return GoalSeekResult(x, y + goal, iterations, True)
+        if bracket is not None:
+            if y * yb < 0:
+                bracket = (b, yb, x, y)
+                side = 1
+            else:
+                bracket = (a, ya / 2 if side == -1 else ya, x, y)
+                side = -1
+        else:
+            for xp, yp in reversed(points):
+                if y * yp < 0:
+                    bracket = (xp, yp, x, y)
+                    break
+        points.append((x, y))
+
+    if not points:
+        return GoalSeekResult(float(guess), None, iterations, False)
+    x, y = min(points, key=lambda point: abs(point[1]))
+    return GoalSeekResult(x, y + goal, iterations, abs(y) <= epsilon)
+
+
+def seek(graph: DependencyGraph, source: Any, target: Any, goal: float,
+         restore: Callable[[Any, Any, Optional[ErrorType]], None],
+         apply: Optional[Callable[[float], None]] = None, **options: Any) -> GoalSeekResult:
+    """Find the value of the source making the target equal ``goal``, options as for ``solve``.
+
+    Each iteration sets the value of the source and evaluates only the ``Cone`` between the source
+    and the target. ``restore`` then gives every node it touched its value and error back, and a
+    solution found is passed to ``apply``.
+    """
+    if getattr(source, 'python_formula', None) is not None or \
+            not (type(source.value) is float or source.value is EMPTY):
+        raise ValueError(f"{source.name} must hold a number, not a formula or text")
+    cone = Cone(graph, source, target)
+    saved = [(node, node.value, node.error) for node in (source, *cone.order)]
+
+    def function(x: float) -> Any:
+        source.value = x
+        cone.propagate(lambda node: node.evaluate_formula())
+        return target.value
+
+    try:
+        result = solve(function, goal, float(source.value), **options)
+    finally:
+        for node, value, error in reversed(saved):
+            restore(node, value, error)
+    if apply is not None and result.converged:
+        apply(result.value)
+    return result
@@ -1,63 +1,56 @@
 import abc
-from collections import deque
-from typing import Optional, Dict, Any
+import itertools
+from typing import Optional, Dict, Any, Set, Tuple
 from PyQt6.QtCore import pyqtSignal, QEvent
 
-from resources.utils import is_convertible_to_float
+from model.Enums import FormulaError
+from resources.utils import EMPTY, state_value, to_value
 
 
 class Item:
+    _ids = itertools.count()
+
     textEditingFinishedSignal = pyqtSignal(object)
     activeItemChangedSignal = pyqtSignal(object)
 
     def __init__(self, formula=""):
         super().__init__()
+        self.id: int = next(Item._ids)  # stable identity, independent of the item's name or position
         self.formula: str = formula
-        self._value = ''
+        self._value: Any = EMPTY  # typed value, see resources.utils.to_value
         self.error: Optional['ErrorType'] = None
-        self.items_that_dependents_on_me: ['ItemWithFormula'] = []
 
     def __hash__(self):
-        return hash(self.name)
+        return self.id
 
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.name == other.name
+        if isinstance(other, Item):
+            return self.id == other.id
         return False
 
+    @property
+    def items_that_dependents_on_me(self) -> Set['ItemWithFormula']:
+        """Items whose formulas read this item, as kept by the dependency graph."""
+        from model.Model import dependency_graph
+        return dependency_graph.dependents(self)
+
     @property
     def value(self):
-        if is_convertible_to_float(self._value):
-            return float(self._value)
-        if self._value == '':
-            return 0
         return self._value
 
     @value.setter
     def value(self, value):
-        self._value = value
-        if self.error:
-            self._value = self.error.value[0]
+        self._value = to_value(value)
 
     def mark_dirty(self):
-        """Mark a cell as dirty and propagate this state to its dependents."""
-        from model.Model import dirty_items
-
-        if self not in dirty_items:
-            dirty_items.add(self)
-            to_process = deque([self])
-            processed = set()
-
-            while to_process:
-                current_cell = to_process.popleft()
-                if current_cell not in processed:
-                    processed.add(current_cell)
-                    for dep in current_cell.items_that_dependents_on_me:
-                        if dep not in dirty_items:
-                            dep.set_error()
-                            dirty_items.add(dep)
-                        if dep not in processed:
-                            to_process.append(dep)
+        """Mark a cell as dirty and propagate this state to its dependents, see ``Engine.mark_dirty``."""
+        from model.Model import Model, engine
+        Model.cancel_recalculation()
+        engine.mark_dirty(self)
+
+    def get_state(self) -> Tuple[Any, Optional['ErrorType']]:
+        """Value and error, compared before and after evaluation to find out if the item changed."""
+        return state_value(self._value), self.error
 
     def set_item(self, text):
         from model.Model import Model
@@ -67,28 +60,14 @@ class Item:
         Model.calculate_dirty_items()
 
     def set_error(self, error: Optional['ErrorType'] = None):
-        """Update the error state of this cell and propagate the change to dependent cells. """
+        """Update the error state of this cell.
+
+        The error value replaces the value; dependents get it when they are evaluated, as they read
+        the value like any other.
+        """
         self.error = error
         if error is not None:
-            self.value = self.error.value[0]
-
-        for cell in self.items_that_dependents_on_me:
-            if cell.error is not error:
-                cell.set_error(error)
-
-    def check_circular_dependency(self, target_cell: 'ItemWithFormula') -> bool:
-        """Check if there is a circular dependency from target_cell to start_cell."""
-        stack = [target_cell]
-        visited = set()
-
-        while stack:
-            cell = stack.pop()
-            if cell == self:
-                return True
-            if cell not in visited:
-                visited.add(cell)
-                stack.extend(cell.items_that_dependents_on_me)
-        return False
+            self.value = FormulaError.of(error)
 
     def focusInEvent(self, event: QEvent):
         super().focusInEvent(event)
@@ -108,9 +87,11 @@ class Item:
         pass
 
     def clean_up(self):
-        for item in self.items_that_dependents_on_me:
-            item.remove_dependent(self)
-        self.items_that_dependents_on_me.clear()
+        from model.Model import Model, engine
+        with Model.batch():
+            for item in list(self.items_that_dependents_on_me):
+                item.remove_dependent(self)
+            engine.forget(self)
 
     def recalculate(self):
         self.set_item(self.formula)
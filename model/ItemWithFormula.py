@@ -1,13 +1,13 @@
 import abc
 from enum import Enum, auto
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Set
 
-from model.Enums import FormulaType, ErrorType
+from model.Enums import FormulaType, FormulaError
 from model.Item import Item
 from resources import constants
 
-from resources.parser import Parser
-from resources.utils import is_convertible_to_float
+from resources.parser import CompiledFormula
+from resources.utils import is_convertible_to_float, to_value
 
 
 class NumberFormat(Enum):
@@ -27,12 +27,15 @@ class NumberFormat(Enum):
 
     @staticmethod
     def _format_general(value):
+        # Whole numbers are shown as the float they are stored as, whether a formula returned 1 or 1.0
+        if type(value) is int:
+            value = float(value)
         return str(value)
 
     @staticmethod
     def _format_number(value):
         if is_convertible_to_float(value):
-            return str(round(value, constants.DECIMAL_PLACES))
+            return str(round(float(value), constants.DECIMAL_PLACES))
         return str(value)
 
     @staticmethod
@@ -49,10 +52,11 @@ class NumberFormat(Enum):
 class ItemWithFormula(Item):
     def __init__(self, formula="", *args, **kwargs):
         super().__init__(formula)
-        self.items_that_i_depend_on: Dict[str, ItemWithFormula] = {}  # items and their representation in formula
         self.formula_type: FormulaType = FormulaType.NO_TYPE
-        self.python_formula = ''
+        self.python_formula: Optional[CompiledFormula] = None
+        self.bound_references: List[Any] = []  # resolved python_formula.references
         self.format: NumberFormat = NumberFormat.GENERAL
+        self.display_text: str = ''
 
     def __str__(self) -> str:
         return (
@@ -67,94 +71,80 @@ class ItemWithFormula(Item):
             f"{'-' * 80}"
         )
 
-    def add_dependent(self, cell: 'ItemWithFormula', reference_name: str):
-        self.items_that_i_depend_on[reference_name] = cell
+    @property
+    def items_that_i_depend_on(self) -> Set[Item]:
+        """Items this item's formula reads, as kept by the dependency graph."""
+        from model.Model import dependency_graph
+        return dependency_graph.precedents(self)
 
-    def remove_dependent(self, cell: 'ItemWithFormula'):
-        if cell.name in self.items_that_i_depend_on:
-            self.formula = self.formula.replace(cell.name,ErrorType.REF.value[0])
-            self.set_error(ErrorType.REF)
-            self.items_that_i_depend_on.pop(cell.name)
+    def remove_dependent(self, cell: Item):
+        """Replace the references to a deleted item by the '#REF!' error literal, see ``Engine.replace_reference``."""
+        from model.Model import Model, engine
+        Model.cancel_recalculation()
+        engine.replace_reference(self, cell)
 
     def evaluate_formula(self):
-        from model.Enums import ErrorType
         from model.Model import Model
 
-        if self.error is not None:
-            pass
-        self.error = None
-        try:
-            if self.formula_type == FormulaType.EXPRESSION:
-                self.python_formula = Parser.make_python_formula(self.formula)
-                self.value = Model.evaluate_formula(self.python_formula)
-            else:
-                self.value = self.formula
-        except ZeroDivisionError:
-            self.set_error(ErrorType.DIV)
-        except ValueError:
-            self.set_error(ErrorType.VALUE)
-        except (SyntaxError, NameError):
-            self.set_error(ErrorType.NAME)
-        except Exception:
-            self.set_error(ErrorType.NAME)
-
-    def update_dependencies(self, new_dependencies: List['ItemWithFormula']):
-        def remove_all_dependencies():
-            for name, dep in self.items_that_i_depend_on.items():
-                dep.items_that_dependents_on_me.remove(self)
-            self.items_that_i_depend_on.clear()
-
-        def add_dependencies(dependencies: List['ItemWithFormula']):
-            for dep_cell in dependencies:
-                if dep_cell is not None:
-                    if self not in dep_cell.items_that_dependents_on_me:
-                        dep_cell.items_that_dependents_on_me.append(self)
-
-                    self.add_dependent(dep_cell, dep_cell.name)
-
-        remove_all_dependencies()
-
-        if self.formula.startswith('='):
-            add_dependencies(new_dependencies)
+        if self.formula_type == FormulaType.EXPRESSION:
+            self.value = Model.evaluate_formula(self.python_formula, self.bound_references)
+        else:
+            self.value = self.formula
+
+    def formula_anchor(self) -> Optional[Tuple[int, int]]:
+        """Position the cell references of the formula are relative to (None for absolute)."""
+        return None
+
+    def bind(self):
+        """Compile the formula if needed and resolve its references to the items they point to, see
+        ``Engine.bind``; ``Model.rebind_references`` resolves them again on structural changes."""
+        from model.Model import Model, engine
+        Model.cancel_recalculation()
+        engine.bind(self)
 
     def set_item(self, formula):
         from model.Model import Model
         self.mark_dirty()
         self.formula = formula
-        self.python_formula = None
         self.set_error()
-        dep = Parser.parse_formula_for_dependencies(self.formula)
-        self.update_dependencies(dep)
         self.formula_type = FormulaType.determine_formula_type(formula)
+        self.bind()
         Model.calculate_dirty_items()
 
     @property
     def value(self):
-        if is_convertible_to_float(self._value):
-            return float(self._value)
-        if self._value == '':
-            return 0
         return self._value
 
     @value.setter
     def value(self, value):
-        self._value = value
-        if self.error:
-            self._value = self.error.value[0]
-        self.set_display_text()
+        """Store the typed value and the text displaying it.
+
+        The error follows the value, an error value sets it and any other value clears it.
+        """
+        from model.Model import Model
+        self._value = to_value(value)
+        self.error = value.error_type if isinstance(value, FormulaError) else None
+        self.display_text = self.format.format_value(value)
+        Model.request_display_update(self)
+
+    def preview(self, text: str):
+        """Show text being typed for the item, its value only changes once the edit is finished.
+
+        The value must stay the one the dependents were calculated from: ``mark_dirty`` records it
+        as the state before the edit, to skip the dependents if the edit does not change it.
+        """
+        from model.Model import Model
+        self.display_text = text
+        Model.request_display_update(self)
 
     @abc.abstractmethod
     def set_display_text(self):
         pass
 
     def clean_up(self):
-        for item in self.items_that_dependents_on_me:
-            item.remove_dependent(self)
-        for name,item in self.items_that_i_depend_on.items():
-            item.items_that_dependents_on_me.remove(self)
-
-        self.items_that_dependents_on_me.clear()
-        self.items_that_i_depend_on.clear()
+        super().clean_up()
+        self.python_formula = None
+        self.bound_references = []
 
     def get_dict_data(self) -> Dict[str, Any]:
         data = super().get_dict_data()
@@ -33,7 +33,7 @@ class LineEditItem(ItemWithFormula, QLineEdit):
         return self.objectName()
 
     def set_display_text(self):
-        self.setText(self.format.format_value(self._value))
+        self.setText(self.display_text)
 
     ###############################################
 
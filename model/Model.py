@@ -1,16 +1,43 @@
-from typing import List, Optional, Set, Union, Dict, Any
-from collections import deque, defaultdict
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Set, Union, Dict, Any, Iterator, Tuple
 
-from model.Enums import ErrorType
+from PyQt6.QtCore import QThread, QTimer
+
+from model import Functions
+from model.DependencyGraph import DependencyGraph
+from model.Engine import Engine
+from model.Enums import ErrorType, FormulaType
+from model.GoalSeek import GoalSeekResult, seek
 from model.Item import Item
 from model.ItemWithFormula import ItemWithFormula
+from model.Recalculation import Recalculation
 from model.Spreadsheet import SpreadsheetCell, Spreadsheet
+from resources import constants
 from resources.TabWidget import MyTab, GroupBox
-from resources.utils import parse_cell_reference, parse_cell_range, is_convertible_to_float
+from resources.parser import CompiledFormula
+from resources.utils import parse_cell_reference, parse_cell_range, state_value
+
+
+class RecalculationThread(QThread):
+    """Worker thread running a ``Recalculation`` off the GUI thread."""
+
+    def __init__(self, recalculation: Recalculation):
+        super().__init__()
+        self.recalculation = recalculation
+
+    def run(self):
+        self.recalculation.run()
 
 
 class Model:
     __active_item = None
+    __lazy_evaluation = False
+    __visible_tab: Optional[MyTab] = None  # the tab itself, it keeps its identity when renamed
+    __background_recalculation = False
+    __recalculation: Optional[Recalculation] = None
+    __recalculation_thread: Optional[RecalculationThread] = None
+    __display_timer: Optional[QTimer] = None
 
     @staticmethod
     def set_active_item(item) -> None:
@@ -21,64 +48,158 @@ class Model:
         return Model.__active_item
 
     @staticmethod
-    def calculate_dirty_items() -> None:
-        """Calculate and update the values of all dirty cells."""
-        global dirty_items
+    @contextmanager
+    def batch() -> Iterator[None]:
+        """Group edits into one rebind and recalculation, see ``Engine.batch``."""
+        Model.cancel_recalculation()
+        with engine.batch():
+            yield
+
+    @staticmethod
+    @contextmanager
+    def bulk_load() -> Iterator[None]:
+        """Create items taking calculated values with ``load_item``, nothing is recalculated on exit."""
+        Model.cancel_recalculation()
+        with engine.batch(discard=True):
+            yield
+
+    @staticmethod
+    def load_item(item: Item, formula: Any, value: Any, python_formula: Optional[CompiledFormula] = None) -> None:
+        """Give an item created in ``bulk_load`` its formula and calculated value, once its references exist."""
+        item.formula = formula
+        if isinstance(item, ItemWithFormula):
+            item.formula_type = FormulaType.determine_formula_type(formula)
+            item.python_formula = python_formula
+            item.bind()
+            if item.formula_type != FormulaType.EXPRESSION:
+                value = formula
+        item.value = state_value(value)
+
+    @staticmethod
+    def in_batch() -> bool:
+        return engine.batch_depth > 0
+
+    @staticmethod
+    def set_lazy_evaluation(enabled: bool) -> None:
+        """Calculate only the dirty items on the visible tab and the items they read, see ``get_needed_items``."""
+        Model.__lazy_evaluation = enabled
+        if not enabled:
+            Model.calculate_stale_items()
 
-        def topological_sort(cells: List[Item]) -> List[Item]:
-            """Perform a topological sort of the cells based on their dependencies, excluding cells with errors."""
-            # Filter out cells with errors
-            cells = [cell for cell in cells if cell.error is None]
+    @staticmethod
+    def set_visible_tab(tab: Optional[MyTab]) -> None:
+        Model.__visible_tab = tab
+        Model.calculate_dirty_items()
 
-            if not cells:
-                return []
+    @staticmethod
+    def calculate_stale_items() -> None:
+        """Calculate the dirty items left stale on hidden tabs, needed before saving or exporting."""
+        Model.calculate_dirty_items(evaluate_all=True)
 
-            # Initialize in-degree count for each cell
-            in_degree = defaultdict(int)
-            for cell in cells:
-                for dependent in cell.items_that_dependents_on_me:
-                    if dependent in cells:
-                        in_degree[dependent] += 1
+    @staticmethod
+    def get_tab(item: Item) -> Optional[MyTab]:
+        """Tab showing the item."""
+        name = item.position[0] if isinstance(item, SpreadsheetCell) else item.name
+        group_box = group_boxes_by_name.get(f"GroupBox_{name}")
+        return group_box.tab if group_box is not None else None
 
-            # Initialize queue with cells that have zero in-degree
-            zero_in_degree = deque(cell for cell in cells if in_degree[cell] == 0)
-            topological_order = []
+    @staticmethod
+    def get_needed_items() -> Set[Item]:
+        """Dirty items to calculate now: all of them, or with lazy evaluation those on the visible tab
+        and the dirty items they read."""
+        if not Model.__lazy_evaluation or Model.__visible_tab is None:
+            return set(dirty_items)
+        visible = set()
+        for item in dirty_items:
+            tab = Model.get_tab(item)
+            if tab is None or tab is Model.__visible_tab:
+                visible.add(item)
+        return dependency_graph.precedent_closure(visible, dirty_items)
 
-            while zero_in_degree:
-                cell = zero_in_degree.popleft()
-                topological_order.append(cell)
-                for dependent in cell.items_that_dependents_on_me:
-                    if dependent in cells:
-                        in_degree[dependent] -= 1
-                        if in_degree[dependent] == 0:
-                            zero_in_degree.append(dependent)
+    @staticmethod
+    def set_background_recalculation(enabled: bool) -> None:
+        """Evaluate recalculations of ``constants.BACKGROUND_MIN_ITEMS`` items or more on a worker thread."""
+        Model.cancel_recalculation()
+        Model.__background_recalculation = enabled
+        if enabled and Model.__display_timer is None:
+            Model.__display_timer = QTimer()
+            Model.__display_timer.setInterval(constants.DISPLAY_UPDATE_INTERVAL)
+            Model.__display_timer.timeout.connect(Model.poll_recalculation)
 
-            if len(topological_order) != len(cells):
-                raise RuntimeError("Cyclic dependency detected")
-            return topological_order
+    @staticmethod
+    def set_parallel_recalculation(processes: int) -> None:
+        """Evaluate large independent components in up to ``processes`` worker processes, see ``Recalculation``."""
+        Model.cancel_recalculation()
+        Recalculation.shutdown_pool()
+        Recalculation.max_processes = processes
 
-        if not dirty_items:
+    @staticmethod
+    def calculate_dirty_items(evaluate_all: bool = False) -> None:
+        """Calculate and update the values of the dirty cells."""
+        Model.cancel_recalculation()
+        if not dirty_items or Model.in_batch():
             return
-        non_error_cells = []
-
-        # Detect circular dependencies
-        for cell in dirty_items:
-            for dependent in cell.items_that_dependents_on_me:
-                if cell.check_circular_dependency(dependent):
-                    cell.set_error(ErrorType.CIRCULAR)
-                    cell.evaluate_formula()
-            if cell.error is None:
-                non_error_cells.append(cell)
-
-        if non_error_cells:
-            order = topological_sort(non_error_cells)
+        needed = set(dirty_items) if evaluate_all else Model.get_needed_items()
+        Model.__recalculation = engine.prepare(needed)
+        order = Model.__recalculation.order
+        if Model.__background_recalculation and not evaluate_all and len(order) >= constants.BACKGROUND_MIN_ITEMS:
+            # Cell positions are cached here, the worker thread must not query the widgets
             for cell in order:
-                if cell in dirty_items:
-                    cell.evaluate_formula()
-                    dirty_items.discard(cell)
+                if isinstance(cell, SpreadsheetCell):
+                    cell.position
+            Model.__recalculation_thread = RecalculationThread(Model.__recalculation)
+            Model.__recalculation_thread.start()
+            Model.__display_timer.start()
+        else:
+            Model.__recalculation.run()
+            Model.finish_recalculation()
+
+    @staticmethod
+    def finish_recalculation() -> None:
+        """Record the outcome of the last recalculation, once it has completed or been cancelled."""
+        recalculation, Model.__recalculation = Model.__recalculation, None
+        Model.__recalculation_thread = None
+        if Model.__display_timer is not None:
+            Model.__display_timer.stop()
+        # Stale items keep their previous state, see Engine.finish
+        engine.finish(recalculation)
+        Model.flush_display_updates()
+
+    @staticmethod
+    def cancel_recalculation() -> None:
+        """Stop the running recalculation, called before the model is changed or read as a whole."""
+        if Model.__recalculation is None:
+            return
+        Model.__recalculation.cancel()
+        if Model.__recalculation_thread is not None:
+            Model.__recalculation_thread.wait()
+        Model.finish_recalculation()
+
+    @staticmethod
+    def poll_recalculation() -> None:
+        """Apply the values changed by the worker thread so far, called by the display timer."""
+        if Model.__recalculation_thread is not None and Model.__recalculation_thread.isFinished():
+            Model.finish_recalculation()
+        else:
+            Model.flush_display_updates()
+
+    @staticmethod
+    def request_display_update(item: ItemWithFormula) -> None:
+        """Show the item's new value, at the end of the recalculation if one is running."""
+        if Model.__recalculation is None:
+            item.set_display_text()
+        else:
+            with display_lock:
+                pending_display_items.add(item)
 
-        dirty_items = {cell for cell in dirty_items if not cell.error}
-        assert not dirty_items, "Some cells are still marked as dirty after calculation."
+    @staticmethod
+    def flush_display_updates() -> None:
+        global pending_display_items
+
+        with display_lock:
+            items, pending_display_items = pending_display_items, set()
+        for item in items:
+            item.set_display_text()
 
     @staticmethod
     def get_cell(row_or_address: Union[int, str], column: Optional[int] = None, sheet_name: Optional[str] = None) -> Optional[SpreadsheetCell]:
@@ -130,66 +251,86 @@ class Model:
         return Model.find_item(name)
 
     @staticmethod
-    def evaluate_formula(formula: str) -> str:
-        return str(eval(formula))
-
-    #########################################
+    def evaluate_formula(formula: CompiledFormula, references: List[Any]) -> Any:
+        """Evaluate a compiled formula to its native value (number, text, boolean or error value)."""
+        return formula(references)
 
     @staticmethod
-    def sum_function(cells: List['SpreadsheetCell']) -> float:
-        """Sum the values of a list of cells."""
-        total = 0.0
-        for cell in cells:
-            if is_convertible_to_float(cell.value):
-                total += float(cell.value)
-            else:
-                # Handle non-numeric values if needed
-                pass
-        return total
+    def rebind_references(*names: str) -> None:
+        """Resolve again the references of every formula referring to one of the given names, see
+        ``Engine.rebind``."""
+        Model.cancel_recalculation()
+        engine.rebind(*names)
 
-    @staticmethod
-    def if_function(logical_test, value_if_true, value_if_false):
-        if logical_test:
-            return value_if_true
-        else:
-            return value_if_false
+    #########################################
+
+    # Spreadsheet functions, implemented in model.Functions so they can run without Qt
+    sum_function = staticmethod(Functions.sum_function)
+    average_function = staticmethod(Functions.average_function)
+    max_function = staticmethod(Functions.max_function)
+    min_function = staticmethod(Functions.min_function)
+    and_function = staticmethod(Functions.and_function)
+    or_function = staticmethod(Functions.or_function)
+    if_function = staticmethod(Functions.if_function)
 
     #########################################
 
     @staticmethod
     def add_tab_to_db(tab: MyTab) -> None:
-        if any(existing_tab.name == tab.name for existing_tab in db):
+        if tab.name in tabs_by_name:
             raise NameError(f"Tab with name {tab.name} already exists.")
         db.add(tab)
+        tabs_by_name[tab.name] = tab
+        for group_box in tab.group_boxes:
+            Model.add_group_box_to_db(group_box)
+
+    @staticmethod
+    def add_group_box_to_db(group_box: GroupBox) -> None:
+        """Index a group box (and its item) that has been added to a tab."""
+        group_boxes_by_name[group_box.name] = group_box
+        items_by_name[group_box.item.name] = group_box.item
+
+    @staticmethod
+    def remove_group_box_from_db(group_box: GroupBox) -> None:
+        """Drop a group box (and its item) that has been removed from its tab from the indexes."""
+        if group_boxes_by_name.get(group_box.name) is group_box:
+            del group_boxes_by_name[group_box.name]
+        if items_by_name.get(group_box.item.name) is group_box.item:
+            del items_by_name[group_box.item.name]
+
+    @staticmethod
+    def update_group_box_name(group_box: GroupBox, old_item_name: str, old_group_box_name: str) -> None:
+        """Re-key the indexes after a group box and its item have been renamed."""
+        if group_boxes_by_name.get(old_group_box_name) is not group_box:
+            return
+        del group_boxes_by_name[old_group_box_name]
+        if items_by_name.get(old_item_name) is group_box.item:
+            del items_by_name[old_item_name]
+        Model.add_group_box_to_db(group_box)
 
     @staticmethod
     def find_tab(name: str) -> Optional[MyTab]:
         """Find a tab by name."""
-        return next((tab for tab in db if tab.name == name), None)
+        return tabs_by_name.get(name)
 
     @staticmethod
     def find_item(name: str) -> Optional[Item]:
         """Find an item by name within all tabs."""
-        for tab in db:
-            for group_box in tab.group_boxes:
-                if group_box.item.name == name:
-                    return group_box.item
-        return None
+        return items_by_name.get(name)
 
     @staticmethod
     def find_groupBox(gb_name: str) -> Optional[GroupBox]:
-        for tab in db:
-            for group_box in tab.group_boxes:
-                if group_box.name == gb_name:
-                    return group_box
-        return None
+        return group_boxes_by_name.get(gb_name)
 
     @staticmethod
-    def remove_tab(name: str) -> None:
+    def remove_tab(name: str) -> Optional[MyTab]:
         """Remove a tab by name."""
-        tab = Model.find_tab(name)
+        tab = tabs_by_name.pop(name, None)
         if tab:
             db.remove(tab)
+            for group_box in tab.group_boxes:
+                Model.remove_group_box_from_db(group_box)
+        return tab
 
     @staticmethod
     def remove_groupBox(gb_name: str):
@@ -206,25 +347,31 @@ class Model:
 
     @staticmethod
     def update_item(name: str, updated_item: Item) -> None:
-        Model.find_groupBox(name).item = updated_item
+        group_box = Model.find_groupBox(name)
+        Model.remove_group_box_from_db(group_box)
+        group_box.item = updated_item
+        Model.add_group_box_to_db(group_box)
 
     @staticmethod
     def rename_tab(old_tab_name: str, new_tab_name: str) -> None:
-        Model.find_tab(old_tab_name).setObjectName(new_tab_name)
+        tab = tabs_by_name.pop(old_tab_name)
+        tab.setObjectName(new_tab_name)
+        tabs_by_name[new_tab_name] = tab
 
     @staticmethod
     def rename_item(old_item_name: str, new_item_name: str) -> None:
-        Model.find_item(old_item_name).name = new_item_name
+        Model.find_groupBox(f"GroupBox_{old_item_name}").name = new_item_name
 
     @staticmethod
     def pop_groupBox(gb_name: str) -> Optional[GroupBox]:
         """Find and remove a GroupBox from its containing tab."""
-        for tab in db:
-            for group_box in tab.group_boxes:
-                if group_box.name == gb_name:
-                    tab.group_boxes.remove(group_box)
-                    return group_box
-        return None
+        group_box = group_boxes_by_name.get(gb_name)
+        if group_box is None or group_box.tab is None:
+            return None
+        group_box.tab.group_boxes.remove(group_box)
+        group_box.tab = None
+        Model.remove_group_box_from_db(group_box)
+        return group_box
 
     @staticmethod
     def move_group_box(group_box_name: str, new_tab_name: str) -> None:
@@ -247,8 +394,31 @@ class Model:
 
     @staticmethod
     def recalculate():
-        for tab in Model.get_list_of_tabs():
-            tab.recalculate()
+        with Model.batch():
+            for tab in Model.get_list_of_tabs():
+                tab.recalculate()
+
+    @staticmethod
+    def find_input(address: str) -> Optional[Item]:
+        """Property (by name, with or without 'PROPERTIES!') or cell (such as 'Dach!E1') of an address."""
+        if address.startswith('PROPERTIES!'):
+            return Model.get_property(address)
+        return Model.find_item(address) if '!' not in address else Model.get_cell(address)
+
+    @staticmethod
+    def goal_seek(source: Item, target: Item, goal: float, apply: bool = True, **options: Any) -> GoalSeekResult:
+        """Find the value of an input item making the target equal ``goal``, see ``GoalSeek.seek``.
+
+        A solution found is set on the input as an ordinary edit, which updates its other dependents.
+        """
+        def restore(item: Item, value: Any, error: Optional[ErrorType]) -> None:
+            item.value = state_value(value)  # the value setters show it again and put the error back
+
+        def apply_value(value: float) -> None:
+            source.set_item(str(value) if isinstance(source, ItemWithFormula) else value)
+
+        Model.calculate_stale_items()
+        return seek(dependency_graph, source, target, goal, restore, apply_value if apply else None, **options)
 
     @staticmethod
     def get_dict_data() -> List[Dict[str, Any]]:
@@ -258,5 +428,20 @@ class Model:
         return data
 
 
-dirty_items: Set[Item] = set()
+engine: Engine = Engine(Model.find_item, lambda sheet_name, row, column: Model.get_cell(row, column, sheet_name),
+                        Model.find_item, lambda item: item.position if isinstance(item, SpreadsheetCell) else None,
+                        Model.calculate_dirty_items)
+# The state of the engine, under the names the rest of the application uses; never reassigned
+dirty_items: Set[Item] = engine.dirty
+dirty_roots: Set[Item] = engine.dirty_roots
+previous_states: Dict[Item, Tuple[Any, Optional[ErrorType]]] = engine.previous_states
+evaluation_counter = engine.evaluation_counter
+dependency_graph: DependencyGraph = engine.graph
+pending_display_items: Set[ItemWithFormula] = set()  # widgets to update once the recalculation yields
+display_lock = threading.Lock()
 db: Set[MyTab] = set()
+
+# Name indexes over db, kept in sync by the methods adding, renaming, moving and removing tabs and group boxes
+tabs_by_name: Dict[str, MyTab] = {}
+group_boxes_by_name: Dict[str, GroupBox] = {}
+items_by_name: Dict[str, Item] = {}
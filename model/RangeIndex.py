@@ -0,0 +1,122 @@
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Any
+
+Position = Tuple[str, int, int]  # sheet name, zero-based row and column
+RangeKey = Tuple[str, int, int, int, int]
+
+
+class CellRange:
+    """A rectangular range of cells, such as ``Sheet!A1:A5000``, read by one or more formulas.
+
+    Formulas referring to the same range share one record, which is a single node of the dependency
+    graph instead of one edge per cell. ``sheet`` only needs a ``get_cells`` method returning the
+    cells of a rectangle; they are cached until ``invalidate`` is called on structural changes.
+    """
+    __slots__ = ('sheet_name', 'start_row', 'start_col', 'end_row', 'end_col', '_sheet', '_cells')
+
+    def __init__(self, sheet_name: str, start_row: int, start_col: int, end_row: int, end_col: int,
+                 sheet: Any = None):
+        self.sheet_name = sheet_name
+        self.start_row = start_row
+        self.start_col = start_col
+        self.end_row = end_row
+        self.end_col = end_col
+        self._sheet = sheet
+        self._cells: Optional[List[Any]] = None
+
+    def __repr__(self) -> str:
+        return f"CellRange({self.sheet_name}!R{self.start_row}C{self.start_col}:R{self.end_row}C{self.end_col})"
+
+    @property
+    def key(self) -> RangeKey:
+        return self.sheet_name, self.start_row, self.start_col, self.end_row, self.end_col
+
+    def __len__(self) -> int:
+        return max(self.end_row - self.start_row + 1, 0) * max(self.end_col - self.start_col + 1, 0)
+
+    @property
+    def sheet(self) -> Any:
+        return self._sheet
+
+    @sheet.setter
+    def sheet(self, sheet: Any):
+        if sheet is not self._sheet:
+            self._sheet = sheet
+            self._cells = None
+
+    def invalidate(self) -> None:
+        """Forget the cached cells, call after rows of the sheet have been added or removed."""
+        self._cells = None
+
+    def __iter__(self) -> Iterator[Any]:
+        """The cells of the range row by row, None for cells that do not exist."""
+        if self._cells is None:
+            if self._sheet is None:
+                self._cells = [None] * len(self)
+            else:
+                self._cells = self._sheet.get_cells(self.start_row, self.start_col, self.end_row, self.end_col)
+        return iter(self._cells)
+
+    def contains(self, row: int, col: int) -> bool:
+        return self.start_row <= row <= self.end_row and self.start_col <= col <= self.end_col
+
+
+class RangeIndex:
+    """Cell ranges per sheet and column, answering which ranges contain a given cell.
+
+    A point query looks up the ranges crossing the cell's column and checks their rows, so its cost
+    depends on the number of ranges over that column, not on their size.
+    """
+
+    def __init__(self):
+        self._records: Dict[RangeKey, CellRange] = {}
+        self._columns: Dict[Tuple[str, int], Set[CellRange]] = {}
+        self._sheets: Dict[str, Set[CellRange]] = {}
+
+    def __contains__(self, cell_range: CellRange) -> bool:
+        return cell_range in self._sheets.get(cell_range.sheet_name, ())
+
+    def __len__(self) -> int:
+        return sum(len(ranges) for ranges in self._sheets.values())
+
+    def intern(self, sheet_name: str, start_row: int, start_col: int, end_row: int, end_col: int) -> CellRange:
+        """The shared record of the range, created if needed. It is indexed once passed to ``add``."""
+        key = (sheet_name, start_row, start_col, end_row, end_col)
+        cell_range = self._records.get(key)
+        if cell_range is None:
+            cell_range = self._records[key] = CellRange(*key)
+        return cell_range
+
+    def add(self, cell_range: CellRange) -> None:
+        self._records[cell_range.key] = cell_range
+        self._sheets.setdefault(cell_range.sheet_name, set()).add(cell_range)
+        for col in range(cell_range.start_col, cell_range.end_col + 1):
+            self._columns.setdefault((cell_range.sheet_name, col), set()).add(cell_range)
+
+    def remove(self, cell_range: CellRange) -> None:
+        if self._records.get(cell_range.key) is cell_range:
+            del self._records[cell_range.key]
+        RangeIndex._discard(self._sheets, cell_range.sheet_name, cell_range)
+        for col in range(cell_range.start_col, cell_range.end_col + 1):
+            RangeIndex._discard(self._columns, (cell_range.sheet_name, col), cell_range)
+
+    def containing(self, sheet_name: str, row: int, col: int) -> List[CellRange]:
+        ranges = self._columns.get((sheet_name, col))
+        if not ranges:
+            return []
+        return [cell_range for cell_range in ranges if cell_range.start_row <= row <= cell_range.end_row]
+
+    def ranges(self, sheet_name: str) -> List[CellRange]:
+        return list(self._sheets.get(sheet_name, ()))
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._columns.clear()
+        self._sheets.clear()
+
+    @staticmethod
+    def _discard(index: Dict[Any, Set[CellRange]], key: Any, cell_range: CellRange) -> None:
+        ranges = index.get(key)
+        if ranges is not None:
+            ranges.discard(cell_range)
+            if not ranges:
+                del index[key]
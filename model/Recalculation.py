@@ -0,0 +1,172 @@
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from model.ComponentSnapshot import ComponentSnapshot, Result, evaluate_snapshot
+from resources import constants
+
+
+class Recalculation:
+    """One pass of an ``Engine`` evaluating the needed dirty items in topological order.
+
+    Early cutoff: a dependent is evaluated only if one of its precedents changed value, otherwise it
+    keeps its previous state. The pass only touches the engine and its items, never the widgets, so
+    it can run on the ``RecalculationThread`` of ``Model``. Once cancelled it stops before the next
+    item, the items it did not reach are still dirty.
+
+    With ``max_processes`` above 1, large independent components of the dirty formulas are evaluated
+    in worker processes on a ``ComponentSnapshot``, while the rest is evaluated here. The pool is
+    started by the first recalculation with several large components, with one process per
+    component up to ``max_processes``, and grown when a later one has more.
+    """
+    max_processes = 0
+    executor: Optional[Executor] = None
+    pool_size = 0
+
+    def __init__(self, engine, needed: Set[Any], order: List[Any]):
+        self.engine = engine
+        self.needed = needed
+        self.order = order
+        self.changed_precedents: Set[Any] = set()
+        self.evaluated = 0
+        self.skipped = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @staticmethod
+    def pool(processes: int) -> Executor:
+        """The process pool, started or grown to ``processes`` workers (at most ``max_processes``)."""
+        processes = min(processes, Recalculation.max_processes)
+        if Recalculation.executor is None or Recalculation.pool_size < processes:
+            Recalculation.shutdown_pool()
+            Recalculation.executor = ProcessPoolExecutor(processes, mp_context=get_context('spawn'))
+            Recalculation.pool_size = processes
+        return Recalculation.executor
+
+    @staticmethod
+    def shutdown_pool() -> None:
+        if Recalculation.executor is not None:
+            Recalculation.executor.shutdown(wait=False, cancel_futures=True)
+        Recalculation.executor = None
+        Recalculation.pool_size = 0
+
+    def run(self) -> None:
+        if Recalculation.max_processes < 2 or len(self.order) < 2 * constants.PARALLEL_MIN_COMPONENT:
+            self.evaluate(self.order)
+        else:
+            self.evaluate_in_parallel()
+
+    def evaluate(self, order: List[Any]) -> bool:
+        """Evaluate the given dirty items in order, False if cancelled before the end."""
+        engine = self.engine
+        for cell in order:
+            if self._cancelled.is_set():
+                return False
+            if cell not in engine.dirty:
+                continue
+            engine.dirty.discard(cell)
+            if cell in engine.dirty_roots or cell in self.changed_precedents:
+                cell.evaluate_formula()
+                self.evaluated += 1
+                if cell.get_state() != engine.previous_states.get(cell):
+                    self.changed_precedents.update(engine.graph.dependents(cell))
+            else:
+                cell.error = engine.previous_states[cell][1]
+                self.skipped += 1
+        return True
+
+    def evaluate_in_parallel(self) -> None:
+        """Evaluate the items without expression first, then the components of the formulas reading them.
+
+        Formulas of different tabs usually share only property inputs, which are evaluated first,
+        so they fall into separate components. Summary formulas reading several components are
+        evaluated last.
+        """
+        engine = self.engine
+        # Items without a formula, such as check boxes, have no python_formula at all
+        formulas = [cell for cell in self.order if getattr(cell, 'python_formula', None) is not None]
+        inputs = set(self.order).difference(formulas)
+        if not self.evaluate([cell for cell in self.order if cell in inputs]):
+            return
+
+        components, joins = self.partition(formulas)
+        large = [component for component in components if len(component) >= constants.PARALLEL_MIN_COMPONENT]
+        if len(large) < 2:
+            self.evaluate(formulas)
+            return
+
+        futures: Dict[Future, List[Any]] = {}
+        try:
+            executor = Recalculation.pool(len(large))
+            for component in large:
+                roots = {cell for cell in component if cell in engine.dirty_roots or cell in self.changed_precedents}
+                snapshot = ComponentSnapshot.from_items(component, roots, engine.previous_states)
+                futures[executor.submit(evaluate_snapshot, snapshot)] = component
+        except Exception:
+            # The pool is broken or shut down, evaluate everything here
+            for future in futures:
+                future.cancel()
+            self.evaluate(formulas)
+            return
+
+        small = [cell for component in components if len(component) < constants.PARALLEL_MIN_COMPONENT
+                 for cell in component]
+        cancelled = not self.evaluate(small)
+        pending = set(futures)
+        while pending and not cancelled:
+            done, pending = wait(pending, timeout=constants.DISPLAY_UPDATE_INTERVAL / 1000,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception:
+                    # The worker process failed (e.g. the pool was shut down), evaluate here instead
+                    self.evaluate(futures[future])
+                else:
+                    self.merge(futures[future], result)
+            cancelled = self._cancelled.is_set()
+        if cancelled:
+            for future in pending:
+                future.cancel()
+            return
+        self.evaluate(joins)
+
+    def partition(self, formulas: List[Any]) -> Tuple[List[List[Any]], List[Any]]:
+        """Split formulas in topological order into independent components and the joins read by none of
+        them that read several components, keeping the order."""
+        dependency_graph = self.engine.graph
+
+        within = set(formulas)
+        sinks = {cell for cell in formulas if within.isdisjoint(dependency_graph.dependents(cell))}
+        components = dependency_graph.components(cell for cell in formulas if cell not in sinks)
+        component_of = {cell: index for index, component in enumerate(components) for cell in component}
+
+        joins = []
+        for cell in formulas:
+            if cell in sinks:
+                read = {component_of[precedent] for precedent in dependency_graph.precedents(cell)
+                        if precedent in component_of}
+                if len(read) == 1:
+                    components[read.pop()].append(cell)
+                elif read:
+                    joins.append(cell)
+                else:
+                    components.append([cell])
+        return components, joins
+
+    def merge(self, component: List[Any], result: Result) -> None:
+        """Apply the result of a component evaluated in a worker process to its items."""
+        engine = self.engine
+        states, results = result
+        for position, (cell, state) in enumerate(zip(component, states)):
+            engine.dirty.discard(cell)
+            if position in results:
+                cell.value = results[position]
+            if state != engine.previous_states.get(cell):
+                self.changed_precedents.update(engine.graph.dependents(cell))
+        self.evaluated += len(results)
+        self.skipped += len(component) - len(results)
+
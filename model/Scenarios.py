@@ -0,0 +1,64 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+
+from model.Workbook import Workbook
+from resources.utils import state_value
+
+Scenario = Dict[str, Any]  # formulas or values by property name or cell address
+
+# Base workbook of a worker process, loaded once by the initializer of the pool
+_worker_workbook: Optional[Workbook] = None
+
+
+def grid(**values: Sequence[Any]) -> List[Scenario]:
+    """Every combination of the values given per property, e.g. ``grid(gridArea=[10, 20], attic=[True, False])``."""
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+def evaluate_scenarios(workbook: Workbook, scenarios: Sequence[Scenario], outputs: Sequence[str]) -> List[List[Any]]:
+    """Values of the outputs for each scenario, evaluated one after another on the same workbook."""
+    rows = []
+    for scenario in scenarios:
+        with workbook.scenario(scenario):
+            rows.append([state_value(workbook.get(output)) for output in outputs])
+    return rows
+
+
+def _init_worker(data: List[Dict[str, Any]]) -> None:
+    global _worker_workbook
+    _worker_workbook = Workbook.from_dict(data)
+
+
+def _evaluate_chunk(scenarios: Sequence[Scenario], outputs: Sequence[str]) -> List[List[Any]]:
+    return evaluate_scenarios(_worker_workbook, scenarios, outputs)
+
+
+def sweep(base: Union[Workbook, str], scenarios: Sequence[Scenario], outputs: Sequence[str],
+          processes: int = 1, chunk_size: int = 64) -> pd.DataFrame:
+    """Evaluate what-if scenarios of a project, one row per scenario.
+
+    ``base`` is a workbook or the path of a project file, every scenario assigns some of its
+    properties or cells and the table holds the assigned values followed by the values of the
+    ``outputs``. The base itself is left as it was. With several ``processes``, chunks of scenarios
+    are evaluated in worker processes, each loading the base once.
+    """
+    workbook = Workbook.load(base) if isinstance(base, str) else base
+    scenarios = list(scenarios)
+    if processes > 1 and len(scenarios) > chunk_size:
+        chunks = [scenarios[start:start + chunk_size] for start in range(0, len(scenarios), chunk_size)]
+        with ProcessPoolExecutor(min(processes, len(chunks)), mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(workbook.to_dict(),)) as executor:
+            rows = [row for chunk in executor.map(_evaluate_chunk, chunks, itertools.repeat(outputs))
+                    for row in chunk]
+    else:
+        rows = evaluate_scenarios(workbook, scenarios, outputs)
+
+    inputs = list(dict.fromkeys(name for scenario in scenarios for name in scenario))
+    table = pd.DataFrame([[scenario.get(name) for name in inputs] for scenario in scenarios], columns=inputs)
+    values = pd.DataFrame(rows, columns=list(outputs))
+    return pd.concat([table, values], axis=1)
@@ -1,13 +1,14 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Set
 
 import pandas as pd
 from PyQt6 import QtWidgets, QtCore
-from PyQt6.QtCore import pyqtSignal, QModelIndex, QEvent, Qt
-from PyQt6.QtWidgets import QTableWidgetItem, QTableWidget, QStyledItemDelegate, QMenu
+from PyQt6.QtCore import pyqtSignal, QModelIndex, QEvent, Qt, QAbstractTableModel, QTimer
+from PyQt6.QtWidgets import QTableView, QStyledItemDelegate, QMenu
 
+from model.ColumnStore import ColumnStore
 from model.ItemWithFormula import ItemWithFormula
 from resources import constants
-from resources.utils import index_to_letter, is_convertible_to_float
+from resources.utils import index_to_letter
 
 
 class ItemDelegate(QStyledItemDelegate):
@@ -32,9 +33,17 @@ class ItemDelegate(QStyledItemDelegate):
         return super().eventFilter(obj, event)
 
 
-class SpreadsheetCell(ItemWithFormula, QTableWidgetItem):
+class SpreadsheetCell(ItemWithFormula):
+    """Cell of a spreadsheet. It is not a widget, the view reads it through the sheet's table model."""
+
     def __init__(self, formula="", *args, **kwargs):
         super().__init__(formula, *args, **kwargs)
+        self.sheet: Optional['Spreadsheet'] = None
+        self._row = 0
+        self._column = 0
+        self._name: Optional[str] = None
+        self._position: Optional[Tuple[str, int, int]] = None
+        self.store: Optional[ColumnStore] = None
 
     def __str__(self) -> str:
         return (
@@ -50,12 +59,51 @@ class SpreadsheetCell(ItemWithFormula, QTableWidgetItem):
             f"{'-' * 80}"
         )
 
+    def row(self) -> int:
+        return self._row
+
+    def column(self) -> int:
+        return self._column
+
     @property
     def name(self):
-        return f"{self.tableWidget().objectName()}!{index_to_letter(self.column())}{self.row() + 1}"
+        if self._name is None:
+            self._name = f"{self.sheet.objectName()}!{index_to_letter(self._column)}{self._row + 1}"
+        return self._name
+
+    @property
+    def position(self) -> Tuple[str, int, int]:
+        """Sheet name, row and column of the cell."""
+        if self._position is None:
+            self._position = (self.sheet.objectName(), self._row, self._column)
+        return self._position
+
+    def move(self, row: int, column: int):
+        """Place the cell at a new position of its sheet."""
+        self._row = row
+        self._column = column
+        self.invalidate_name()
+
+    def invalidate_name(self):
+        """Forget the cached address, call after the cell has been moved or its sheet renamed."""
+        self._name = None
+        self._position = None
+
+    def formula_anchor(self) -> Optional[Tuple[int, int]]:
+        _, row, column = self.position
+        return row, column
+
+    @ItemWithFormula.value.setter
+    def value(self, value):
+        """Set the value and write it through to the column store of the sheet."""
+        ItemWithFormula.value.fset(self, value)
+        if self.store is not None:
+            _, row, column = self.position
+            self.store.set(row, column, self._value)
 
     def set_display_text(self):
-        self.setText(self.format.format_value(self._value))
+        if self.sheet is not None:
+            self.sheet.table_model.cell_changed(self._row, self._column)
 
     def get_dict_data(self) -> Dict[str, Any]:
         data = super().get_dict_data()
@@ -63,7 +111,85 @@ class SpreadsheetCell(ItemWithFormula, QTableWidgetItem):
         return data
 
 
-class Spreadsheet(QTableWidget):
+DISPLAY_ROLE = Qt.ItemDataRole.DisplayRole
+EDIT_ROLE = Qt.ItemDataRole.EditRole
+CELL_FLAGS = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+
+
+class SpreadsheetModel(QAbstractTableModel):
+    """Table model serving the cells of a spreadsheet to its view on demand.
+
+    Only the rows the view paints are read. Changed cells are collected and reported with one
+    ``dataChanged`` per run of changed rows, once control returns to the event loop.
+    """
+
+    def __init__(self, sheet: 'Spreadsheet'):
+        super().__init__(sheet)
+        self.sheet = sheet
+        self.changed_cells: Set[Tuple[int, int]] = set()
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.setInterval(0)
+        self.change_timer.timeout.connect(self.emit_changes)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.sheet.worksheet)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(constants.COLUMNS)
+
+    def data(self, index: QModelIndex, role: int = DISPLAY_ROLE) -> Any:
+        # Called for every role of every painted cell, the roles not served are answered first
+        if role == DISPLAY_ROLE:
+            return self.sheet.worksheet[index.row()][index.column()].display_text
+        if role == EDIT_ROLE:
+            return self.sheet.worksheet[index.row()][index.column()].formula
+        return None
+
+    def setData(self, index: QModelIndex, value: Any, role: int = EDIT_ROLE) -> bool:
+        if not index.isValid() or role != EDIT_ROLE:
+            return False
+        self.sheet.worksheet[index.row()][index.column()].set_item(value)
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        return CELL_FLAGS if index.isValid() else Qt.ItemFlag.NoItemFlags
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = DISPLAY_ROLE) -> Any:
+        if orientation == Qt.Orientation.Horizontal and role == DISPLAY_ROLE:
+            return constants.COLUMNS[section][0] if section < len(constants.COLUMNS) else f'Column {section + 1}'
+        return super().headerData(section, orientation, role)
+
+    def cell_changed(self, row: int, column: int):
+        self.changed_cells.add((row, column))
+        if not self.change_timer.isActive():
+            self.change_timer.start()
+
+    def emit_changes(self):
+        """Report the changed cells, one rectangle per run of consecutive changed rows."""
+        changed, self.changed_cells = self.changed_cells, set()
+        columns_by_row: Dict[int, List[int]] = {}
+        for row, column in changed:
+            if row < len(self.sheet.worksheet):
+                columns_by_row.setdefault(row, []).append(column)
+
+        rows = sorted(columns_by_row)
+        start = 0
+        for end in range(len(rows)):
+            if end + 1 == len(rows) or rows[end + 1] != rows[end] + 1:
+                columns = [column for row in rows[start:end + 1] for column in columns_by_row[row]]
+                self.dataChanged.emit(self.index(rows[start], min(columns)), self.index(rows[end], max(columns)),
+                                      [Qt.ItemDataRole.DisplayRole])
+                start = end + 1
+
+    def begin_insert_rows(self, index: int, count: int = 1):
+        self.beginInsertRows(QModelIndex(), index, index + count - 1)
+
+    def begin_remove_rows(self, index: int, count: int = 1):
+        self.beginRemoveRows(QModelIndex(), index, index + count - 1)
+
+
+class Spreadsheet(QTableView):
     doubleClickedSignal = pyqtSignal(object)
     textEditedSignal = pyqtSignal(object,str)
     textEditingFinishedSignal = pyqtSignal(object)
@@ -72,101 +198,139 @@ class Spreadsheet(QTableWidget):
 
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
-        self.worksheet: List[List[SpreadsheetCell]] = [[SpreadsheetCell() for _ in range(self.columnCount())] for _ in
-                                                       range(0)]
+        self.worksheet: List[List[SpreadsheetCell]] = []
+        self.store = ColumnStore([column in constants.NUMERIC_COLUMNS for column in constants.COLUMNS])
+        self.table_model = SpreadsheetModel(self)
+        self.setModel(self.table_model)
         self.delegate = ItemDelegate(self)
         self.setItemDelegate(self.delegate)
         self.delegate.text_edited_signal.connect(self.text_edited)
-        self.delegate.commitData.connect(self.editing_finished)
-        self.currentCellChanged.connect(self.active_cell_changed)
+        self.selectionModel().currentChanged.connect(self.active_cell_changed)
         self.customContextMenuRequested.connect(self.context_menu)
         self.initUI()
 
     def clean_up(self):
-        for i in range(self.rowCount()):
-            self.remove_row(0)
+        from model.Model import Model
+        with Model.batch():
+            for i in range(self.rowCount()):
+                self.remove_row(0)
 
     @property
     def name(self):
         return self.objectName()
 
+    def setObjectName(self, name: str):
+        super().setObjectName(name)
+        self.invalidate_cell_names()
+
+    def invalidate_cell_names(self, start_row: int = 0):
+        """Renumber the cells from ``start_row`` on and forget their cached addresses."""
+        for row in range(start_row, len(self.worksheet)):
+            for column, cell in enumerate(self.worksheet[row]):
+                cell.move(row, column)
+
     def initUI(self):
         self.setObjectName(self.name)
         self.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
         self.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
         self.setAlternatingRowColors(True)
-        self.setColumnCount(len(constants.COLUMNS))
         self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
-        self.setRowCount(0)
-        for i, (header_name, _) in enumerate(constants.COLUMNS):
-            item = QtWidgets.QTableWidgetItem()
-            item.setText(header_name)
-            self.setHorizontalHeaderItem(i, item)
+    def rowCount(self) -> int:
+        return len(self.worksheet)
+
+    def columnCount(self) -> int:
+        return len(constants.COLUMNS)
 
     def add_row(self, index: Optional[int] = None, text: Optional[List[str]] = None):
+        from model.Model import Model
         if text is None:
             text = []
         if index is None:
             index = self.rowCount()
-        if index < 0 or index > self.rowCount():
-            raise IndexError("Index out of range")
 
-        self.worksheet.insert(index, [SpreadsheetCell() for _ in range(self.columnCount())])
-        self.insertRow(index)
+        with Model.batch():
+            self.add_rows(1, index)
+            for col in range(self.columnCount()):
+                if col < len(text):
+                    cell = self.worksheet[index][col]
+                    cell.set_item(text[col])
 
-        for col in range(self.columnCount()):
-            cell = self.worksheet[index][col]
-            self.setItem(index, col, cell)
-            cell.sheet_name = self.objectName()
+    def add_rows(self, count: int, index: Optional[int] = None):
+        """Insert ``count`` empty rows before ``index`` (at the end by default), in one step."""
+        from model.Model import Model, engine
+        if index is None:
+            index = self.rowCount()
+        if index < 0 or index > self.rowCount():
+            raise IndexError("Index out of range")
+        if count <= 0:
+            return
 
-        for col in range(self.columnCount()):
-            if col < len(text):
-                cell = self.worksheet[index][col]
-                cell.set_item(text[col])
+        def insert():
+            self.table_model.begin_insert_rows(index, count)
+            rows = [[SpreadsheetCell() for _ in range(self.columnCount())] for _ in range(count)]
+            self.worksheet[index:index] = rows
+            self.store.insert_rows(index, count)
+            for row in rows:
+                for cell in row:
+                    cell.sheet = self
+                    cell.store = self.store
+            self.invalidate_cell_names(index)
+            self.table_model.endInsertRows()
+
+        Model.cancel_recalculation()
+        engine.insert_rows(self.name, insert)
 
     def remove_row(self, index: int):
+        """Remove a row, the formulas reading its cells get the reference error instead."""
+        from model.Model import Model, engine
         if index < 0 or index >= self.rowCount():
             return
 
-        cells_to_remove = self.worksheet[index]
-
-        for cell_to_remove in cells_to_remove:
-            for dependent in cell_to_remove.items_that_dependents_on_me:
-                dependent.remove_dependent(cell_to_remove)
+        def remove():
+            self.table_model.begin_remove_rows(index)
+            self.worksheet.pop(index)
+            self.store.remove_rows(index)
+            self.table_model.endRemoveRows()
+            self.invalidate_cell_names(index)
 
-        for cell_to_remove in cells_to_remove:
-            for name, dependent in cell_to_remove.items_that_i_depend_on.items():
-                dependent.items_that_dependents_on_me.remove(cell_to_remove)
-
-        self.worksheet.pop(index)
-        self.removeRow(index)
+        Model.cancel_recalculation()
+        engine.remove_rows(self.name, self.worksheet[index], remove)
 
     def get_cell(self, row, column):
         if 0 <= row < self.rowCount() and 0 <= column < self.columnCount():
             return self.worksheet[row][column]
         return None
 
+    def get_cells(self, start_row: int, start_col: int, end_row: int, end_col: int) -> List[Optional[SpreadsheetCell]]:
+        """Cells of a rectangle row by row, None for positions outside the sheet."""
+        columns = range(start_col, end_col + 1)
+        cells = []
+        for row in range(start_row, end_row + 1):
+            if 0 <= row < len(self.worksheet):
+                line = self.worksheet[row]
+                cells.extend(line[col] if 0 <= col < len(line) else None for col in columns)
+            else:
+                cells.extend([None] * len(columns))
+        return cells
+
     #Transforming into the DataFrame
     def to_dataframe(self) -> pd.DataFrame:
-        data = []
-        for row in self.worksheet:
-            row_data = []
-            for cell in row:
-                row_data.append(float(cell.text()) if is_convertible_to_float(cell.text()) else cell.text())
-            data.append(row_data)
-
-        df = pd.DataFrame(data, columns=self.get_headers())
-        return df
+        """Values of the sheet, read from the column store without copying the columns."""
+        columns = {header: self.store.column_values(col) for col, header in enumerate(self.get_headers())}
+        return pd.DataFrame(columns, copy=False)
 
     def get_headers(self) -> List[str]:
-        return [self.horizontalHeaderItem(col).text() if self.horizontalHeaderItem(col) else f'Column {col + 1}' for col in range(self.columnCount())]
+        return [self.table_model.headerData(col, Qt.Orientation.Horizontal) for col in range(self.columnCount())]
 
     def recalculate(self):
-        for row in self.worksheet:
-            for cell in row:
-                cell.recalculate()
+        from model.Model import Model
+        with Model.batch():
+            for row in self.worksheet:
+                for cell in row:
+                    cell.recalculate()
 
     def get_dict_data(self) -> Dict[str, Any]:
         from model.ItemModel import ItemModel
@@ -187,6 +351,12 @@ class Spreadsheet(QTableWidget):
 
     ###############################################
 
+    def currentItem(self) -> Optional[SpreadsheetCell]:
+        index = self.currentIndex()
+        if not index.isValid():
+            return None
+        return self.get_cell(index.row(), index.column())
+
     def mouseDoubleClickEvent(self, event: QEvent):
         super().mouseDoubleClickEvent(event)
         self.doubleClickedSignal.emit(self.currentItem())
@@ -197,9 +367,6 @@ class Spreadsheet(QTableWidget):
     def text_edited(self, text):
         self.textEditedSignal.emit(self.currentItem(), text)
 
-    def editing_finished(self):
-        self.currentItem().set_item(self.currentItem().text())
-
     def focusInEvent(self, event: QEvent):
         super().focusInEvent(event)
         self.activeItemChangedSignal.emit(self.currentItem())
@@ -0,0 +1,554 @@
+import json
+import re
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+
+from model import Functions  # noqa: F401 registers the spreadsheet functions
+from model.ColumnStore import ColumnStore
+from model.DependencyGraph import DependencyGraph
+from model.Engine import Engine, PROPERTIES_PREFIX
+from model.Enums import ErrorType, FormulaError
+from model.GoalSeek import GoalSeekResult, seek
+from model.RangeIndex import Position
+from resources import constants
+from resources.parser import CompiledFormula
+from resources.utils import EMPTY, index_to_letter, parse_cell_reference, state_value, to_value
+
+SPREADSHEET_TYPE = "Arkusz kalkulacyjny"
+NUMBER_TYPE = "Pole numeryczne"
+TEXT_TYPE = "Pole tekstowe"
+CHECKBOX_TYPE = "Pole wyboru"
+State = Tuple[Any, Optional[ErrorType]]
+Progress = Callable[[str, int, int], bool]  # stage, work done and total; returns False to cancel
+PROGRESS_STEP = 4096  # records between two progress reports
+
+
+class LoadCancelled(Exception):
+    """Raised by ``Workbook.load`` when its progress callback asks to stop."""
+
+
+def report(progress: Optional[Progress], stage: str, done: int, total: int) -> None:
+    if progress is not None and progress(stage, done, total) is False:
+        raise LoadCancelled(stage)
+
+
+WHITESPACE = re.compile(r'\s*')
+
+
+def parse_tabs(text: str, progress: Optional[Progress] = None) -> Iterator[Dict[str, Any]]:
+    """Tabs of the text of a project file, parsed one element of its top-level array at a time.
+
+    The 'read' stage reports the characters parsed after each tab, so the load can be cancelled
+    while a large file is parsed.
+    """
+    decoder = json.JSONDecoder()
+    position = WHITESPACE.match(text).end()
+    if not text.startswith('[', position):
+        raise json.JSONDecodeError("Expecting '[' of the list of tabs", text, position)
+    position = WHITESPACE.match(text, position + 1).end()
+    if not text.startswith(']', position):
+        while True:
+            tab, position = decoder.raw_decode(text, position)
+            yield tab
+            report(progress, 'read', position, len(text))
+            position = WHITESPACE.match(text, position).end()
+            if text.startswith(']', position):
+                break
+            if not text.startswith(',', position):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+            position = WHITESPACE.match(text, position + 1).end()
+    if WHITESPACE.match(text, position + 1).end() != len(text):
+        raise json.JSONDecodeError("Extra data", text, position + 1)
+    report(progress, 'read', len(text), len(text))
+
+
+class Record:
+    """Formula, value and error of a cell or a property of a workbook.
+
+    Records only hold what evaluation needs, in slots: the compiled formula and its resolved
+    references replace the widgets and signals of the items of the application.
+    """
+    __slots__ = ('formula', '_value', 'error', 'python_formula', 'bound_references', 'format')
+
+    def __init__(self, formula: Any = ''):
+        self.formula = formula
+        self._value: Any = EMPTY
+        self.error: Optional[ErrorType] = None
+        self.python_formula: Optional[CompiledFormula] = None
+        self.bound_references: Sequence[Any] = ()
+        self.format = 1
+
+    def formula_anchor(self) -> Optional[Tuple[int, int]]:
+        return None
+
+    def get_state(self) -> State:
+        return state_value(self.value), self.error
+
+    @property
+    def value(self) -> Any:
+        return self._value
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        """Store the typed value, the error follows it like for the items of the application."""
+        self._value = to_value(value)
+        self.error = value.error_type if isinstance(value, FormulaError) else None
+
+    def set_error(self, error: ErrorType) -> None:
+        self.value = FormulaError.of(error)
+
+    def restore(self, value: Any, error: Optional[ErrorType]) -> None:
+        """Put back a value and error saved from the record, already typed."""
+        self._value = value
+        self.error = error
+
+    def evaluate_formula(self) -> None:
+        if self.python_formula is not None:
+            self.value = self.python_formula(self.bound_references)
+        else:
+            self.value = self.formula
+
+
+class Cell(Record):
+    __slots__ = ('sheet', 'row', 'column')
+
+    def __init__(self, sheet: 'Sheet', row: int, column: int):
+        super().__init__()
+        self.sheet = sheet
+        self.row = row
+        self.column = column
+
+    def __repr__(self) -> str:
+        return f"Cell({self.name})"
+
+    @property
+    def name(self) -> str:
+        return f"{self.sheet.name}!{index_to_letter(self.column)}{self.row + 1}"
+
+    @property
+    def position(self) -> Position:
+        return self.sheet.name, self.row, self.column
+
+    def formula_anchor(self) -> Optional[Tuple[int, int]]:
+        return self.row, self.column
+
+    @Record.value.setter
+    def value(self, value: Any) -> None:
+        Record.value.fset(self, value)
+        self.sheet.store.set(self.row, self.column, self._value)
+
+    def restore(self, value: Any, error: Optional[ErrorType]) -> None:
+        Record.restore(self, value, error)
+        self.sheet.store.set(self.row, self.column, value)
+
+
+class Property(Record):
+    """Named value of a workbook, such as a number, text or check box field of a tab."""
+    __slots__ = ('name', 'item_type', 'label')
+
+    def __init__(self, name: str, item_type: str = TEXT_TYPE, label: str = ''):
+        super().__init__()
+        self.name = name
+        self.item_type = item_type
+        self.label = label
+
+    def __repr__(self) -> str:
+        return f"Property({self.name})"
+
+
+class ScenarioPlan:
+    """Records depending on the assigned records of a scenario, in evaluation order, with the
+    dependents of each; computed once for every scenario assigning the same records."""
+    __slots__ = ('order', 'dependents')
+
+    def __init__(self, order: List[Record], dependents: Dict[Record, Tuple[Record, ...]]):
+        self.order = order
+        self.dependents = dependents
+
+
+class Sheet:
+    """Rows of cells with their column store.
+
+    Rows are sparse: a cell gets a record when it is given a formula or a formula reads it, the
+    other positions hold None and read as empty.
+    """
+
+    def __init__(self, name: str, label: str = '', column_count: int = len(constants.COLUMNS)):
+        self.name = name
+        self.label = label
+        self.column_count = column_count
+        self.rows: List[List[Optional[Cell]]] = []
+        self.store = ColumnStore([column in constants.NUMERIC_COLUMNS for column in constants.COLUMNS][:column_count])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __repr__(self) -> str:
+        return f"Sheet({self.name}, {len(self.rows)} rows)"
+
+    def get_cell(self, row: int, column: int) -> Optional[Cell]:
+        if 0 <= row < len(self.rows) and 0 <= column < self.column_count:
+            return self.rows[row][column]
+        return None
+
+    def get_cells(self, start_row: int, start_col: int, end_row: int, end_col: int) -> List[Optional[Cell]]:
+        """Cells of a rectangle row by row, None for positions outside the sheet or without a record."""
+        cells = []
+        for row in range(start_row, end_row + 1):
+            line = self.rows[row] if 0 <= row < len(self.rows) else ()
+            cells.extend(line[col] if 0 <= col < len(line) else None for col in range(start_col, end_col + 1))
+        return cells
+
+    def insert_rows(self, index: int, count: int) -> None:
+        self.rows[index:index] = [[None] * self.column_count for _ in range(count)]
+        self.store.insert_rows(index, count)
+        self.renumber(index + count)
+
+    def remove_rows(self, index: int, count: int) -> None:
+        del self.rows[index:index + count]
+        self.store.remove_rows(index, count)
+        self.renumber(index)
+
+    def renumber(self, start_row: int) -> None:
+        for row in range(start_row, len(self.rows)):
+            for cell in self.rows[row]:
+                if cell is not None:
+                    cell.row = row
+
+    def cells(self) -> Iterator[Cell]:
+        for line in self.rows:
+            for cell in line:
+                if cell is not None:
+                    yield cell
+
+    def to_dataframe(self) -> pd.DataFrame:
+        columns = {header: self.store.column_values(col)
+                   for col, (header, _) in enumerate(constants.COLUMNS[:self.column_count])}
+        return pd.DataFrame(columns, copy=False)
+
+
+class Workbook:
+    """Qt-free workbook: the sheets and properties of a project, their dependency graph and evaluator.
+
+    It reads and writes the project files of the application and recalculates with the same
+    ``Engine`` as ``Model``: changed records and the records depending on them are dirty, a
+    recalculation evaluates them in topological order with early cutoff and gives the records in a
+    cycle the circular error. Edits inside ``batch`` are recalculated once, when it exits.
+    """
+
+    def __init__(self):
+        self.sheets: Dict[str, Sheet] = {}
+        self.properties: Dict[str, Property] = {}
+        self.tabs: Dict[str, List[Union[Sheet, Property]]] = {}
+        self.engine = Engine(self.sheets.get, self.cell, self.properties.get,
+                             lambda node: node.position if isinstance(node, Cell) else None)
+        self.dependency_graph: DependencyGraph = self.engine.graph
+        self._scenario_plans: Dict[Tuple[Record, ...], Optional[ScenarioPlan]] = {}
+
+    ###############################################
+    # Project files
+
+    @staticmethod
+    def load(path: str, progress: Optional[Progress] = None) -> 'Workbook':
+        """Workbook of a project file, parsed tab by tab with ``parse_tabs``, see ``from_dict``."""
+        with open(path, encoding='utf-8') as file:
+            text = file.read()
+        report(progress, 'read', 0, len(text))
+        return Workbook.from_dict(list(parse_tabs(text, progress)), progress)
+
+    @staticmethod
+    def from_dict(data: List[Dict[str, Any]], progress: Optional[Progress] = None) -> 'Workbook':
+        """Workbook of the data of a project file, as written by ``Model.get_dict_data``.
+
+        It is built in bulk: the 'records' stage creates every sheet, property and cell, the
+        'formulas' stage binds each formula once, when every name exists, and the 'calculate'
+        stage evaluates the whole workbook in one recalculation. ``progress`` is called during
+        each stage and can cancel the load by returning False, raising ``LoadCancelled``.
+        """
+        workbook = Workbook()
+        total = sum(len(group_box_data.get('cells', ())) or 1
+                    for tab_data in data for group_box_data in tab_data['group_boxes'])
+        done = 0
+        formulas = []
+        with workbook.batch():
+            for tab_data in data:
+                tab = tab_data['tab_name']
+                workbook.tabs.setdefault(tab, [])
+                for group_box_data in tab_data['group_boxes']:
+                    name = group_box_data['item_name']
+                    label = group_box_data.get('group_box_label', '')
+                    if group_box_data['item_type'] == SPREADSHEET_TYPE:
+                        sheet = workbook.add_sheet(name, tab, label)
+                        workbook.add_rows(name, group_box_data.get('row_count', 0))
+                        for cell_data in group_box_data.get('cells', ()):
+                            done += 1
+                            if done % PROGRESS_STEP == 0:
+                                report(progress, 'records', done, total)
+                            formula = cell_data.get('formula', '')
+                            if formula == '':
+                                continue  # the application saves empty cells too, they stay without a record
+                            _, row, column = parse_cell_reference(cell_data['item_name'])
+                            cell = workbook.cell(sheet, row, column)
+                            if cell is not None:
+                                cell.format = cell_data.get('format', cell.format)
+                                formulas.append((cell, formula))
+                    else:
+                        done += 1
+                        record = workbook.add_property(name, group_box_data['item_type'], tab, label)
+                        record.format = group_box_data.get('format', record.format)
+                        formulas.append((record, group_box_data.get('formula', '')))
+            report(progress, 'records', total, total)
+
+        # Every name exists now, so the formulas are bound once and evaluated in one pass
+        for index, (record, formula) in enumerate(formulas):
+            if index % PROGRESS_STEP == 0:
+                report(progress, 'formulas', index, len(formulas))
+            record.formula = formula
+            record.error = None
+            workbook.bind(record)
+        report(progress, 'formulas', len(formulas), len(formulas))
+        records = [record for record, _ in formulas]
+        workbook.engine.dirty.update(records)
+        workbook.engine.dirty_roots.update(records)
+        report(progress, 'calculate', 0, 1)
+        workbook.recalculate()
+        report(progress, 'calculate', 1, 1)
+        return workbook
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=4, ensure_ascii=False)
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        data = []
+        for tab, items in self.tabs.items():
+            group_boxes = []
+            for item in items:
+                if isinstance(item, Sheet):
+                    group_boxes.append({
+                        'cells': [{'item_name': cell.name, 'formula': cell.formula, 'format': cell.format}
+                                  for cell in item.cells() if cell.formula != ''],
+                        'item_name': item.name,
+                        'row_count': len(item),
+                        'column_count': item.column_count,
+                        'item_type': SPREADSHEET_TYPE,
+                        'group_box_label': item.label,
+                    })
+                else:
+                    item_data = {'item_name': item.name, 'item_type': item.item_type, 'formula': item.formula}
+                    if item.item_type == TEXT_TYPE:
+                        item_data['format'] = item.format
+                    item_data['group_box_label'] = item.label
+                    group_boxes.append(item_data)
+            data.append({'group_boxes': group_boxes, 'tab_name': tab})
+        return data
+
+    ###############################################
+    # Structure
+
+    def add_sheet(self, name: str, tab: str = '', label: str = '') -> Sheet:
+        if name in self.sheets or name in self.properties:
+            raise NameError(f"Item with name {name} already exists.")
+        sheet = self.sheets[name] = Sheet(name, label)
+        self.tabs.setdefault(tab, []).append(sheet)
+        self._scenario_plans.clear()
+        self.engine.rebind(name)
+        return sheet
+
+    def add_property(self, name: str, item_type: str = TEXT_TYPE, tab: str = '', label: str = '',
+                     formula: Any = None) -> Property:
+        if name in self.sheets or name in self.properties:
+            raise NameError(f"Item with name {name} already exists.")
+        record = self.properties[name] = Property(name, item_type, label)
+        self.tabs.setdefault(tab, []).append(record)
+        if formula is None:
+            formula = {NUMBER_TYPE: 0.0, CHECKBOX_TYPE: False}.get(item_type, '')
+        self.set_formula(record, formula)
+        self.engine.rebind(name)
+        return record
+
+    def add_rows(self, sheet_name: str, count: int, index: Optional[int] = None) -> None:
+        """Insert ``count`` empty rows before ``index`` (at the end by default)."""
+        sheet = self.sheets[sheet_name]
+        if index is None:
+            index = len(sheet)
+        if index < 0 or index > len(sheet):
+            raise IndexError("Index out of range")
+        if count <= 0:
+            return
+        self._scenario_plans.clear()
+        self.engine.insert_rows(sheet_name, lambda: sheet.insert_rows(index, count))
+
+    def remove_row(self, sheet_name: str, index: int) -> None:
+        """Remove a row, the formulas reading its cells get the reference error instead."""
+        sheet = self.sheets[sheet_name]
+        if index < 0 or index >= len(sheet):
+            return
+        self._scenario_plans.clear()
+        self.engine.remove_rows(sheet_name, sheet.rows[index], lambda: sheet.remove_rows(index, 1))
+
+    def cell(self, sheet: Union[str, Sheet], row: int, column: int) -> Optional[Cell]:
+        """Record of a cell, created if the position is inside the sheet; None if it is not."""
+        if isinstance(sheet, str):
+            sheet = self.sheets.get(sheet)
+        if sheet is None or not (0 <= row < len(sheet) and 0 <= column < sheet.column_count):
+            return None
+        cell = sheet.rows[row][column]
+        if cell is None:
+            cell = sheet.rows[row][column] = Cell(sheet, row, column)
+            # Ranges over the position cached None for it
+            for cell_range in self.dependency_graph.ranges.containing(sheet.name, row, column):
+                cell_range.invalidate()
+        return cell
+
+    def record(self, address: str) -> Optional[Record]:
+        """Record of a property name (with or without 'PROPERTIES!') or a cell address such as 'Dach!G5'."""
+        if address.startswith(PROPERTIES_PREFIX):
+            address = address[len(PROPERTIES_PREFIX):]
+        if address in self.properties:
+            return self.properties[address]
+        sheet_name, row, column = parse_cell_reference(address)
+        if sheet_name is None:
+            return None
+        return self.cell(sheet_name, row, column)
+
+    ###############################################
+    # Edits
+
+    def batch(self) -> ContextManager[None]:
+        """Group edits so that references are resolved again and dirty records recalculated only once."""
+        return self.engine.batch()
+
+    def set(self, address: str, formula: Any) -> None:
+        """Set the formula (or input value) of a property or cell and recalculate."""
+        record = self.record(address)
+        if record is None:
+            raise KeyError(f"No property or cell {address}")
+        self.set_formula(record, formula)
+
+    def get(self, address: str) -> Any:
+        """Value of a property or cell, EMPTY for a cell without a value."""
+        record = self.record(address)
+        if record is None:
+            raise KeyError(f"No property or cell {address}")
+        return record.value
+
+    @contextmanager
+    def scenario(self, assignments: Dict[str, Any]) -> Iterator[None]:
+        """Give some properties or cells other values (or formulas) for the duration of the block.
+
+        Values are applied copy-on-write: the records depending on the assignments are evaluated
+        in the order of a ``ScenarioPlan`` with early cutoff, and the ones that changed get their
+        previous value back on exit, without recalculating again. The plan is kept for the next
+        scenario assigning the same records. Formulas, or records in a cycle, are set and restored
+        as edits instead. The workbook is not to be edited inside the block.
+        """
+        records = []
+        for address in assignments:
+            record = self.record(address)
+            if record is None:
+                raise KeyError(f"No property or cell {address}")
+            records.append(record)
+        values = list(assignments.values())
+        plan = None
+        if not self.engine.dirty and not self.engine.batch_depth and \
+                not any(isinstance(value, str) and value.startswith('=') for value in values):
+            plan = self.scenario_plan(records)
+
+        if plan is None:
+            previous = [record.formula for record in records]
+            with self.batch():
+                for record, formula in zip(records, values):
+                    self.set_formula(record, formula)
+            try:
+                yield
+            finally:
+                with self.batch():
+                    for record, formula in zip(records, previous):
+                        self.set_formula(record, formula)
+            return
+
+        saved = []
+        changed: Set[Record] = set()
+        for record, value in zip(records, values):
+            saved.append((record, record.value, record.error))
+            state = record.get_state()
+            record.value = value
+            if record.get_state() != state:
+                changed.update(plan.dependents[record])
+        for record in plan.order:
+            if record in changed:
+                saved.append((record, record.value, record.error))
+                state = record.get_state()
+                record.evaluate_formula()
+                if record.get_state() != state:
+                    changed.update(plan.dependents[record])
+        try:
+            yield
+        finally:
+            for record, value, error in reversed(saved):
+                record.restore(value, error)
+
+    def goal_seek(self, input_address: str, target_address: str, goal: float, apply: bool = True,
+                  **options: Any) -> GoalSeekResult:
+        """Find the value of an input property or cell making the target equal ``goal``, see ``GoalSeek.seek``.
+
+        A solution found is set as the value of the input, recalculating the workbook once.
+        """
+        source, target = self.record(input_address), self.record(target_address)
+        if source is None or target is None:
+            raise KeyError(f"No property or cell {input_address if source is None else target_address}")
+        return seek(self.dependency_graph, source, target, goal,
+                    lambda record, value, error: record.restore(value, error),
+                    (lambda value: self.set_formula(source, value)) if apply else None, **options)
+
+    def scenario_plan(self, records: Sequence[Record]) -> Optional['ScenarioPlan']:
+        """Plan of the records depending on the assigned ones, None if they are part of a cycle."""
+        key = tuple(records)
+        if key not in self._scenario_plans:
+            assigned = set(records)
+            affected: Set[Record] = set()
+            dependents: Dict[Record, Tuple[Record, ...]] = {}
+            to_process = deque(records)
+            while to_process:
+                record = to_process.popleft()
+                dependents[record] = tuple(self.dependency_graph.dependents(record))
+                for dependent in dependents[record]:
+                    if dependent not in affected and dependent not in assigned:
+                        affected.add(dependent)
+                        to_process.append(dependent)
+            plan = None
+            if not self.dependency_graph.cycles(affected | assigned):
+                plan = ScenarioPlan(self.dependency_graph.topological_sort(affected), dependents)
+            self._scenario_plans[key] = plan
+        return self._scenario_plans[key]
+
+    def set_formula(self, record: Record, formula: Any) -> None:
+        self.mark_dirty(record)
+        record.formula = formula
+        record.error = None
+        self.bind(record)
+        self.recalculate()
+
+    def bind(self, record: Record) -> None:
+        """Compile the formula of the record and resolve its references, see ``Engine.bind``."""
+        self._scenario_plans.clear()
+        self.engine.bind(record)
+
+    def forget(self, record: Record) -> None:
+        self._scenario_plans.clear()
+        self.engine.forget(record)
+
+    ###############################################
+    # Recalculation
+
+    def mark_dirty(self, record: Record) -> None:
+        """Mark a record and everything depending on it dirty, see ``Engine.mark_dirty``."""
+        self.engine.mark_dirty(record)
+
+    def recalculate(self) -> int:
+        """Evaluate the dirty records, returns the number evaluated."""
+        return self.engine.recalculate()
@@ -16,6 +16,7 @@ class GroupBox(QWidget):
     def __init__(self, label_text="", item_name="", item_type=None, parent: QWidget = None):
         super().__init__(parent=parent)
         self.drag_start_position: Optional[QPoint] = None
+        self.tab: Optional['MyTab'] = None  # tab the group box has been added to
 
         self.label = QLabel(parent=self)
         self.label.setText(label_text)
@@ -47,8 +48,13 @@ class GroupBox(QWidget):
 
     @name.setter
     def name(self, new_name):
+        from model.Model import Model
+        old_name = self.item.objectName()
+        old_group_box_name = self.objectName()
         self.item.setObjectName(new_name)
         self.setObjectName(f"GroupBox_{new_name}")
+        Model.update_group_box_name(self, old_name, old_group_box_name)
+        Model.rebind_references(old_name, new_name)
 
     def mousePressEvent(self, event: QMouseEvent):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -132,6 +138,7 @@ class MyTab(QWidget):
         return self.objectName()
 
     def add_group_box(self, group_box: GroupBox, index: int = -1):
+        from model.Model import Model
         if group_box in self.group_boxes:
             raise KeyError(f"group_box already exists.")
 
@@ -144,6 +151,9 @@ class MyTab(QWidget):
             self.splitter.insertWidget(index, group_box)
 
         self.group_boxes.add(group_box)
+        group_box.tab = self
+        if Model.find_tab(self.name) is self:
+            Model.add_group_box_to_db(group_box)
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData():
@@ -185,12 +195,15 @@ class MyTab(QWidget):
         self.splitter.setSizes(sizes)
 
     def delete_property(self, index: int):
+        from model.Model import Model
         widget_to_delete = self.get_GroupBox(index)
         if widget_to_delete is None:
             return
 
         widget_to_delete.clean_up()
         self.group_boxes.remove(widget_to_delete)
+        widget_to_delete.tab = None
+        Model.remove_group_box_from_db(widget_to_delete)
 
     def clean_up(self):
         from model.Model import Model
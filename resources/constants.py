@@ -20,3 +20,9 @@ COLUMNS = [
     NET_VALUE_COLUMN,
     STOCK_COLUMN
 ]
+NUMERIC_COLUMNS = [QUANTITY_COLUMN, PRICE_COLUMN, NET_VALUE_COLUMN, STOCK_COLUMN]
+
+DISPLAY_UPDATE_INTERVAL = 16  # ms between widget updates during a background recalculation, about one frame
+BACKGROUND_MIN_ITEMS = 2000  # items in a recalculation worth evaluating on the worker thread, smaller ones run at once
+PARALLEL_MIN_COMPONENT = 1000  # formulas in an independent part of a recalculation worth a worker process
+TEMPLATE_CACHE_SIZE = 10000  # compiled formula shapes kept by the compiler, the least recently used are dropped
@@ -1,4 +1,9 @@
-from typing import List
+import re
+from collections import OrderedDict
+from typing import List, Dict, Callable, Any, Optional, Tuple, Union, Set
+
+from model.Enums import ErrorType, FormulaError, ERROR_TYPES_BY_TEXT
+from resources import constants
 from resources.utils import *
 
 
@@ -18,6 +23,8 @@ class ValueType:
 
 
 class Token:
+    __slots__ = ('value', 'token_type', 'subtype')
+
     def __init__(self, value: str, token_type: str, subtype: str = None):
         self.value = value
         self.token_type = token_type
@@ -28,81 +35,48 @@ class Token:
 
 
 class Tokenizer:
+    FUNCTIONS = frozenset({'IF', 'SUM', 'AVERAGE', 'MAX', 'MIN', 'AND', 'OR'})
+    SPECIAL_CHARACTERS = r'"()+\-*/=<>,;'
+
+    # Master pattern with one named group per token kind. Text between special characters is
+    # a single token (spaces included) and is classified by the first alternative matching all
+    # of it; empty strings and surrounding spaces are dropped.
+    PATTERN = re.compile(r"""
+        \s*(?:
+          "\s*(?P<STRING>[^"\s](?:[^"]*[^"\s])?)?\s*"?
+        | (?P<FUNCTION>%(functions)s)\s*(?=\()
+        | (?P<NUMBER>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(?=[%(special)s]|\Z)
+        | (?P<IDENTIFIER>[^%(special)s]*[^%(special)s\s])\s*
+        | (?P<OPERATOR>[-+*/=<>])
+        | (?P<OPEN>\()
+        | (?P<CLOSE>\))
+        | (?P<COMMA>,)
+        | (?P<SEMICOLON>;)
+        )""" % {'functions': '|'.join(sorted(FUNCTIONS, key=len, reverse=True)), 'special': SPECIAL_CHARACTERS},
+        re.VERBOSE)
+
+    TOKEN_TYPES = {
+        'STRING': (TokenType.VALUE, ValueType.STRING),
+        'FUNCTION': (TokenType.FUNCTION, None),
+        'NUMBER': (TokenType.VALUE, ValueType.NUMBER),
+        'IDENTIFIER': (TokenType.VALUE, ValueType.IDENTIFIER),
+        'OPERATOR': (TokenType.OPERATOR, None),
+        'OPEN': (TokenType.PARENTHESIS, 'OPEN'),
+        'CLOSE': (TokenType.PARENTHESIS, 'CLOSE'),
+        'COMMA': (TokenType.COMMA, None),
+        'SEMICOLON': (TokenType.SEMICOLON, None),
+    }
+
     def __init__(self):
         pass
 
     @staticmethod
     def tokenize(formula: str) -> List[Token]:
-        operators = {'+', '-', '*', '/', '=', '<', '>', '(', ')'}
-        delimiters = {',', ';'}
-        functions = {'IF', 'SUM', 'AVERAGE', 'MAX', 'MIN', 'AND', 'OR'}
-
-        tokens = []
-        token = ''
-        inside_parentheses = 0
-        in_string = False
-
-        def add_token(value, token_type, subtype=None):
-            if value.strip():
-                tokens.append(Token(value.strip(), token_type, subtype))
-
-        for char in formula:
-            if char == '"':
-                in_string = not in_string
-                if not in_string:
-                    add_token(token, TokenType.VALUE, ValueType.STRING)
-                    token = ''
-            elif in_string:
-                token += char
-            else:
-                if char == '(':
-                    if token:
-                        # Handle function names and identifiers
-                        if token.strip() in functions:
-                            add_token(token, TokenType.FUNCTION)
-                        else:
-                            add_token(token, TokenType.VALUE, ValueType.IDENTIFIER)
-                        token = ''
-                    tokens.append(Token(char, TokenType.PARENTHESIS, 'OPEN'))
-                    inside_parentheses += 1
-                elif char == ')':
-                    if token.replace('.', '', 1).isdigit():
-                        add_token(token, TokenType.VALUE, ValueType.NUMBER)
-                    else:
-                        add_token(token, TokenType.VALUE, ValueType.IDENTIFIER)
-                    token = ''
-                    tokens.append(Token(char, TokenType.PARENTHESIS, 'CLOSE'))
-                    inside_parentheses -= 1
-                elif char in operators:
-                    if token:
-                        if token.replace('.', '', 1).isdigit():
-                            add_token(token, TokenType.VALUE, ValueType.NUMBER)
-                        else:
-                            add_token(token, TokenType.VALUE, ValueType.IDENTIFIER)
-                        token = ''
-                    tokens.append(Token(char, TokenType.OPERATOR))
-                elif char in delimiters:
-                    if token:
-                        if is_convertible_to_float(token):
-                            add_token(token, TokenType.VALUE, ValueType.NUMBER)
-                            token = ''
-                        else:
-                            add_token(token, TokenType.VALUE, ValueType.IDENTIFIER)
-                            token = ''
-
-                    tokens.append(Token(char, TokenType.COMMA if char == ',' else TokenType.SEMICOLON))
-                else:
-                    token += char
-
-        if token:
-            if token in functions:
-                add_token(token, TokenType.FUNCTION)
-            elif token.replace('.', '', 1).isdigit():
-                add_token(token, TokenType.VALUE, ValueType.NUMBER)
-            else:
-                add_token(token, TokenType.VALUE, ValueType.IDENTIFIER)
-
-        return tokens
+        """Split a formula (without the leading '=') into tokens in a single regex pass."""
+        token_types = Tokenizer.TOKEN_TYPES
+        return [Token(match.group(kind), *token_types[kind])
+                for match in Tokenizer.PATTERN.finditer(formula)
+                if (kind := match.lastgroup) is not None]
 
 
 class Parser:
@@ -110,42 +84,29 @@ class Parser:
         pass
 
     @staticmethod
-    def parse_formula_for_dependencies(formula: str) -> List['ItemWithFormula']:
+    def parse_formula_for_dependencies(formula: Union[str, 'CompiledFormula']) -> List['ItemWithFormula']:
         """Parse formula and return a list of dependent cells."""
-        from model.Model import Model
-        if formula.startswith('='):
-            formula = formula[1:]
-        else:
-            return list()
+        from model.Model import engine
+        if not isinstance(formula, CompiledFormula):
+            formula = Compiler.compile(formula)
         dependencies = set()
-        tokens = Tokenizer.tokenize(formula)
 
-        for token in tokens:
-            if token.token_type == TokenType.VALUE:
-                if token.subtype == ValueType.IDENTIFIER:
-                    if is_valid_cell_reference(token.value):
-                        cell = Model.get_cell(token.value)
-                        if cell:
-                            dependencies.add(cell)
-                    elif is_valid_cell_range(token.value):
-                        cells = Model.get_range(token.value)
-                        dependencies.update(cells)
-                    elif is_valid_properties_field(token.value):
-                        _property = Model.get_property(token.value)
-                        if _property:
-                            dependencies.add(_property)
-                    else:
-                        pass
-            elif token.token_type == TokenType.FUNCTION:
-                pass
+        for kind, address in formula.references:
+            resolved = engine.resolve_reference(kind, address)
+            if kind == ReferenceKind.RANGE:
+                dependencies.update(resolved or ())
+            elif resolved:
+                dependencies.add(resolved)
 
         return list(dependencies)
 
     ####################################################################
 
     @staticmethod
-    def make_python_formula(formula: str) -> str:
-        """Convert a spreadsheet formula to a Python expression."""
+    def make_python_formula(formula: Union[str, 'ItemWithFormula']) -> str:
+        """Convert a spreadsheet formula (or the formula of an item) to a Python expression."""
+        if not isinstance(formula, str):
+            formula = formula.formula
         if formula.startswith('='):
             formula = formula[1:]
         else:
@@ -197,3 +158,496 @@ class Parser:
         return python_expression
 
 
+####################################################################
+# Formula compiler
+####################################################################
+
+class ReferenceKind:
+    CELL = 'CELL'
+    RANGE = 'RANGE'
+    PROPERTY = 'PROPERTY'
+    ERROR = 'ERROR'  # error literal, such as a '#REF!' replacing a deleted reference
+
+
+def error_literal(text: str) -> Optional[ErrorType]:
+    """Error type of an error literal such as '#REF!', also when it replaced a name ('PROPERTIES!#REF!')."""
+    index = text.find('#')
+    if index < 0 or (index > 0 and text[index - 1] != '!'):
+        return None
+    return ERROR_TYPES_BY_TEXT.get(text[index:])
+
+
+class Node:
+    """Base class of the formula abstract syntax tree."""
+
+    def __repr__(self):
+        fields = ', '.join(f"{key}={value!r}" for key, value in vars(self).items())
+        return f"{type(self).__name__}({fields})"
+
+
+class NumberNode(Node):
+    def __init__(self, value: Union[int, float]):
+        self.value = value
+
+
+class StringNode(Node):
+    def __init__(self, value: str):
+        self.value = value
+
+
+class ReferenceNode(Node):
+    def __init__(self, kind: str, address: str):
+        self.kind = kind
+        self.address = address
+
+
+class ErrorNode(Node):
+    def __init__(self, error_type: ErrorType):
+        self.error_type = error_type
+
+
+class NameNode(Node):
+    """Identifier that is neither a cell, a range nor a property."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class UnaryOperationNode(Node):
+    def __init__(self, operator: str, operand: Node):
+        self.operator = operator
+        self.operand = operand
+
+
+class BinaryOperationNode(Node):
+    def __init__(self, operator: str, left: Node, right: Node):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+class FunctionCallNode(Node):
+    def __init__(self, name: str, arguments: List[Node]):
+        self.name = name
+        self.arguments = arguments
+
+
+class FormulaParser:
+    """Recursive descent parser turning the tokens of a formula into an abstract syntax tree.
+
+    Grammar:
+        comparison := additive (('=' | '==' | '<>' | '<' | '<=' | '>' | '>=') additive)*
+        additive   := term (('+' | '-') term)*
+        term       := unary (('*' | '/') unary)*
+        unary      := ('+' | '-') unary | primary
+        primary    := NUMBER | STRING | IDENTIFIER | call | '(' comparison ')'
+        call       := (FUNCTION | IDENTIFIER) '(' [comparison ((',' | ';') comparison)*] ')'
+    """
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.position = 0
+
+    @staticmethod
+    def parse(formula: str) -> Node:
+        """Parse a formula (with or without the leading '=') into an abstract syntax tree."""
+        if formula.startswith('='):
+            formula = formula[1:]
+        return FormulaParser.parse_tokens(Tokenizer.tokenize(formula))
+
+    @staticmethod
+    def parse_tokens(tokens: List[Token]) -> Node:
+        parser = FormulaParser(tokens)
+        node = parser.parse_comparison()
+        if parser.peek() is not None:
+            raise SyntaxError(f"Unexpected token '{parser.peek().value}'")
+        return node
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return None
+
+    def advance(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise SyntaxError("Unexpected end of formula")
+        self.position += 1
+        return token
+
+    def is_operator(self, value: str, offset: int = 0) -> bool:
+        token = self.peek(offset)
+        return token is not None and token.token_type == TokenType.OPERATOR and token.value == value
+
+    def comparison_operator(self) -> Optional[str]:
+        """Consume a (possibly two character) comparison operator and return it."""
+        if self.is_operator('='):
+            self.position += 2 if self.is_operator('=', 1) else 1
+            return '='
+        for first in ('<', '>'):
+            if self.is_operator(first):
+                self.position += 1
+                if self.is_operator('='):
+                    self.position += 1
+                    return first + '='
+                if first == '<' and self.is_operator('>'):
+                    self.position += 1
+                    return '<>'
+                return first
+        return None
+
+    def parse_comparison(self) -> Node:
+        node = self.parse_additive()
+        operator = self.comparison_operator()
+        while operator is not None:
+            node = BinaryOperationNode(operator, node, self.parse_additive())
+            operator = self.comparison_operator()
+        return node
+
+    def parse_additive(self) -> Node:
+        node = self.parse_term()
+        while self.is_operator('+') or self.is_operator('-'):
+            operator = self.advance().value
+            node = BinaryOperationNode(operator, node, self.parse_term())
+        return node
+
+    def parse_term(self) -> Node:
+        node = self.parse_unary()
+        while self.is_operator('*') or self.is_operator('/'):
+            operator = self.advance().value
+            node = BinaryOperationNode(operator, node, self.parse_unary())
+        return node
+
+    def parse_unary(self) -> Node:
+        if self.is_operator('+') or self.is_operator('-'):
+            operator = self.advance().value
+            return UnaryOperationNode(operator, self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self) -> Node:
+        token = self.advance()
+
+        if token.token_type == TokenType.PARENTHESIS and token.subtype == 'OPEN':
+            node = self.parse_comparison()
+            self.expect_close()
+            return node
+
+        if token.token_type == TokenType.FUNCTION or (
+                token.token_type == TokenType.VALUE and token.subtype == ValueType.IDENTIFIER and self.is_open()):
+            return self.parse_call(token.value)
+
+        if token.token_type == TokenType.VALUE:
+            if token.subtype == ValueType.STRING:
+                return StringNode(token.value)
+            # References and error literals already classified (and made relative) by Compiler.normalize
+            if token.subtype in (ReferenceKind.CELL, ReferenceKind.RANGE, ReferenceKind.PROPERTY):
+                return ReferenceNode(token.subtype, token.value)
+            if token.subtype == ReferenceKind.ERROR:
+                return ErrorNode(ERROR_TYPES_BY_TEXT[token.value])
+            if token.subtype == ValueType.NUMBER:
+                return NumberNode(int(token.value) if token.value.isdigit() else float(token.value))
+            error_type = error_literal(token.value)
+            if error_type is not None:
+                return ErrorNode(error_type)
+            if is_valid_cell_reference(token.value):
+                return ReferenceNode(ReferenceKind.CELL, token.value)
+            if is_valid_cell_range(token.value):
+                return ReferenceNode(ReferenceKind.RANGE, token.value)
+            if is_valid_properties_field(token.value):
+                return ReferenceNode(ReferenceKind.PROPERTY, token.value)
+            return NameNode(token.value)
+
+        raise SyntaxError(f"Unexpected token '{token.value}'")
+
+    def parse_call(self, name: str) -> Node:
+        if not self.is_open():
+            raise SyntaxError(f"Expected '(' after {name}")
+        self.advance()
+        arguments = []
+        if not self.is_close():
+            arguments.append(self.parse_comparison())
+            while self.peek() is not None and self.peek().token_type in (TokenType.COMMA, TokenType.SEMICOLON):
+                self.advance()
+                arguments.append(self.parse_comparison())
+        self.expect_close()
+        return FunctionCallNode(name, arguments)
+
+    def is_open(self) -> bool:
+        token = self.peek()
+        return token is not None and token.token_type == TokenType.PARENTHESIS and token.subtype == 'OPEN'
+
+    def is_close(self) -> bool:
+        token = self.peek()
+        return token is not None and token.token_type == TokenType.PARENTHESIS and token.subtype == 'CLOSE'
+
+    def expect_close(self):
+        if not self.is_close():
+            raise SyntaxError("Missing ')'")
+        self.advance()
+
+
+class FormulaTemplate:
+    """Compiled form of a formula with its cell references made relative to the cell holding it.
+
+    Formulas that differ only by their anchor (``=Sheet!E1*Sheet!F1`` in G1, ``=Sheet!E2*Sheet!F2``
+    in G2, ...) normalize to the same R1C1-style key, e.g. ``=Sheet!R[0]C[-2] * Sheet!R[0]C[-1]``,
+    and share one template.
+
+    ``references`` holds one entry per distinct reference, in the order the closure expects them:
+    ``(kind, (sheet, row_offset, column_offset))`` for cells,
+    ``(kind, (sheet, start_row_offset, start_column_offset, end_row_offset, end_column_offset))``
+    for ranges and ``(kind, address)`` for properties.
+    """
+
+    def __init__(self, key: str, tree: Optional[Node], references: Tuple[Tuple[str, Any], ...],
+                 function: Callable[[List[Any]], Any]):
+        self.key = key
+        self.tree = tree
+        self.references = references
+        self.function = function
+
+    def __repr__(self):
+        return f"FormulaTemplate(key={self.key!r})"
+
+    def absolute_references(self, anchor: Tuple[int, int]) -> Tuple[Tuple[str, str], ...]:
+        """Return the references of the template as absolute addresses for the given anchor."""
+        row, column = anchor
+        references = []
+        for kind, reference in self.references:
+            if kind == ReferenceKind.CELL:
+                sheet, row_offset, column_offset = reference
+                address = f"{sheet}!{index_to_letter(column + column_offset)}{row + row_offset + 1}"
+            elif kind == ReferenceKind.RANGE:
+                sheet, start_row, start_column, end_row, end_column = reference
+                address = (f"{sheet}!{index_to_letter(column + start_column)}{row + start_row + 1}:"
+                           f"{index_to_letter(column + end_column)}{row + end_row + 1}")
+            else:
+                address = reference
+            references.append((kind, address))
+        return tuple(references)
+
+
+class CompiledFormula:
+    """A formula of one item: a shared ``FormulaTemplate`` plus the absolute references it is bound to.
+
+    Calling it with the resolved references (in the order of ``references``) returns the raw
+    result of the formula, or a ``FormulaError`` value if the evaluation failed.
+    """
+    __slots__ = ('formula', 'template', 'references')
+
+    def __init__(self, formula: str, template: FormulaTemplate, references: Tuple[Tuple[str, str], ...]):
+        self.formula = formula
+        self.template = template
+        self.references = references
+
+    @property
+    def tree(self) -> Optional[Node]:
+        return self.template.tree
+
+    def referenced_names(self) -> Set[str]:
+        """Names of the sheets and properties the formula refers to."""
+        names = set()
+        for kind, address in self.references:
+            if kind == ReferenceKind.PROPERTY:
+                names.add(address[len('PROPERTIES!'):])
+            else:
+                names.add(address.split('!', 1)[0])
+        return names
+
+    def __call__(self, references: List[Any]) -> Any:
+        return Compiler.evaluate(self.template.function, references)
+
+    def __repr__(self):
+        return f"CompiledFormula(formula={self.formula!r}, template={self.template.key!r})"
+
+
+DIVISION_BY_ZERO = FormulaError.of(ErrorType.DIV)
+NAME_ERROR = FormulaError.of(ErrorType.NAME)
+
+
+class Compiler:
+    """Compiles formulas into ``CompiledFormula`` closures.
+
+    Compiled templates are cached workbook-wide in ``Compiler.templates``, keyed by the
+    normalized formula text, so a formula shape is parsed and lowered only once. The cache keeps
+    the ``constants.TEMPLATE_CACHE_SIZE`` most recently used templates; compiled formulas hold
+    their template, so dropping one from the cache only means compiling that shape again.
+
+    Spreadsheet functions (SUM, IF, ...) are looked up in ``Compiler.functions`` when the
+    formula is evaluated, so the model can register them without the compiler depending on it.
+
+    Errors are values: syntax errors, unknown names and functions, error literals and division by
+    zero evaluate to a ``FormulaError``, which the operators and functions pass on. Only operands of
+    an unexpected type still raise, ``Compiler.evaluate`` turns that into an error value too.
+    """
+    functions: Dict[str, Callable[..., Any]] = {}
+    templates: 'OrderedDict[str, FormulaTemplate]' = OrderedDict()
+
+    BINARY_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+        '+': lambda a, b: a + b,
+        '-': lambda a, b: a - b,
+        '*': lambda a, b: a * b,
+        '/': lambda a, b: a / b if b != 0 else DIVISION_BY_ZERO,
+        '=': lambda a, b: Compiler.first_error(a, b) or a == b,
+        '<>': lambda a, b: Compiler.first_error(a, b) or a != b,
+        '<': lambda a, b: a < b,
+        '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b,
+        '>=': lambda a, b: a >= b,
+    }
+
+    @staticmethod
+    def first_error(a: Any, b: Any) -> Optional[FormulaError]:
+        """Error operand of an equality, which unlike the other operators compares errors as strings."""
+        if isinstance(a, FormulaError):
+            return a
+        if isinstance(b, FormulaError):
+            return b
+        return None
+
+    @staticmethod
+    def evaluate(function: Callable[[List[Any]], Any], references: List[Any]) -> Any:
+        """Evaluate a compiled template, returning an error value if an operand had a wrong type."""
+        try:
+            return function(references)
+        except ZeroDivisionError:
+            return FormulaError.of(ErrorType.DIV)
+        except ValueError:
+            return FormulaError.of(ErrorType.VALUE)
+        except Exception:
+            return FormulaError.of(ErrorType.NAME)
+
+    @staticmethod
+    def register_function(name: str, function: Callable[..., Any]) -> None:
+        Compiler.functions[name] = function
+
+    @staticmethod
+    def clear_cache() -> None:
+        Compiler.templates.clear()
+
+    @staticmethod
+    def compile(formula: str, anchor: Optional[Tuple[int, int]] = None) -> CompiledFormula:
+        """Compile a formula once; the result can be evaluated any number of times.
+
+        Args:
+            formula (str): Formula text, starting with '='.
+            anchor (tuple[int, int]): Zero-based (row, column) of the cell holding the formula.
+                Cell references are made relative to it so that formulas of the same shape
+                share a template. Items outside spreadsheets pass None.
+        """
+        if anchor is None:
+            anchor = (0, 0)
+        key, tokens, descriptors = Compiler.normalize(formula, anchor)
+
+        template = Compiler.templates.get(key)
+        if template is None:
+            template = Compiler.compile_template(key, tokens, descriptors)
+            Compiler.templates[key] = template
+            if len(Compiler.templates) > constants.TEMPLATE_CACHE_SIZE:
+                Compiler.templates.popitem(last=False)
+        else:
+            Compiler.templates.move_to_end(key)
+
+        return CompiledFormula(formula, template, template.absolute_references(anchor))
+
+    @staticmethod
+    def normalize(formula: str, anchor: Tuple[int, int]) -> Tuple[str, Optional[List[Token]], Dict[str, Any]]:
+        """Rewrite the references of a formula relative to the anchor.
+
+        Returns:
+            tuple: The template key, the normalized tokens (None if the formula is not an expression)
+                and the reference descriptor of every relative reference in the tokens.
+        """
+        if not formula.startswith('='):
+            return '', None, {}
+
+        row, column = anchor
+        tokens = []
+        descriptors = {}
+        for token in Tokenizer.tokenize(formula[1:]):
+            if token.token_type == TokenType.VALUE and token.subtype == ValueType.IDENTIFIER:
+                error_type = error_literal(token.value)
+                if error_type is not None:
+                    token = Token(error_type.value[0], TokenType.VALUE, ReferenceKind.ERROR)
+                elif is_valid_cell_reference(token.value):
+                    sheet, ref_row, ref_column = parse_cell_reference(token.value)
+                    descriptor = (sheet, ref_row - row, ref_column - column)
+                    text = f"{sheet}!R[{descriptor[1]}]C[{descriptor[2]}]"
+                    token = Token(text, TokenType.VALUE, ReferenceKind.CELL)
+                    descriptors[text] = descriptor
+                elif is_valid_cell_range(token.value):
+                    sheet, start_row, start_column, end_row, end_column = parse_cell_range(token.value)
+                    descriptor = (sheet, start_row - row, start_column - column, end_row - row, end_column - column)
+                    text = f"{sheet}!R[{descriptor[1]}]C[{descriptor[2]}]:R[{descriptor[3]}]C[{descriptor[4]}]"
+                    token = Token(text, TokenType.VALUE, ReferenceKind.RANGE)
+                    descriptors[text] = descriptor
+                elif is_valid_properties_field(token.value):
+                    token = Token(token.value, TokenType.VALUE, ReferenceKind.PROPERTY)
+                    descriptors[token.value] = token.value
+            tokens.append(token)
+
+        key = '=' + ' '.join(f'"{token.value}"' if token.subtype == ValueType.STRING else token.value
+                             for token in tokens)
+        return key, tokens, descriptors
+
+    @staticmethod
+    def compile_template(key: str, tokens: Optional[List[Token]], descriptors: Dict[str, Any]) -> FormulaTemplate:
+        if tokens is None:
+            return FormulaTemplate(key, None, (), Compiler.constant(NAME_ERROR))
+
+        try:
+            tree = FormulaParser.parse_tokens(tokens)
+        except SyntaxError:
+            return FormulaTemplate(key, None, (), Compiler.constant(NAME_ERROR))
+
+        references: Dict[Tuple[str, str], int] = {}
+        function = Compiler.lower(tree, references)
+        return FormulaTemplate(key, tree, tuple((kind, descriptors[text]) for kind, text in references), function)
+
+    @staticmethod
+    def constant(value: Any) -> Callable[[List[Any]], Any]:
+        return lambda refs: value
+
+    @staticmethod
+    def lower(node: Node, references: Dict[Tuple[str, str], int]) -> Callable[[List[Any]], Any]:
+        """Lower a syntax tree node into a closure taking the list of resolved references."""
+        if isinstance(node, (NumberNode, StringNode)):
+            return Compiler.constant(node.value)
+
+        if isinstance(node, ErrorNode):
+            return Compiler.constant(FormulaError.of(node.error_type))
+
+        if isinstance(node, ReferenceNode):
+            index = references.setdefault((node.kind, node.address), len(references))
+            if node.kind == ReferenceKind.RANGE:
+                return lambda refs: refs[index]
+            return lambda refs: refs[index].value
+
+        if isinstance(node, NameNode):
+            return Compiler.constant(NAME_ERROR)
+
+        if isinstance(node, UnaryOperationNode):
+            operand = Compiler.lower(node.operand, references)
+            if node.operator == '-':
+                return lambda refs: -operand(refs)
+            return lambda refs: +operand(refs)
+
+        if isinstance(node, BinaryOperationNode):
+            left = Compiler.lower(node.left, references)
+            right = Compiler.lower(node.right, references)
+            operator = Compiler.BINARY_OPERATORS[node.operator]
+            return lambda refs: operator(left(refs), right(refs))
+
+        if isinstance(node, FunctionCallNode):
+            arguments = [Compiler.lower(argument, references) for argument in node.arguments]
+            name = node.name
+            functions = Compiler.functions
+
+            def call(refs):
+                function = functions.get(name)
+                if function is None:
+                    return NAME_ERROR
+                return function(*[argument(refs) for argument in arguments])
+            return call
+
+        raise SyntaxError(f"Cannot compile {node!r}")
@@ -1,4 +1,5 @@
 import re
+from typing import Any
 
 
 def index_to_letter(index: int) -> str:
@@ -34,6 +35,42 @@ def is_convertible_to_float(value: str) -> bool:
         return False
 
 
+class Empty(int):
+    """Value of an empty item. It reads as 0 in formulas, aggregates tell it from a number by its type."""
+
+    def __reduce__(self):
+        return Empty, ()
+
+
+EMPTY = Empty()
+
+
+def to_value(value: Any) -> Any:
+    """Typed value of an item, parsed once when it is set.
+
+    Numbers, and text holding a number, become floats and empty text becomes ``EMPTY``. A formula
+    reading an empty item results in 0. Booleans, other text and error values are kept as they are.
+    """
+    value_type = type(value)
+    if value_type is float:
+        return value
+    if value_type is int or value_type is Empty:
+        return float(value)
+    if value_type is not str:
+        return value
+    if value == '':
+        return EMPTY
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def state_value(value: Any) -> Any:
+    """Typed value as recorded in the state of an item, with ``EMPTY`` as '' so it differs from 0."""
+    return '' if type(value) is Empty else value
+
+
 def parse_reference_part(part: str) -> tuple[int, int]:
     """
     Parse a column and row from a cell reference part (e.g., 'A12').
@@ -0,0 +1,85 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from model.ColumnStore import ColumnStore
+from model.Enums import ErrorType, FormulaError
+from resources.utils import EMPTY, Empty, to_value
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ColumnStore([False, True, True])
+        self.store.insert_rows(0, 3)
+
+    def test_set_and_get(self):
+        self.store.set(0, 0, 'text')
+        self.store.set(1, 1, 2.5)
+        self.store.set(2, 1, True)
+        self.assertEqual(self.store.get(0, 0), 'text')
+        self.assertEqual(self.store.get(1, 1), 2.5)
+        self.assertIs(self.store.get(2, 1), True)
+        self.assertIs(self.store.get(0, 1), EMPTY)
+
+    def test_insert_and_remove_rows(self):
+        for row in range(3):
+            self.store.set(row, 1, float(row))
+        self.store.insert_rows(1)
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual([self.store.get(row, 1) for row in range(4)], [0.0, EMPTY, 1.0, 2.0])
+        self.store.remove_rows(0, 2)
+        self.assertEqual([self.store.get(row, 1) for row in range(2)], [1.0, 2.0])
+
+    def test_grows(self):
+        self.store.insert_rows(3, 100)
+        self.store.set(102, 2, 7.0)
+        self.assertEqual(len(self.store), 103)
+        self.assertEqual(self.store.get(102, 2), 7.0)
+
+    def test_numbers_are_views(self):
+        self.store.set(0, 1, 1.0)
+        self.store.set(1, 1, 'text')
+        self.store.set(2, 1, 3.0)
+        [(values, mask)] = self.store.numbers(0, 1, 2, 1)
+        self.assertEqual(values[mask].sum(), 4.0)
+        self.store.set(1, 1, 2.0)
+        self.assertEqual(values[mask].sum(), 6.0)
+
+    def test_numbers_of_text_column(self):
+        self.store.set(0, 0, 4.0)
+        self.store.set(1, 0, 'text')
+        [(values, mask)] = self.store.numbers(0, 0, 5, 0)
+        self.assertEqual(list(values), [4.0, 0.0, 0.0])
+        self.assertEqual(list(mask), [True, False, False])
+
+    def test_first_error(self):
+        ref, div = FormulaError.of(ErrorType.REF), FormulaError.of(ErrorType.DIV)
+        self.store.set(2, 1, ref)
+        self.store.set(1, 2, div)
+        self.assertIs(self.store.numbers(0, 1, 2, 2), div)
+        self.store.set(1, 2, 1.0)
+        self.assertIs(self.store.numbers(0, 1, 2, 2), ref)
+        self.store.remove_rows(2)
+        self.assertIsInstance(self.store.numbers(0, 1, 1, 2), list)
+
+    def test_column_values(self):
+        self.store.set(0, 1, 1.0)
+        self.store.set(1, 1, 2.0)
+        self.assertEqual(self.store.column_values(1).dtype, object)
+        self.store.set(2, 1, 3.0)
+        values = self.store.column_values(1)
+        self.assertEqual(values.dtype, np.float64)
+        self.assertEqual(list(values), [1.0, 2.0, 3.0])
+
+
+class TestValues(unittest.TestCase):
+    def test_to_value(self):
+        self.assertIs(to_value(''), EMPTY)
+        self.assertEqual(to_value('2'), 2.0)
+        self.assertIs(type(to_value(EMPTY)), float)
+        self.assertIs(type(pickle.loads(pickle.dumps(EMPTY))), Empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from model.Enums import ErrorType, FormulaError
+from resources import constants
+from resources.parser import Compiler, ReferenceKind, BinaryOperationNode, FunctionCallNode
+
+
+def cell(value):
+    return SimpleNamespace(value=value)
+
+
+class TestCompiler(unittest.TestCase):
+    def test_number_literals(self):
+        self.assertEqual(Compiler.compile("=1+2*3")([]), 7)
+        self.assertEqual(Compiler.compile("=1.5*2")([]), 3.0)
+        self.assertEqual(Compiler.compile("=(1+2)*3")([]), 9)
+        self.assertEqual(Compiler.compile("=1e5")([]), 100000.0)
+        self.assertEqual(Compiler.compile("=2.5E-1+1e+1")([]), 10.25)
+
+    def test_unary_operators(self):
+        self.assertEqual(Compiler.compile("=-2*3")([]), -6)
+        self.assertEqual(Compiler.compile("=4--2")([]), 6)
+
+    def test_comparisons(self):
+        self.assertTrue(Compiler.compile("=2>1")([]))
+        self.assertTrue(Compiler.compile("=2>=2")([]))
+        self.assertTrue(Compiler.compile("=1<=2")([]))
+        self.assertTrue(Compiler.compile("=1<>2")([]))
+        self.assertTrue(Compiler.compile("=2=2")([]))
+        self.assertTrue(Compiler.compile("=2==2")([]))
+
+    def test_references_are_collected_once_in_order(self):
+        compiled = Compiler.compile("=Sheet1!A1*Sheet1!B1+Sheet1!A1+PROPERTIES!width")
+        self.assertEqual(compiled.references, (
+            (ReferenceKind.CELL, 'Sheet1!A1'),
+            (ReferenceKind.CELL, 'Sheet1!B1'),
+            (ReferenceKind.PROPERTY, 'PROPERTIES!width'),
+        ))
+        self.assertEqual(compiled([cell(2), cell(3), cell(10)]), 18)
+
+    def test_range_reference_is_passed_as_is(self):
+        compiled = Compiler.compile("=Sheet1!A1:A3")
+        self.assertEqual(compiled.references, ((ReferenceKind.RANGE, 'Sheet1!A1:A3'),))
+        cells = [cell(1), cell(2)]
+        self.assertIs(compiled([cells]), cells)
+
+    def test_function_call(self):
+        Compiler.register_function('TEST_SUM', lambda cells: sum(c.value for c in cells))
+        compiled = Compiler.compile("=TEST_SUM(Sheet1!A1:A2)*2")
+        self.assertIsInstance(compiled.tree, BinaryOperationNode)
+        self.assertIsInstance(compiled.tree.left, FunctionCallNode)
+        self.assertEqual(compiled([[cell(1), cell(2)]]), 6)
+
+    def test_semicolon_separated_arguments(self):
+        Compiler.register_function('TEST_PICK', lambda test, a, b: a if test else b)
+        self.assertEqual(Compiler.compile("=TEST_PICK(1>2; 10; 20)")([]), 20)
+
+    def test_unknown_function_is_name_error(self):
+        self.assertIs(Compiler.compile("=UNKNOWN(1)")([]), FormulaError.of(ErrorType.NAME))
+
+    def test_unknown_name_is_name_error(self):
+        self.assertIs(Compiler.compile("=foo+1")([]), FormulaError.of(ErrorType.NAME))
+
+    def test_syntax_errors_are_name_errors(self):
+        for formula in ("=", "=1+", "=(1+2", "=1)"):
+            self.assertIs(Compiler.compile(formula)([]), FormulaError.of(ErrorType.NAME))
+
+    def test_division_by_zero(self):
+        self.assertIs(Compiler.compile("=1/0")([]), FormulaError.of(ErrorType.DIV))
+
+    def test_errors_propagate(self):
+        div = FormulaError.of(ErrorType.DIV)
+        self.assertIs(Compiler.compile("=Sheet1!A1*2+1")([cell(div)]), div)
+        self.assertIs(Compiler.compile("=-Sheet1!A1")([cell(div)]), div)
+        self.assertIs(Compiler.compile("=1<Sheet1!A1")([cell(div)]), div)
+        self.assertIs(Compiler.compile("=Sheet1!A1=\"#DIV/0!\"")([cell(div)]), div)
+        self.assertIs(Compiler.compile("=\"a\"+Sheet1!A1")([cell(div)]), div)
+
+    def test_error_literals(self):
+        self.assertIs(Compiler.compile("=#REF!*2")([]), FormulaError.of(ErrorType.REF))
+        compiled = Compiler.compile("=PROPERTIES!#REF!+1")
+        self.assertEqual(compiled.references, ())
+        self.assertIs(compiled([]), FormulaError.of(ErrorType.REF))
+
+    def test_wrong_operand_type_is_an_error_value(self):
+        self.assertIs(Compiler.compile("=\"a\"-1")([]), FormulaError.of(ErrorType.NAME))
+
+
+class TestFormulaTemplates(unittest.TestCase):
+    def setUp(self):
+        Compiler.clear_cache()
+
+    def test_same_shape_shares_template(self):
+        first = Compiler.compile("=Sheet1!E1*Sheet1!F1", anchor=(0, 6))
+        second = Compiler.compile("=Sheet1!E2*Sheet1!F2", anchor=(1, 6))
+        self.assertIs(first.template, second.template)
+        self.assertEqual(first.template.key, "=Sheet1!R[0]C[-2] * Sheet1!R[0]C[-1]")
+        self.assertEqual(len(Compiler.templates), 1)
+
+    def test_references_are_absolute_per_cell(self):
+        first = Compiler.compile("=Sheet1!E1*Sheet1!F1", anchor=(0, 6))
+        second = Compiler.compile("=Sheet1!E2*Sheet1!F2", anchor=(1, 6))
+        self.assertEqual(first.references, ((ReferenceKind.CELL, 'Sheet1!E1'), (ReferenceKind.CELL, 'Sheet1!F1')))
+        self.assertEqual(second.references, ((ReferenceKind.CELL, 'Sheet1!E2'), (ReferenceKind.CELL, 'Sheet1!F2')))
+        self.assertEqual(second([cell(3), cell(4)]), 12)
+
+    def test_ranges_and_properties(self):
+        first = Compiler.compile("=SUM(Sheet1!G1:G10)+PROPERTIES!width", anchor=(10, 6))
+        second = Compiler.compile("=SUM(Sheet1!H1:H10)+PROPERTIES!width", anchor=(10, 7))
+        self.assertIs(first.template, second.template)
+        self.assertEqual(second.references, ((ReferenceKind.RANGE, 'Sheet1!H1:H10'),
+                                             (ReferenceKind.PROPERTY, 'PROPERTIES!width')))
+
+    def test_different_shapes_do_not_share(self):
+        first = Compiler.compile("=Sheet1!E1*Sheet1!F1", anchor=(0, 6))
+        second = Compiler.compile("=Sheet1!E1*Sheet1!F1", anchor=(1, 6))
+        self.assertIsNot(first.template, second.template)
+
+    def test_cache_keeps_recently_used_templates(self):
+        with patch.object(constants, 'TEMPLATE_CACHE_SIZE', 2):
+            first = Compiler.compile("=Sheet1!E1*2", anchor=(0, 6))
+            Compiler.compile("=Sheet1!E1*3", anchor=(0, 6))
+            Compiler.compile("=Sheet1!E2*2", anchor=(1, 6))
+            Compiler.compile("=Sheet1!E1*4", anchor=(0, 6))
+        self.assertEqual(list(Compiler.templates), ["=Sheet1!R[0]C[-2] * 2", "=Sheet1!R[0]C[-2] * 4"])
+        self.assertEqual(first([cell(5)]), 10)
+
+    def test_string_literals_are_not_references(self):
+        first = Compiler.compile('=IF(Sheet1!A1>1; "Sheet1!A1"; 0)', anchor=(0, 1))
+        self.assertEqual(first.references, ((ReferenceKind.CELL, 'Sheet1!A1'),))
+
+
+if __name__ == '__main__':
+    unittest.main()
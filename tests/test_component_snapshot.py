@@ -0,0 +1,85 @@
+import pickle
+import unittest
+from model.ComponentSnapshot import ComponentSnapshot, evaluate_snapshot
+from model.Enums import ErrorType, FormulaError
+from model.RangeIndex import CellRange
+from resources.parser import Compiler
+
+
+class FakeInput:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeItem:
+    def __init__(self, formula, row, bound_references, value=0):
+        self.formula = formula
+        self.row = row
+        self.python_formula = Compiler.compile(formula, (row, 0))
+        self.bound_references = bound_references
+        self._value = value
+        self.error = None
+
+    def formula_anchor(self):
+        return self.row, 0
+
+    def get_state(self):
+        return self._value, self.error
+
+
+class FakeSheet:
+    def __init__(self, cells):
+        self.cells = cells
+
+    def get_cells(self, start_row, start_col, end_row, end_col):
+        return self.cells[start_row:end_row + 1]
+
+
+class TestComponentSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.width = FakeInput(4.0)
+        self.b1 = FakeItem('=PROPERTIES!width*2', 0, [self.width], 6.0)
+        self.b2 = FakeItem('=Sheet1!B1+1', 1, [self.b1], 7.0)
+        self.b3 = FakeItem('=Sheet1!B2/0', 2, [self.b2])
+        self.total = FakeItem('=SUM(Sheet1!B1:B2)', 3, [CellRange('Sheet1', 0, 1, 1, 1, FakeSheet([self.b1, self.b2]))])
+        self.items = [self.b1, self.b2, self.b3, self.total]
+
+    def evaluate(self, roots, previous_states=None):
+        if previous_states is None:
+            previous_states = {item: item.get_state() for item in self.items}
+        snapshot = ComponentSnapshot.from_items(self.items, roots, previous_states)
+        return evaluate_snapshot(pickle.loads(pickle.dumps(snapshot)))
+
+    def test_evaluates_in_order(self):
+        states, results = self.evaluate(set(self.items))
+        self.assertEqual(states, [(8.0, None), (9.0, None), ('#DIV/0!', ErrorType.DIV), (17.0, None)])
+        self.assertIs(states[2][0], FormulaError.of(ErrorType.DIV))
+        self.assertEqual(len(results), 4)
+
+    def test_early_cutoff(self):
+        self.width.value = 3.0
+        states, results = self.evaluate({self.b1})
+        self.assertEqual(states[:2], [(6.0, None), (7.0, None)])
+        self.assertEqual(len(results), 1)
+
+    def test_error_propagates_to_dependents(self):
+        self.items.append(FakeItem('=Sheet1!B3+1', 4, [self.b3]))
+        states, results = self.evaluate({self.b3})
+        # The dependent reads the error value and evaluates to it
+        self.assertEqual(states[2:], [('#DIV/0!', ErrorType.DIV), (0, None), ('#DIV/0!', ErrorType.DIV)])
+        self.assertEqual(len(results), 2)
+
+    def test_error_in_range(self):
+        self.b2._value, self.b2.error = FormulaError.of(ErrorType.REF), ErrorType.REF
+        states, results = self.evaluate({self.total})
+        self.assertEqual(states[3], ('#REF!', ErrorType.REF))
+
+    def test_values_are_typed(self):
+        self.items.append(FakeItem('=Sheet1!B1>1', 4, [self.b1]))
+        self.items.append(FakeItem('="5"', 5, []))
+        states, results = self.evaluate({self.b1, self.items[4], self.items[5]})
+        self.assertIs(type(states[0][0]), float)
+        self.assertIs(states[4][0], True)
+        self.assertEqual(states[5], (5.0, None))
+        # The results are shipped as evaluated, so the items display them like any other result
+        self.assertEqual(results[5], '5')
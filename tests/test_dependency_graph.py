@@ -0,0 +1,169 @@
+import random
+import unittest
+from model.DependencyGraph import DependencyGraph
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph()
+
+    def test_add_and_remove_edge(self):
+        self.graph.add_edge('A1', 'B1')
+        self.assertTrue(self.graph.has_edge('A1', 'B1'))
+        self.assertEqual(self.graph.dependents('A1'), {'B1'})
+        self.assertEqual(self.graph.precedents('B1'), {'A1'})
+
+        self.graph.remove_edge('A1', 'B1')
+        self.assertFalse(self.graph.has_edge('A1', 'B1'))
+        self.assertEqual(self.graph.dependents('A1'), set())
+        self.assertEqual(self.graph.precedents('B1'), set())
+        self.assertEqual(len(self.graph), 0)
+
+    def test_remove_missing_edge(self):
+        self.graph.remove_edge('A1', 'B1')
+        self.assertEqual(len(self.graph), 0)
+
+    def test_set_precedents_replaces_incoming_edges(self):
+        self.graph.set_precedents('C1', ['A1', 'B1'])
+        self.graph.set_precedents('C1', ['B1', 'D1'])
+        self.assertEqual(self.graph.precedents('C1'), {'B1', 'D1'})
+        self.assertEqual(self.graph.dependents('A1'), set())
+        self.assertEqual(self.graph.dependents('D1'), {'C1'})
+
+        self.graph.set_precedents('C1', [])
+        self.assertEqual(len(self.graph), 0)
+
+    def test_remove_node(self):
+        self.graph.set_precedents('B1', ['A1'])
+        self.graph.set_precedents('C1', ['B1'])
+        self.graph.remove_node('B1')
+        self.assertEqual(self.graph.dependents('A1'), set())
+        self.assertEqual(self.graph.precedents('C1'), set())
+
+    def test_dirty_closure(self):
+        self.graph.set_precedents('B1', ['A1'])
+        self.graph.set_precedents('C1', ['B1'])
+        self.graph.set_precedents('D1', ['B1', 'E1'])
+        self.assertEqual(self.graph.dirty_closure(['A1']), {'A1', 'B1', 'C1', 'D1'})
+        self.assertEqual(self.graph.dirty_closure(['E1']), {'E1', 'D1'})
+
+    def test_dirty_closure_with_cycle(self):
+        self.graph.set_precedents('A1', ['B1'])
+        self.graph.set_precedents('B1', ['A1'])
+        self.assertEqual(self.graph.dirty_closure(['A1']), {'A1', 'B1'})
+
+    def test_precedent_closure(self):
+        self.graph.set_precedents('B1', ['A1'])
+        self.graph.set_precedents('C1', ['B1', 'E1'])
+        self.graph.set_precedents('D1', ['E1'])
+        self.assertEqual(self.graph.precedent_closure(['C1'], {'A1', 'B1', 'C1', 'D1', 'E1'}), {'A1', 'B1', 'C1', 'E1'})
+        self.assertEqual(self.graph.precedent_closure(['C1'], {'A1', 'E1'}), {'C1', 'E1'})
+
+    def test_components(self):
+        self.graph.set_precedents('B1', ['A1'])
+        self.graph.set_precedents('C1', ['B1'])
+        self.graph.set_precedents('B2', ['A1'])
+        self.graph.set_precedents('C2', ['B2'])
+        self.assertEqual(self.graph.components(['B1', 'B2', 'C1', 'C2']), [['B1', 'C1'], ['B2', 'C2']])
+        self.assertEqual(self.graph.components(['A1', 'B1', 'B2', 'C2']), [['A1', 'B1', 'B2', 'C2']])
+
+    def test_many_edges(self):
+        count = 100_000
+        for i in range(count):
+            self.graph.add_edge('P', i)
+        self.assertEqual(len(self.graph), count)
+        for i in range(count):
+            self.graph.remove_edge('P', i)
+        self.assertEqual(len(self.graph), 0)
+
+
+class TestTopologicalOrder(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph()
+
+    def assertOrdered(self, nodes):
+        order = self.graph.topological_sort(nodes)
+        for node in nodes:
+            for dependent in self.graph.dependents(node):
+                if dependent in nodes:
+                    self.assertLess(order.index(node), order.index(dependent), (node, dependent))
+
+    def test_edges_added_against_order(self):
+        self.graph.add_edge('C1', 'D1')
+        self.graph.add_edge('A1', 'B1')
+        self.graph.add_edge('D1', 'A1')
+        self.graph.add_edge('B1', 'E1')
+        self.assertEqual(self.graph.topological_sort(['A1', 'B1', 'C1', 'D1', 'E1']), ['C1', 'D1', 'A1', 'B1', 'E1'])
+
+    def test_cycle_is_ordered_once_broken(self):
+        self.graph.add_edge('A1', 'B1')
+        self.graph.add_edge('B1', 'C1')
+        self.graph.add_edge('C1', 'A1')
+        self.assertEqual(len(self.graph), 3)
+
+        self.graph.remove_edge('A1', 'B1')
+        self.assertEqual(self.graph.topological_sort(['A1', 'B1', 'C1']), ['B1', 'C1', 'A1'])
+
+    def test_self_reference(self):
+        self.graph.add_edge('A1', 'A1')
+        self.assertTrue(self.graph.has_edge('A1', 'A1'))
+        self.graph.remove_edge('A1', 'A1')
+        self.assertEqual(len(self.graph), 0)
+
+    def test_random_edits_keep_order(self):
+        random.seed(7)
+        nodes = range(25)
+        for _ in range(300):
+            precedent, dependent = random.choice(nodes), random.choice(nodes)
+            if random.random() < 0.7:
+                self.graph.add_edge(precedent, dependent)
+            else:
+                self.graph.remove_edge(precedent, dependent)
+        for precedent in nodes:
+            for dependent in list(self.graph.dependents(precedent)):
+                if random.random() < 0.5:
+                    self.graph.remove_edge(precedent, dependent)
+        # Whatever cycles are left, the nodes outside of them must be ordered
+        acyclic = {node for node in nodes if node not in self.graph.dirty_closure(self.graph.dependents(node))}
+        self.assertOrdered(acyclic)
+
+
+class TestCycles(unittest.TestCase):
+    def setUp(self):
+        self.graph = DependencyGraph()
+
+    def test_acyclic(self):
+        self.graph.set_precedents('B1', ['A1'])
+        self.graph.set_precedents('C1', ['A1', 'B1'])
+        self.assertEqual(self.graph.cycles(['A1', 'B1', 'C1']), [])
+
+    def test_self_reference(self):
+        self.graph.add_edge('A1', 'A1')
+        self.graph.add_edge('A1', 'B1')
+        self.assertEqual(self.graph.cycles(['A1', 'B1']), [{'A1'}])
+
+    def test_cycles_and_tails(self):
+        self.graph.add_edge('A1', 'B1')
+        self.graph.add_edge('B1', 'C1')
+        self.graph.add_edge('C1', 'A1')
+        self.graph.add_edge('C1', 'D1')
+        self.graph.add_edge('E1', 'F1')
+        self.graph.add_edge('F1', 'E1')
+        self.graph.add_edge('D1', 'E1')
+        components = self.graph.cycles(['A1', 'B1', 'C1', 'D1', 'E1', 'F1'])
+        self.assertCountEqual(components, [{'A1', 'B1', 'C1'}, {'E1', 'F1'}])
+
+    def test_only_given_nodes(self):
+        self.graph.add_edge('A1', 'B1')
+        self.graph.add_edge('B1', 'A1')
+        self.assertEqual(self.graph.cycles(['A1']), [])
+
+    def test_long_chain(self):
+        for i in range(10_000):
+            self.graph.add_edge(i, i + 1)
+        self.graph.add_edge(10_000, 0)
+        self.assertEqual(self.graph.cycles(range(10_001)), [set(range(10_001))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import estimate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT = os.path.join(ROOT, 'resources', 'test.json')
+
+
+class TestEstimate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def run_main(self, *arguments):
+        return estimate.main([PROJECT, '--output', self.directory.name, *arguments])
+
+    def test_overrides(self):
+        overrides = ['--set', 'buildingLength=10', '--set', 'buildingWidth=8', '--set', 'roofLength=12']
+        self.assertEqual(self.run_main(*overrides, '--set', 'attic=nie'), 0)
+        with open(os.path.join(self.directory.name, 'test.results.json'), encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(results['properties']['foundationArea'], 80.0)
+        self.assertIs(results['properties']['attic'], False)
+        self.assertAlmostEqual(results['sheets']['Dach'][0]['ILOŚĆ'], 183.168)
+
+    def test_invalid_overrides(self):
+        self.assertEqual(self.run_main('--set', 'missing=1'), 1)
+        self.assertEqual(self.run_main('--set', 'attic=maybe'), 1)
+        self.assertEqual(self.run_main('--set', 'buildingLength=abc'), 1)
+        with self.assertRaises(SystemExit):
+            self.run_main('--set', 'buildingLength')
+
+    def test_csv(self):
+        self.assertEqual(self.run_main('--format', 'csv'), 0)
+        names = sorted(os.listdir(self.directory.name))
+        self.assertIn('test.properties.csv', names)
+        self.assertIn('test.Dach.csv', names)
+
+    def test_without_qt(self):
+        code = ('import sys, estimate; estimate.main(sys.argv[1:]); sys.exit("PyQt6" in sys.modules)')
+        process = subprocess.run([sys.executable, '-c', code, PROJECT, '--output', self.directory.name,
+                                  '--format', 'json', 'xlsx'], cwd=ROOT, capture_output=True)
+        self.assertEqual(process.returncode, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'test.xlsx')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from types import SimpleNamespace
+
+from model.Enums import ErrorType, FormulaError
+from model.Functions import (sum_function, average_function, max_function, min_function, and_function,
+                             or_function, if_function)
+from resources.parser import Compiler
+
+
+def cells(*values):
+    return [SimpleNamespace(value=value) for value in values]
+
+
+class TestAggregates(unittest.TestCase):
+    def test_sum(self):
+        self.assertEqual(sum_function(cells(1.0, 2.5, 'text', True, 0)), 3.5)
+        self.assertEqual(sum_function(cells(1.0, 2.0), 4.0, cells(3.0)), 10.0)
+        self.assertEqual(sum_function(cells()), 0.0)
+
+    def test_missing_cells_are_empty(self):
+        self.assertEqual(sum_function(cells(1.0) + [None]), 1.0)
+
+    def test_average(self):
+        self.assertEqual(average_function(cells(1.0, 'text', 5.0)), 3.0)
+        self.assertIs(average_function(cells('text')), FormulaError.of(ErrorType.DIV))
+
+    def test_max_and_min(self):
+        self.assertEqual(max_function(cells(-4.0, 'text', -2.0), -3.0), -2.0)
+        self.assertEqual(min_function(cells(4.0, 2.0), 3.0), 2.0)
+        self.assertEqual(max_function(cells('text')), 0.0)
+
+    def test_first_error_is_returned(self):
+        ref, div = FormulaError.of(ErrorType.REF), FormulaError.of(ErrorType.DIV)
+        for function in (sum_function, average_function, max_function, min_function, and_function, or_function):
+            self.assertIs(function(cells(1.0, ref, div)), ref, function.__name__)
+            self.assertIs(function(cells(1.0), div), div, function.__name__)
+
+    def test_and_or(self):
+        self.assertTrue(and_function(True, cells(1.0, 'text', True)))
+        self.assertFalse(and_function(cells(True, 0.0)))
+        self.assertTrue(or_function(False, cells(0.0, 2.0)))
+        self.assertFalse(or_function(cells(False), 0.0))
+        self.assertIs(and_function(cells('text')), FormulaError.of(ErrorType.VALUE))
+
+    def test_if(self):
+        self.assertEqual(if_function(True, 1, 2), 1)
+        self.assertIs(if_function(FormulaError.of(ErrorType.NAME), 1, 2), FormulaError.of(ErrorType.NAME))
+
+    def test_registered_for_formulas(self):
+        column = cells(3.0, 1.0, 2.0)
+        self.assertEqual(Compiler.compile("=MAX(Sheet1!A1:A3)+MIN(Sheet1!A1:A3;5)")([column]), 4.0)
+        self.assertEqual(Compiler.compile("=AVERAGE(Sheet1!A1:A3)")([column]), 2.0)
+        self.assertTrue(Compiler.compile("=AND(Sheet1!A1:A3;OR(1>2;2>1))")([column]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import math
+import unittest
+
+from model.GoalSeek import Cone, solve
+from model.Workbook import Workbook, NUMBER_TYPE
+
+
+class TestSolve(unittest.TestCase):
+    def test_secant(self):
+        result = solve(lambda x: 3 * x + 4, 100.0, 0.0)
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.value, 32.0)
+        self.assertLessEqual(result.iterations, 4)
+
+    def test_nonlinear(self):
+        result = solve(math.exp, 10.0, 0.0)
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.value, math.log(10.0))
+
+    def test_bracket(self):
+        result = solve(lambda x: x * x, 2.0, 0.0, low=0.0, high=5.0)
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.value, math.sqrt(2.0))
+
+    def test_step_function(self):
+        result = solve(lambda x: 1.0 if x > 3 else 0.0, 1.0, 0.0)
+        self.assertTrue(result.converged)
+        self.assertGreater(result.value, 3)
+
+    def test_not_reachable(self):
+        self.assertFalse(solve(lambda x: x * x, -1.0, 1.0).converged)
+        self.assertFalse(solve(lambda x: 5.0, 1.0, 0.0, max_iterations=20).converged)
+
+    def test_error_result(self):
+        result = solve(lambda x: math.sqrt(x) if x >= 0 else '#VALUE!', 3.0, 1.0)
+        self.assertTrue(result.converged)
+        self.assertAlmostEqual(result.value, 9.0)
+
+
+class TestGoalSeek(unittest.TestCase):
+    def setUp(self):
+        self.workbook = Workbook()
+        self.workbook.add_property('area', NUMBER_TYPE, 'Tab', formula=10.0)
+        self.workbook.add_property('price', NUMBER_TYPE, 'Tab', formula=2.0)
+        self.workbook.add_sheet('Sheet1', 'Tab')
+        self.workbook.add_rows('Sheet1', 3)
+        self.workbook.set('Sheet1!E1', '=PROPERTIES!area*PROPERTIES!price')
+        self.workbook.set('Sheet1!E2', '=PROPERTIES!area+1')
+        self.workbook.set('Sheet1!E3', '=PROPERTIES!price*3')
+        self.workbook.set('Sheet1!G1', '=SUM(Sheet1!E1:E3)')
+
+    def test_cone(self):
+        cone = Cone(self.workbook.dependency_graph, self.workbook.record('area'), self.workbook.record('Sheet1!E1'))
+        self.assertEqual([record.name for record in cone.order], ['Sheet1!E1'])
+        cone = Cone(self.workbook.dependency_graph, self.workbook.record('area'), self.workbook.record('Sheet1!G1'))
+        self.assertEqual({record.name for record in cone.order}, {'Sheet1!E1', 'Sheet1!E2', 'Sheet1!G1'})
+        with self.assertRaises(ValueError):
+            Cone(self.workbook.dependency_graph, self.workbook.record('area'), self.workbook.record('Sheet1!E3'))
+
+    def test_goal_seek(self):
+        result = self.workbook.goal_seek('area', 'Sheet1!G1', 100.0)
+        self.assertTrue(result.converged)
+        # 2 * area + area + 1 + 6 = 100
+        self.assertAlmostEqual(self.workbook.get('area'), 31.0)
+        self.assertAlmostEqual(self.workbook.get('Sheet1!G1'), 100.0)
+        self.assertAlmostEqual(self.workbook.get('Sheet1!E2'), 32.0)
+
+    def test_without_apply(self):
+        before = self.workbook.to_dict()
+        result = self.workbook.goal_seek('PROPERTIES!price', 'Sheet1!E1', 50.0, apply=False)
+        self.assertAlmostEqual(result.value, 5.0)
+        self.assertEqual(self.workbook.to_dict(), before)
+        self.assertEqual(self.workbook.get('Sheet1!E3'), 6.0)
+        self.assertEqual(self.workbook.get('Sheet1!G1'), 37.0)
+
+    def test_input_with_formula(self):
+        with self.assertRaises(ValueError):
+            self.workbook.goal_seek('Sheet1!E2', 'Sheet1!G1', 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
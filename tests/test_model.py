@@ -0,0 +1,117 @@
+import os
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtWidgets import QApplication
+
+from model.CheckBoxItem import CheckBoxItem
+from model.DoubleSpinBoxItem import DoubleSpinBoxItem
+from model.Enums import ErrorType
+from model.Model import Model
+from model.Spreadsheet import Spreadsheet
+from resources.TabWidget import TabWidget
+
+
+class TestModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.tab_widget = TabWidget()
+        tab = self.tab_widget.add_new_tab('Tab')
+        self.sheet = tab.add_property('Sheet1', 'Sheet1', Spreadsheet).item
+        self.sheet.add_rows(3)
+        self.tab = tab
+        self.addCleanup(self.tab_widget.clean_up)
+
+    def test_remove_row_under_range(self):
+        for row in range(3):
+            self.sheet.get_cell(row, 4).set_item(str(row + 1))
+        cell = self.sheet.get_cell(2, 6)
+        cell.set_item('=SUM(Sheet1!G1:G3)')
+        self.assertIs(cell.error, ErrorType.CIRCULAR)
+
+        self.sheet.remove_row(0)
+        self.assertEqual(cell.formula, '=SUM(#REF!:G3)')
+        # The range the formula read is gone, so is the cycle through it
+        self.assertEqual(cell.items_that_i_depend_on, set())
+        self.assertIs(cell.error, ErrorType.NAME)
+
+    def lazy_evaluation(self):
+        Model.set_visible_tab(self.tab)
+        Model.set_lazy_evaluation(True)
+        self.addCleanup(Model.set_visible_tab, None)
+        self.addCleanup(Model.set_lazy_evaluation, False)
+
+    def test_lazy_evaluation(self):
+        other = self.tab_widget.add_new_tab('Other').add_property('Sheet2', 'Sheet2', Spreadsheet).item
+        other.add_rows(1)
+        source = self.sheet.get_cell(0, 4)
+        hidden = other.get_cell(0, 4)
+        source.set_item('3')
+        hidden.set_item('=Sheet1!E1*2')
+        self.lazy_evaluation()
+
+        source.set_item('7')
+        self.assertEqual(source.value, 7.0)
+        self.assertEqual(hidden.value, 6.0)  # stale until its tab is shown
+        Model.set_visible_tab(self.tab_widget.widget(1))
+        self.assertEqual(hidden.value, 14.0)
+
+    def test_lazy_evaluation_after_renaming_the_visible_tab(self):
+        source = self.sheet.get_cell(0, 4)
+        dependent = self.sheet.get_cell(1, 4)
+        source.set_item('3')
+        dependent.set_item('=Sheet1!E1*2')
+        self.lazy_evaluation()
+
+        self.tab_widget.rename_tab('Renamed', 0)
+        source.set_item('7')
+        self.assertEqual(source.value, 7.0)
+        self.assertEqual(dependent.value, 14.0)
+
+    def test_preview_keeps_the_calculated_value(self):
+        source = self.sheet.get_cell(0, 4)
+        dependent = self.sheet.get_cell(1, 4)
+        source.set_item('3')
+        dependent.set_item('=Sheet1!E1*2')
+
+        source.preview('5')
+        self.assertEqual(source.display_text, '5')
+        self.assertEqual(source.value, 3.0)
+        source.set_item('5')
+        self.assertEqual(dependent.value, 10.0)
+
+    def test_display_text_of_whole_numbers(self):
+        cell = self.sheet.get_cell(0, 6)
+        cell.set_item('=2*3')
+        self.assertEqual(cell.display_text, '6.0')
+        # A value loaded from a workbook is already a float
+        Model.load_item(cell, '=2*3', 6.0, cell.python_formula)
+        self.assertEqual(cell.display_text, '6.0')
+
+    def test_property_text_becomes_a_number(self):
+        length = self.tab.add_property('Length', 'length', DoubleSpinBoxItem).item
+        width = self.tab.add_property('Width', 'width', DoubleSpinBoxItem).item
+        cell = self.sheet.get_cell(0, 0)
+        cell.set_item('=(PROPERTIES!length+PROPERTIES!width)*2')
+
+        length.set_item('10')
+        width.set_item('8')
+        self.assertEqual(length.value, 10.0)
+        self.assertEqual(cell.value, 36.0)
+
+    def test_check_box_value(self):
+        check_box = self.tab.add_property('Chimney', 'chimney', CheckBoxItem).item
+        check_box.set_item(1)
+        self.assertIs(check_box.isChecked(), True)
+        self.assertEqual(check_box.value, 1.0)
+        check_box.set_item(False)
+        self.assertIs(check_box.isChecked(), False)
+        self.assertIs(check_box.value, False)
+
+
+if __name__ == '__main__':
+    unittest.main()
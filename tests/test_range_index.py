@@ -0,0 +1,101 @@
+import unittest
+from model.DependencyGraph import DependencyGraph
+from model.RangeIndex import RangeIndex, CellRange
+
+
+class FakeCell:
+    def __init__(self, sheet_name, row, col):
+        self.position = (sheet_name, row, col)
+
+    def __repr__(self):
+        return f"FakeCell{self.position}"
+
+
+class FakeSheet:
+    def __init__(self, name, rows, columns):
+        self.cells = [[FakeCell(name, row, col) for col in range(columns)] for row in range(rows)]
+
+    def get_cells(self, start_row, start_col, end_row, end_col):
+        return [self.cells[row][col] if row < len(self.cells) and col < len(self.cells[row]) else None
+                for row in range(start_row, end_row + 1) for col in range(start_col, end_col + 1)]
+
+
+class TestRangeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = RangeIndex()
+
+    def test_intern_shares_records(self):
+        self.assertIs(self.index.intern('Sheet1', 0, 6, 4999, 6), self.index.intern('Sheet1', 0, 6, 4999, 6))
+        self.assertIsNot(self.index.intern('Sheet1', 0, 6, 4999, 6), self.index.intern('Sheet2', 0, 6, 4999, 6))
+
+    def test_containing(self):
+        column = self.index.intern('Sheet1', 0, 6, 4999, 6)
+        block = self.index.intern('Sheet1', 10, 5, 20, 6)
+        self.index.add(column)
+        self.index.add(block)
+        self.assertEqual(self.index.containing('Sheet1', 100, 6), [column])
+        self.assertCountEqual(self.index.containing('Sheet1', 15, 6), [column, block])
+        self.assertEqual(self.index.containing('Sheet1', 15, 5), [block])
+        self.assertEqual(self.index.containing('Sheet1', 15, 4), [])
+        self.assertEqual(self.index.containing('Sheet2', 15, 6), [])
+
+    def test_remove(self):
+        column = self.index.intern('Sheet1', 0, 6, 4999, 6)
+        self.index.add(column)
+        self.index.remove(column)
+        self.assertEqual(self.index.containing('Sheet1', 100, 6), [])
+        self.assertNotIn(column, self.index)
+        self.assertEqual(len(self.index), 0)
+
+    def test_cells(self):
+        sheet = FakeSheet('Sheet1', 3, 2)
+        cell_range = CellRange('Sheet1', 1, 0, 3, 1, sheet)
+        self.assertEqual(len(cell_range), 6)
+        self.assertEqual(list(cell_range), [sheet.cells[1][0], sheet.cells[1][1],
+                                            sheet.cells[2][0], sheet.cells[2][1], None, None])
+        self.assertEqual(list(CellRange('Sheet1', 0, 0, 1, 0)), [None, None])
+
+
+class TestRangeDependencies(unittest.TestCase):
+    def setUp(self):
+        self.sheet = FakeSheet('Sheet1', 100, 3)
+        self.graph = DependencyGraph(lambda node: getattr(node, 'position', None))
+        self.total = FakeCell('Sheet2', 0, 0)
+        self.cell_range = self.graph.cell_range('Sheet1', 0, 2, 99, 2, self.sheet)
+        self.graph.set_precedents(self.total, [self.cell_range])
+
+    def cell(self, row, col):
+        return self.sheet.cells[row][col]
+
+    def test_single_edge_per_range(self):
+        self.assertEqual(len(self.graph), 1)
+        self.assertEqual(self.graph.dependents(self.cell(50, 2)), {self.total})
+        self.assertEqual(self.graph.dependents(self.cell(50, 1)), set())
+        self.assertTrue(self.graph.depends_on(self.total, self.cell(99, 2)))
+        self.assertFalse(self.graph.depends_on(self.total, self.cell(99, 1)))
+        self.assertEqual(len(self.graph.precedents(self.total)), 100)
+
+    def test_dirty_closure_through_range(self):
+        doubled = FakeCell('Sheet2', 1, 0)
+        self.graph.set_precedents(doubled, [self.total])
+        self.assertEqual(self.graph.dirty_closure([self.cell(7, 2)]), {self.cell(7, 2), self.total, doubled})
+
+    def test_order_through_range(self):
+        # The cell gets its first precedent after the range has been ranked
+        self.graph.set_precedents(self.cell(10, 2), [self.cell(10, 0), self.cell(10, 1)])
+        nodes = [self.total, self.cell(10, 2), self.cell(10, 0)]
+        self.assertEqual(self.graph.topological_sort(nodes), [self.cell(10, 0), self.cell(10, 2), self.total])
+
+    def test_cycle_through_range(self):
+        self.graph.set_precedents(self.cell(3, 2), [self.total])
+        self.assertEqual(self.graph.cycles([self.total, self.cell(3, 2), self.cell(4, 2)]),
+                         [{self.total, self.cell(3, 2)}])
+
+    def test_range_released_with_last_dependent(self):
+        self.graph.set_precedents(self.total, [])
+        self.assertEqual(len(self.graph.ranges), 0)
+        self.assertEqual(self.graph.dependents(self.cell(50, 2)), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from model.Scenarios import grid, sweep
+from model.Workbook import Workbook, NUMBER_TYPE
+
+
+class TestScenarios(unittest.TestCase):
+    def setUp(self):
+        self.workbook = Workbook()
+        self.workbook.add_property('area', NUMBER_TYPE, 'Tab', formula=10.0)
+        self.workbook.add_property('price', NUMBER_TYPE, 'Tab', formula=2.0)
+        self.workbook.add_property('cost', tab='Tab', formula='=PROPERTIES!area*PROPERTIES!price')
+        self.workbook.add_sheet('Sheet1', 'Tab')
+        self.workbook.add_rows('Sheet1', 3)
+        self.workbook.set('Sheet1!E1', '=PROPERTIES!cost+1')
+        self.workbook.set('Sheet1!E2', '=PROPERTIES!area>15')
+        self.workbook.set('Sheet1!G1', '=SUM(Sheet1!E1:E3)')
+
+    def test_grid(self):
+        self.assertEqual(grid(area=[1, 2], price=[3]), [{'area': 1, 'price': 3}, {'area': 2, 'price': 3}])
+
+    def test_sweep(self):
+        before = self.workbook.to_dict()
+        table = sweep(self.workbook, grid(area=[10.0, 20.0], price=[1.0, 3.0]), ['PROPERTIES!cost', 'Sheet1!G1'])
+        self.assertEqual(list(table.columns), ['area', 'price', 'PROPERTIES!cost', 'Sheet1!G1'])
+        self.assertEqual(list(table['PROPERTIES!cost']), [10.0, 30.0, 20.0, 60.0])
+        self.assertEqual(list(table['Sheet1!G1']), [11.0, 31.0, 21.0, 61.0])
+        # The base is left as it was
+        self.assertEqual(self.workbook.to_dict(), before)
+        self.assertEqual(self.workbook.get('Sheet1!G1'), 21.0)
+        self.assertIs(self.workbook.get('Sheet1!E2'), False)
+
+    def test_matches_edits(self):
+        for assignments in ({'cost': 5.0}, {'area': 30.0, 'cost': '=PROPERTIES!price'}, {'Sheet1!E3': '4'}):
+            copy = Workbook.from_dict(self.workbook.to_dict())
+            with copy.batch():
+                for address, formula in assignments.items():
+                    copy.set(address, formula)
+            with self.workbook.scenario(assignments):
+                self.assertEqual(self.workbook.get('Sheet1!G1'), copy.get('Sheet1!G1'))
+                self.assertEqual(self.workbook.get('Sheet1!E2'), copy.get('Sheet1!E2'))
+            self.assertEqual(self.workbook.get('Sheet1!G1'), 21.0)
+
+    def test_plan_follows_edits(self):
+        with self.workbook.scenario({'area': 1.0}):
+            self.assertEqual(self.workbook.get('Sheet1!G1'), 3.0)
+        self.workbook.set('Sheet1!E3', '=PROPERTIES!area')
+        with self.workbook.scenario({'area': 1.0}):
+            self.assertEqual(self.workbook.get('Sheet1!G1'), 4.0)
+        self.assertEqual(self.workbook.get('Sheet1!G1'), 31.0)
+
+    def test_processes(self):
+        scenarios = grid(area=[float(area) for area in range(8)])
+        self.assertTrue(sweep(self.workbook, scenarios, ['Sheet1!G1'], processes=2, chunk_size=2).equals(
+            sweep(self.workbook, scenarios, ['Sheet1!G1'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -184,6 +184,53 @@ class TestTokenizer(unittest.TestCase):
         ]
         self.assertTokenListEqual(Tokenizer.tokenize(formula), expected)
 
+    def test_numbers_surrounded_by_spaces(self):
+        formula = "IF(sheet1!A1 > 7; 0.80 ; .5)"
+        expected = [
+            Token('IF', TokenType.FUNCTION, None),
+            Token('(', TokenType.PARENTHESIS, 'OPEN'),
+            Token('sheet1!A1', TokenType.VALUE, ValueType.IDENTIFIER),
+            Token('>', TokenType.OPERATOR, None),
+            Token('7', TokenType.VALUE, ValueType.NUMBER),
+            Token(';', TokenType.SEMICOLON, None),
+            Token('0.80', TokenType.VALUE, ValueType.NUMBER),
+            Token(';', TokenType.SEMICOLON, None),
+            Token('.5', TokenType.VALUE, ValueType.NUMBER),
+            Token(')', TokenType.PARENTHESIS, 'CLOSE')
+        ]
+        self.assertTokenListEqual(Tokenizer.tokenize(formula), expected)
+
+    def test_exponent_numbers(self):
+        formula = "1e5 + 2.5E-3*SHEET1!A1"
+        expected = [
+            Token('1e5', TokenType.VALUE, ValueType.NUMBER),
+            Token('+', TokenType.OPERATOR, None),
+            Token('2.5E-3', TokenType.VALUE, ValueType.NUMBER),
+            Token('*', TokenType.OPERATOR, None),
+            Token('SHEET1!A1', TokenType.VALUE, ValueType.IDENTIFIER)
+        ]
+        self.assertTokenListEqual(Tokenizer.tokenize(formula), expected)
+
+    def test_function_name_without_call_is_identifier(self):
+        formula = "SUMA(A1) + IF"
+        expected = [
+            Token('SUMA', TokenType.VALUE, ValueType.IDENTIFIER),
+            Token('(', TokenType.PARENTHESIS, 'OPEN'),
+            Token('A1', TokenType.VALUE, ValueType.IDENTIFIER),
+            Token(')', TokenType.PARENTHESIS, 'CLOSE'),
+            Token('+', TokenType.OPERATOR, None),
+            Token('IF', TokenType.VALUE, ValueType.IDENTIFIER)
+        ]
+        self.assertTokenListEqual(Tokenizer.tokenize(formula), expected)
+
+    def test_string_literal_spaces_and_empty_strings(self):
+        formula = '"  padded  " + ""'
+        expected = [
+            Token('padded', TokenType.VALUE, ValueType.STRING),
+            Token('+', TokenType.OPERATOR, None)
+        ]
+        self.assertTokenListEqual(Tokenizer.tokenize(formula), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
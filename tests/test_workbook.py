@@ -0,0 +1,129 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from model.Enums import ErrorType, FormulaError
+from model.Workbook import Workbook, LoadCancelled, parse_tabs, NUMBER_TYPE, CHECKBOX_TYPE
+from resources.utils import EMPTY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestWorkbook(unittest.TestCase):
+    def setUp(self):
+        self.workbook = Workbook()
+        self.workbook.add_property('width', NUMBER_TYPE, 'Tab', formula=4.0)
+        self.workbook.add_sheet('Sheet1', 'Tab')
+        self.workbook.add_rows('Sheet1', 5)
+
+    def test_formulas(self):
+        self.workbook.set('Sheet1!E1', '=PROPERTIES!width*2')
+        self.workbook.set('Sheet1!E2', '=Sheet1!E1+1')
+        self.assertEqual(self.workbook.get('Sheet1!E2'), 9.0)
+        self.workbook.set('width', 1.0)
+        self.assertEqual(self.workbook.get('Sheet1!E2'), 3.0)
+
+    def test_early_cutoff(self):
+        self.workbook.set('Sheet1!E1', '=PROPERTIES!width>1')
+        self.workbook.set('Sheet1!E2', '=IF(Sheet1!E1;1;2)')
+        self.workbook.mark_dirty(self.workbook.properties['width'])
+        self.workbook.properties['width'].formula = 5.0
+        self.assertEqual(self.workbook.recalculate(), 2)  # E2 keeps its value
+
+    def test_ranges_over_sparse_rows(self):
+        self.workbook.set('Sheet1!G1', '=SUM(Sheet1!E1:E5)')
+        self.assertEqual(self.workbook.get('Sheet1!G1'), 0.0)
+        self.workbook.set('Sheet1!E3', '2')
+        self.workbook.set('Sheet1!E5', '=Sheet1!E3*2')
+        self.assertEqual(self.workbook.get('Sheet1!G1'), 6.0)
+        self.assertIs(self.workbook.get('Sheet1!E4'), EMPTY)
+
+    def test_cycle(self):
+        self.workbook.set('Sheet1!E1', '=Sheet1!E2+1')
+        self.workbook.set('Sheet1!E2', '=Sheet1!E1+1')
+        self.assertIs(self.workbook.record('Sheet1!E1').error, ErrorType.CIRCULAR)
+        self.workbook.set('Sheet1!E2', '1')
+        self.assertEqual(self.workbook.get('Sheet1!E1'), 2.0)
+
+    def test_rows(self):
+        self.workbook.set('Sheet1!E2', '3')
+        self.workbook.set('Sheet1!G5', '=Sheet1!E2*2')
+        self.assertEqual(self.workbook.get('Sheet1!G5'), 6.0)
+        self.workbook.add_rows('Sheet1', 1, 0)
+        # References are not shifted, they are resolved again against the new rows
+        self.assertEqual(self.workbook.get('Sheet1!G6'), 0.0)
+        self.workbook.remove_row('Sheet1', 1)
+        self.assertEqual(self.workbook.record('Sheet1!G5').formula, '=#REF!*2')
+        self.assertIs(self.workbook.get('Sheet1!G5'), FormulaError.of(ErrorType.REF))
+
+    def test_remove_row_under_range(self):
+        self.workbook.set('Sheet1!G1', '1')
+        self.workbook.set('Sheet1!G3', '=SUM(Sheet1!G1:G3)')
+        self.assertIs(self.workbook.record('Sheet1!G3').error, ErrorType.CIRCULAR)
+        self.workbook.remove_row('Sheet1', 0)
+        cell = self.workbook.record('Sheet1!G2')
+        self.assertEqual(cell.formula, '=SUM(#REF!:G3)')
+        # The range the formula read is gone, so is the cycle through it
+        self.assertEqual(self.workbook.dependency_graph.precedents(cell), set())
+        self.assertIs(cell.error, ErrorType.NAME)
+
+    def test_round_trip(self):
+        self.workbook.add_property('chimney', CHECKBOX_TYPE, 'Tab', 'Komin', formula=True)
+        self.workbook.set('Sheet1!E1', '=IF(PROPERTIES!chimney;PROPERTIES!width;0)')
+        copy = Workbook.from_dict(self.workbook.to_dict())
+        self.assertEqual(copy.to_dict(), self.workbook.to_dict())
+        self.assertEqual(copy.get('Sheet1!E1'), 4.0)
+
+    def test_project_file(self):
+        workbook = Workbook.load(os.path.join(ROOT, 'resources', 'test.json'))
+        workbook.set('buildingLength', 10.0)
+        workbook.set('buildingWidth', 8.0)
+        workbook.set('roofLength', 12.0)
+        self.assertAlmostEqual(workbook.get('Dach!E1'), 183.168)
+        self.assertEqual(len(workbook.sheets['Dach']), len(workbook.sheets['Dach'].to_dataframe()))
+
+    def test_load_progress(self):
+        stages = []
+        workbook = Workbook.load(os.path.join(ROOT, 'resources', 'test.json'),
+                                 lambda stage, done, total: stages.append((stage, done, total)))
+        self.assertEqual(list(dict.fromkeys(stage for stage, _, _ in stages)),
+                         ['read', 'records', 'formulas', 'calculate'])
+        for stage in ('read', 'records', 'formulas', 'calculate'):
+            done, total = [(done, total) for name, done, total in stages if name == stage][-1]
+            self.assertEqual(done, total)
+        self.assertEqual(workbook.to_dict(), Workbook.load(os.path.join(ROOT, 'resources', 'test.json')).to_dict())
+
+    def test_load_cancelled(self):
+        with self.assertRaises(LoadCancelled):
+            Workbook.load(os.path.join(ROOT, 'resources', 'test.json'), lambda stage, done, total: stage != 'formulas')
+
+    def test_load_cancelled_while_reading(self):
+        with self.assertRaises(LoadCancelled):
+            Workbook.load(os.path.join(ROOT, 'resources', 'test.json'), lambda stage, done, total: stage != 'read')
+
+    def test_parse_tabs(self):
+        data = self.workbook.to_dict() + [{'tab_name': 'Empty', 'group_boxes': []}]
+        read = []
+        tabs = list(parse_tabs(' ' + json.dumps(data) + '\n', lambda stage, done, total: read.append(done)))
+        self.assertEqual(tabs, data)
+        self.assertEqual(len(read), len(data) + 1)
+        self.assertEqual(list(parse_tabs('[ ]')), [])
+        for text in ('{}', '[{}', '[{} {}]', '[{}] []'):
+            with self.assertRaises(json.JSONDecodeError):
+                list(parse_tabs(text))
+
+    def test_empty_tab(self):
+        self.workbook.set('Sheet1!E1', '=PROPERTIES!width*2')
+        copy = Workbook.from_dict(self.workbook.to_dict() + [{'tab_name': 'Empty', 'group_boxes': []}])
+        self.assertEqual(list(copy.tabs), ['Tab', 'Empty'])
+        self.assertEqual(copy.get('Sheet1!E1'), 8.0)
+
+    def test_without_qt(self):
+        code = 'import sys; import model.Workbook; sys.exit("PyQt6" in sys.modules)'
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], cwd=ROOT).returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
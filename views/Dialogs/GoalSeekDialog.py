@@ -0,0 +1,74 @@
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QFormLayout, QDialogButtonBox
+
+from resources.ValidatedLineEdit import ValidatedLineEdit
+
+
+class GoalSeekDialog(QDialog):
+    goal_seek_requested = pyqtSignal(str, float, str)
+
+    def __init__(self, target_address: str = ''):
+        super().__init__()
+        self._setup_ui()
+        self._setup_connections()
+        self.target_field.set_text(target_address)
+        self.show()
+
+    def _setup_ui(self):
+        self.setWindowTitle("Szukaj wyniku")
+        self.setGeometry(100, 100, 400, 300)
+
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        self.target_field = ValidatedLineEdit("Ustaw komórkę")
+        form_layout.addRow(self.target_field.label, self.target_field.line_edit)
+        form_layout.setWidget(1, QFormLayout.ItemRole.FieldRole, self.target_field.error_label)
+
+        self.goal_field = ValidatedLineEdit("Wartość docelowa")
+        form_layout.addRow(self.goal_field.label, self.goal_field.line_edit)
+        form_layout.setWidget(3, QFormLayout.ItemRole.FieldRole, self.goal_field.error_label)
+
+        self.input_field = ValidatedLineEdit("Zmieniając komórkę")
+        form_layout.addRow(self.input_field.label, self.input_field.line_edit)
+        form_layout.setWidget(5, QFormLayout.ItemRole.FieldRole, self.input_field.error_label)
+
+        layout.addLayout(form_layout)
+
+        # Dialog buttons
+        self.buttonBox = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        layout.addWidget(self.buttonBox)
+
+        self.setLayout(layout)
+
+    def _setup_connections(self):
+        self.buttonBox.accepted.connect(self.handle_ok)
+        self.buttonBox.rejected.connect(self.close_window)
+        for field in (self.target_field, self.goal_field, self.input_field):
+            field.line_edit.textChanged.connect(field.clear_error)
+
+    def handle_ok(self):
+        from model.Model import Model
+
+        target_address = self.target_field.text()
+        input_address = self.input_field.text()
+
+        if Model.find_input(target_address) is None:
+            self.target_field.set_error("Nie ma takiej komórki ani właściwości.")
+            return
+
+        try:
+            goal = float(self.goal_field.text().replace(',', '.'))
+        except ValueError:
+            self.goal_field.set_error("Wartość docelowa musi być liczbą.")
+            return
+
+        if Model.find_input(input_address) is None:
+            self.input_field.set_error("Nie ma takiej komórki ani właściwości.")
+            return
+
+        self.goal_seek_requested.emit(target_address, goal, input_address)
+        self.close_window()
+
+    def close_window(self):
+        self.close()
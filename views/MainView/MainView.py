@@ -7,6 +7,8 @@ class MainView(QMainWindow, Ui_MainWindow):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.setupUi(self)
+        self.menuTools = self.menubar.addMenu("Narzędzia")
+        self.actionGoalSeek = self.menuTools.addAction("Szukaj wyniku...")
         self.show()
 
     def update_formula_bar(self, value):